@@ -0,0 +1,343 @@
+"""Banco de pruebas de rendimiento de `predio_report.py`.
+
+Genera un catastro sintético en EPSG:4326 (sin acceso a red ni archivos de
+datos), mide por separado cada etapa de la generación de una ficha y compara
+los resultados con una línea base guardada, para detectar regresiones antes de
+publicar un cambio.
+
+Uso:
+    python benchmark_predio_report.py --predios 2000 --informes 50
+    python benchmark_predio_report.py --guardar-baseline benchmark_baseline.json
+    python benchmark_predio_report.py --baseline benchmark_baseline.json --tolerancia 0.25
+    python benchmark_predio_report.py --motor pymupdf --logo logo.png
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+import predio_report as pr
+
+# Etapas medidas, en el orden en que ocurren al generar una ficha.
+ETAPAS = ['busqueda', 'fecha_atributos', 'reproyeccion', 'vecinos', 'story', 'build', 'total']
+
+USOS_EDIFICACION = ['Vivienda', 'Comercio', 'Mixto', 'Industrial', 'Educación', 'Solar vacío']
+CALLES = ['Av. 9 de Octubre', 'Calle Boyacá', 'Av. Quito', 'Calle Chile', 'Av. del Ejército', 'Calle Colón']
+
+def generar_catastro_sintetico(n_predios=1000, vertices=8, proporcion_multipoligono=0.1, completitud=0.9, semilla=0):
+    """Genera un GeoDataFrame de predios sintéticos en EPSG:4326.
+
+    Los predios se disponen en una cuadrícula de manzanas cerca de Guayaquil.
+    Cada predio es un polígono de `vertices` vértices con contorno irregular; una
+    parte de ellos se convierte en multipolígono añadiendo una segunda parte
+    pequeña. Los atributos siguen el esquema del catastro real, incluidos los
+    valores numéricos guardados como texto.
+
+    Args:
+        n_predios (int, optional): Número de predios. Defaults to 1000.
+        vertices (int, optional): Vértices del contorno de cada predio (mínimo 3).
+        proporcion_multipoligono (float, optional): Fracción de predios que son
+            multipolígonos. Defaults to 0.1.
+        completitud (float, optional): Probabilidad de que cada atributo tenga
+            valor; el resto queda vacío (None). Defaults to 0.9.
+        semilla (int, optional): Semilla del generador aleatorio. Defaults to 0.
+
+    Returns:
+        gpd.GeoDataFrame: Catastro sintético con la columna 'Codigo_Cat'.
+    """
+    rng = np.random.default_rng(semilla)
+    vertices = max(int(vertices), 3)
+
+    # --- GEOMETRÍAS ---
+    # Celdas de ~20 x 20 m; el contorno es un polígono estrellado dentro de la celda.
+    lado = int(np.ceil(np.sqrt(n_predios)))
+    paso = 0.0002
+    fila, columna = np.divmod(np.arange(n_predios), lado)
+    cx = -79.92 + (columna + 0.5) * paso
+    cy = -2.21 + (fila + 0.5) * paso
+    angulos = np.linspace(0, 2 * np.pi, vertices, endpoint=False) + rng.uniform(0, 2 * np.pi, (n_predios, 1))
+    radios = paso * 0.5 * rng.uniform(0.75, 0.98, (n_predios, vertices))
+    anillos = np.stack([cx[:, None] + radios * np.cos(angulos), cy[:, None] + radios * np.sin(angulos)], axis=-1)
+    anillos = np.concatenate([anillos, anillos[:, :1]], axis=1) # Cierra cada anillo.
+    geometrias = shapely.polygons(anillos)
+
+    multi = rng.random(n_predios) < proporcion_multipoligono
+    if multi.any():
+        satelites = shapely.box(cx[multi] + paso * 0.3, cy[multi] + paso * 0.3, cx[multi] + paso * 0.45, cy[multi] + paso * 0.45)
+        principales = shapely.difference(geometrias[multi], shapely.box(cx[multi] + paso * 0.28, cy[multi] + paso * 0.28,
+                                                                        cx[multi] + paso * 0.5, cy[multi] + paso * 0.5))
+        geometrias[multi] = [shapely.MultiPolygon(list(shapely.get_parts(p)) + [s]) for p, s in zip(principales, satelites)]
+
+    # --- ATRIBUTOS ---
+    manzana, lote = np.divmod(np.arange(n_predios), 40)
+    datos = {
+        'Codigo_Cat': [f"0901-{m + 1:04d}-{l + 1:03d}-01" for m, l in zip(manzana, lote)],
+        'Uso_de_Edi': rng.choice(USOS_EDIFICACION, n_predios),
+        'Calle': rng.choice(CALLES, n_predios),
+        'Lindero_No': rng.choice(['Calle pública', 'Predio vecino', 'Pasaje'], n_predios),
+        'Lindero_Su': rng.choice(['Calle pública', 'Predio vecino', 'Pasaje'], n_predios),
+        'Lindero_Es': rng.choice(['Calle pública', 'Predio vecino', 'Pasaje'], n_predios),
+        'Lindero_Oe': rng.choice(['Calle pública', 'Predio vecino', 'Pasaje'], n_predios),
+        'Area_Escri': np.char.mod("%.2f", rng.uniform(80, 600, n_predios)).astype(object), # Texto, como en el origen.
+        'Longitud_N': rng.uniform(5, 30, n_predios).round(2),
+        'Longitud_S': rng.uniform(5, 30, n_predios).round(2),
+        'Longitud_E': rng.uniform(5, 30, n_predios).round(2),
+        'Longitud_O': rng.uniform(5, 30, n_predios).round(2),
+    }
+    gdf = gpd.GeoDataFrame(datos, geometry=geometrias, crs="EPSG:4326")
+    for columna in gdf.columns.drop(['Codigo_Cat', 'geometry']):
+        vacios = rng.random(n_predios) >= completitud
+        gdf[columna] = gdf[columna].astype(object)
+        gdf.loc[vacios, columna] = None
+    utm = gdf.to_crs(gdf.estimate_utm_crs())
+    gdf['Shape__Area'] = utm.area.round(2)
+    gdf['Shape__Length'] = utm.length.round(2)
+    return gdf
+
+def _pico_memoria_mb():
+    """Pico de memoria residente (RSS) del proceso, en MB."""
+    try:
+        import resource
+    except ImportError: # Windows
+        return float('nan')
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 1024 ** 2 if sys.platform == 'darwin' else pico / 1024
+
+def medir_etapas(gdf, codigos, output_dir, fecha_reporte="2025-01-01", motor="reportlab", logo_path=None):
+    """Genera una ficha por código midiendo cada etapa por separado.
+
+    Las etapas reproducen el camino de `generar_informe_predio_pdf`: búsqueda del
+    predio, formato de la fecha y extracción de atributos, reproyección a UTM,
+    búsqueda de los vecinos del mapa en el índice espacial, construcción del
+    'story' y `doc.build`. La etapa 'total' mide la llamada
+    completa a `generar_informe_predio_pdf` con el índice de códigos y el motor
+    de PDF indicado.
+
+    Returns:
+        dict[str, list[float]]: Duraciones en segundos por etapa.
+    """
+    tiempos = {etapa: [] for etapa in ETAPAS}
+    indice = pr.construir_indice_codcat(gdf)
+    for codcat in codigos:
+        archivo = os.path.join(output_dir, pr._nombre_archivo_seguro(codcat) + ".pdf")
+
+        t0 = time.perf_counter()
+        gdf_filtrado = gdf.iloc[indice[codcat][:1]]
+        t1 = time.perf_counter()
+        fecha_str = pr._formatear_fecha(fecha_reporte)
+        pr._extraer_atributos(gdf_filtrado.iloc[0])
+        t2 = time.perf_counter()
+        fila_utm = pr.precalcular_utm(gdf_filtrado).iloc[0]
+        utm = (int(fila_utm['utm_epsg']), fila_utm['utm_nombre'], fila_utm['geometry_utm'])
+        t3 = time.perf_counter()
+        vecinos = pr._buscar_vecinos_mapa(gdf, indice[codcat][0])
+        t4 = time.perf_counter()
+        doc = pr._documento_ficha(archivo, codcat, fecha_str, logo_path)
+        story = [pr.PageBreak()] + pr._construir_story_predio(gdf_filtrado, codcat, fecha_str, doc.width, logo_path=logo_path,
+                                                               crs=gdf.crs, utm=utm, vecinos=vecinos)
+        t5 = time.perf_counter()
+        doc.build(story, onFirstPage=pr.portada_canvas, onLaterPages=pr.footer_canvas)
+        t6 = time.perf_counter()
+        ok, mensaje = pr.generar_informe_predio_pdf(gdf, codcat, archivo, fecha_reporte=fecha_reporte, indice_codcat=indice,
+                                                    logo_path=logo_path, motor=motor)
+        t7 = time.perf_counter()
+        if not ok:
+            raise RuntimeError(mensaje)
+
+        for etapa, duracion in zip(ETAPAS, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4, t6 - t5, t7 - t6)):
+            tiempos[etapa].append(duracion)
+    return tiempos
+
+def verificar_motor_plantillas(gdf, codigos, logo_path=None, dpi=72):
+    """Comprueba que el motor de plantillas produce las mismas fichas que ReportLab.
+
+    El motor 'pymupdf' depende de detalles internos de ReportLab; esta comprobación
+    genera cada ficha con ambos motores y compara las páginas rasterizadas.
+
+    Returns:
+        tuple[list[str], int]: Códigos cuyas fichas difieren y número de fichas
+                               que se generaron realmente por estampado.
+    """
+    pymupdf = pr._importar_pymupdf()
+    distintas, estampadas = [], 0
+    for codcat in codigos:
+        pdfs = []
+        for motor in pr.MOTORES_PDF:
+            resultado = pr.generar_informe_predio_pdf(gdf, codcat, None, fecha_reporte="2025-01-01",
+                                                      logo_path=logo_path, motor=motor)
+            if not resultado.ok:
+                raise RuntimeError(resultado.mensaje)
+            estampadas += 'estampado' in resultado.duraciones
+            pdfs.append(pymupdf.open("pdf", resultado.contenido))
+        referencia, plantilla = pdfs
+        if referencia.page_count != plantilla.page_count or any(
+                a.get_pixmap(dpi=dpi).samples != b.get_pixmap(dpi=dpi).samples for a, b in zip(referencia, plantilla)):
+            distintas.append(codcat)
+    return distintas, estampadas
+
+def ejecutar_benchmark(n_predios=1000, n_informes=50, vertices=8, proporcion_multipoligono=0.1, completitud=0.9, semilla=0,
+                       motor="reportlab", logo_path=None):
+    """Ejecuta el banco de pruebas completo y devuelve el resumen.
+
+    Args:
+        n_predios (int, optional): Tamaño del catastro sintético.
+        n_informes (int, optional): Número de fichas a generar y medir.
+        vertices, proporcion_multipoligono, completitud, semilla: Ver
+            `generar_catastro_sintetico`.
+        motor (str, optional): Motor de PDF de la etapa 'total' y del lote. Con
+            'pymupdf' también se verifica que sus fichas coincidan con las de
+            ReportLab (ver `verificar_motor_plantillas`).
+        logo_path (str, optional): Logo de las fichas.
+
+    Returns:
+        dict: Parámetros, tiempos por etapa (media, p50, p95 en ms), fichas por
+              segundo, tiempo de lote, pico de memoria y, con el motor 'pymupdf',
+              el resultado de la verificación.
+    """
+    t0 = time.perf_counter()
+    gdf = generar_catastro_sintetico(n_predios, vertices, proporcion_multipoligono, completitud, semilla)
+    t_generacion = time.perf_counter() - t0
+
+    rng = np.random.default_rng(semilla)
+    codigos = list(rng.choice(gdf['Codigo_Cat'].to_numpy(), size=min(n_informes, n_predios), replace=False))
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        pr.generar_informe_predio_pdf(gdf, codigos[0], os.path.join(output_dir, "calentamiento.pdf"), # Importaciones y cachés.
+                                      logo_path=logo_path, motor=motor)
+        tiempos = medir_etapas(gdf, codigos, output_dir, motor=motor, logo_path=logo_path)
+
+        t0 = time.perf_counter()
+        resultados = list(pr.generar_informes_lote(gdf, codigos=codigos, output_dir=output_dir, fecha_reporte="2025-01-01",
+                                                   logo_path=logo_path, motor=motor))
+        t_lote = time.perf_counter() - t0
+        if not all(ok for _, ok, _ in resultados):
+            raise RuntimeError("El lote del banco de pruebas tuvo fichas fallidas.")
+
+    verificacion = None
+    if motor == 'pymupdf':
+        distintas, estampadas = verificar_motor_plantillas(gdf, codigos, logo_path=logo_path)
+        verificacion = {'fichas_distintas': distintas, 'fichas_estampadas': estampadas}
+
+    etapas = {}
+    for etapa, valores in tiempos.items():
+        ms = np.asarray(valores) * 1000
+        etapas[etapa] = {'media_ms': float(ms.mean()), 'p50_ms': float(np.percentile(ms, 50)),
+                         'p95_ms': float(np.percentile(ms, 95))}
+    return {
+        'parametros': {'predios': n_predios, 'informes': len(codigos), 'vertices': vertices,
+                       'proporcion_multipoligono': proporcion_multipoligono, 'completitud': completitud,
+                       'semilla': semilla, 'motor': motor, 'logo': bool(logo_path)},
+        'entorno': {'python': platform.python_version(), 'plataforma': platform.platform()},
+        'generacion_catastro_s': t_generacion,
+        'etapas': etapas,
+        'fichas_por_segundo': len(codigos) / sum(tiempos['total']),
+        'lote_fichas_por_segundo': len(codigos) / t_lote,
+        'pico_memoria_mb': _pico_memoria_mb(),
+        'verificacion_plantillas': verificacion,
+    }
+
+def comparar_con_baseline(resultado, baseline, tolerancia=0.25):
+    """Compara un resultado con la línea base.
+
+    Una etapa es una regresión si su tiempo medio supera al de la línea base en
+    más de `tolerancia` (fracción). También se compara el rendimiento en fichas
+    por segundo y el pico de memoria.
+
+    Returns:
+        list[str]: Descripción de cada regresión encontrada (vacía si no hay).
+    """
+    regresiones = []
+    if baseline.get('parametros') != resultado['parametros']:
+        print("Advertencia: La línea base se midió con otros parámetros; la comparación es orientativa.")
+    for etapa, medidas in resultado['etapas'].items():
+        base = baseline.get('etapas', {}).get(etapa)
+        if base and medidas['media_ms'] > base['media_ms'] * (1 + tolerancia):
+            regresiones.append(f"{etapa}: {medidas['media_ms']:.1f} ms (línea base {base['media_ms']:.1f} ms)")
+    for clave in ('fichas_por_segundo', 'lote_fichas_por_segundo'):
+        base = baseline.get(clave)
+        if base and resultado[clave] < base / (1 + tolerancia):
+            regresiones.append(f"{clave}: {resultado[clave]:.2f} (línea base {base:.2f})")
+    base = baseline.get('pico_memoria_mb')
+    if base and resultado['pico_memoria_mb'] > base * (1 + tolerancia):
+        regresiones.append(f"pico_memoria_mb: {resultado['pico_memoria_mb']:.0f} MB (línea base {base:.0f} MB)")
+    return regresiones
+
+def imprimir_resultado(resultado, baseline=None):
+    """Imprime el resumen del banco de pruebas como una tabla de texto."""
+    p = resultado['parametros']
+    print(f"Catastro sintético: {p['predios']} predios, {p['vertices']} vértices, "
+          f"{p['proporcion_multipoligono']:.0%} multipolígonos, completitud {p['completitud']:.0%}, "
+          f"motor {p.get('motor', 'reportlab')} "
+          f"(generado en {resultado['generacion_catastro_s']:.2f} s)")
+    print(f"{'Etapa':<18}{'media ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'base ms':>10}")
+    for etapa, medidas in resultado['etapas'].items():
+        base = (baseline or {}).get('etapas', {}).get(etapa, {}).get('media_ms')
+        print(f"{etapa:<18}{medidas['media_ms']:>10.2f}{medidas['p50_ms']:>10.2f}{medidas['p95_ms']:>10.2f}"
+              f"{base if base is not None else float('nan'):>10.2f}")
+    print(f"Fichas por segundo: {resultado['fichas_por_segundo']:.2f} (individual), "
+          f"{resultado['lote_fichas_por_segundo']:.2f} (lote)")
+    print(f"Pico de memoria (RSS): {resultado['pico_memoria_mb']:.0f} MB")
+    verificacion = resultado.get('verificacion_plantillas')
+    if verificacion is not None:
+        print(f"Motor de plantillas: {verificacion['fichas_estampadas']} de {resultado['parametros']['informes']} "
+              f"fichas estampadas, {len(verificacion['fichas_distintas'])} distintas de las de ReportLab.")
+
+def main(argv=None):
+    """Punto de entrada de la línea de comandos del banco de pruebas."""
+    parser = argparse.ArgumentParser(description="Banco de pruebas de rendimiento de predio_report.py.")
+    parser.add_argument('--predios', type=int, default=1000, help="Número de predios del catastro sintético.")
+    parser.add_argument('--informes', type=int, default=30, help="Número de fichas a generar y medir.")
+    parser.add_argument('--vertices', type=int, default=8, help="Vértices del contorno de cada predio.")
+    parser.add_argument('--multipoligonos', type=float, default=0.1, help="Fracción de predios multipolígono.")
+    parser.add_argument('--completitud', type=float, default=0.9, help="Probabilidad de que cada atributo tenga valor.")
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--motor', choices=pr.MOTORES_PDF, default="reportlab", help="Motor de PDF de la etapa 'total' y del lote.")
+    parser.add_argument('--logo', help="Logo de las fichas (la parte fija pesa más con una imagen).")
+    parser.add_argument('--baseline', help="Archivo JSON de línea base con el que comparar.")
+    parser.add_argument('--guardar-baseline', help="Guarda el resultado como nueva línea base en este archivo.")
+    parser.add_argument('--tolerancia', type=float, default=0.25, help="Empeoramiento relativo admitido frente a la línea base.")
+    parser.add_argument('--json', help="Guarda el resultado completo en este archivo JSON.")
+    args = parser.parse_args(argv)
+
+    resultado = ejecutar_benchmark(args.predios, args.informes, args.vertices, args.multipoligonos,
+                                   args.completitud, args.semilla, motor=args.motor, logo_path=args.logo)
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    imprimir_resultado(resultado, baseline)
+
+    for ruta in (args.json, args.guardar_baseline):
+        if ruta:
+            with open(ruta, "w", encoding="utf-8") as f:
+                json.dump(resultado, f, ensure_ascii=False, indent=2)
+            print(f"Resultado guardado en {ruta}.")
+
+    verificacion = resultado['verificacion_plantillas']
+    if verificacion is not None and verificacion['fichas_distintas']:
+        print("Fichas del motor de plantillas distintas de las de ReportLab:")
+        for codcat in verificacion['fichas_distintas']:
+            print(f"  - {codcat}")
+        return 1
+
+    if baseline is not None:
+        regresiones = comparar_con_baseline(resultado, baseline, args.tolerancia)
+        if regresiones:
+            print("Regresiones respecto a la línea base:")
+            for regresion in regresiones:
+                print(f"  - {regresion}")
+            return 1
+        print("Sin regresiones respecto a la línea base.")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,29 +1,32 @@
 # -*- coding: utf-8 -*-
 
 # --- IMPORTACIÓN DE LIBRERÍAS ---
+# Los módulos pesados que solo usan algunas funciones (PyMuPDF, python-telegram-bot,
+# Pillow, servidor HTTP) se importan dentro de la función que los necesita, para
+# que importar este módulo no pague su costo de carga.
 import os
-import fitz  # PyMuPDF, usado para manipulación de PDF (aunque no se usa en este script, se mantiene por si es parte del proyecto)
+import time
+import functools
+import contextvars
+import dataclasses
 import locale
-import telegram # No se usa en este script, pero se mantiene
-from glob import glob # No se usa en este script, pero se mantiene
 from datetime import datetime
-from telegram.error import TelegramError # No se usa en este script, pero se mantiene
 
 # --- LIBRERÍAS REQUERIDAS ---
+import numpy as np
 import pandas as pd
 import geopandas as gpd
-import plotly.express as px # No se usa en este script, pero se mantiene
-import plotly.graph_objects as go # No se usa en este script, pero se mantiene
 
-from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, KeepTogether, Table, TableStyle, PageBreak
+from reportlab.platypus import BaseDocTemplate, PageTemplate, Frame, NextPageTemplate, Flowable
+from reportlab.platypus.doctemplate import ActionFlowable
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_RIGHT
 from reportlab.lib.units import cm, inch
 from reportlab.lib.colors import navy, black, gray, Color
-from PIL import Image as PILImage
 from reportlab.lib import colors
-from shapely.geometry import Polygon, MultiPolygon # No se usa directamente, pero es dependencia de GeoPandas
+import shapely
+from pyproj import CRS, Transformer
 
 # --- CONFIGURACIÓN REGIONAL PARA FECHAS ---
 # Intenta establecer el localismo a español para obtener los nombres de los meses.
@@ -109,20 +112,19 @@ def portada_canvas(canvas, doc):
     # Esta es la manera de pasar datos dinámicos a las funciones de callback de ReportLab.
     canvas.setFont('Helvetica-Oblique', 12)
     canvas.drawCentredString(ancho / 2, alto * 0.45, "Referente al Predio con Código Catastral:")
-    canvas.setFont('Helvetica-Bold', 20)
-    canvas.setFillColor(black)
-    canvas.drawCentredString(ancho / 2, alto * 0.40, doc.codcat_param)
 
-    # --- INFORMACIÓN DEL AUTOR Y FECHA ---
+    # --- INFORMACIÓN DEL AUTOR ---
     canvas.setFont('Helvetica', 12)
     canvas.setFillColor(black)
     canvas.drawCentredString(ancho / 2, margen + 2 * cm, "Elaborado por:")
     canvas.setFont('Helvetica-Bold', 14)
     canvas.setFillColor(navy)
     canvas.drawCentredString(ancho / 2, margen + 1.5 * cm, "Cartography Hub")
-    canvas.setFont('Helvetica', 10)
-    canvas.setFillColor(gray)
-    canvas.drawCentredString(ancho / 2, margen + 0.5 * cm, doc.fecha_param)
+
+    # --- CÓDIGO CATASTRAL Y FECHA ---
+    # En una plantilla (ver `_estampar_ficha`) estos datos se estampan después, predio a predio.
+    if not getattr(doc, 'plantilla_param', False):
+        _datos_portada(canvas, doc.pagesize, doc.codcat_param, doc.fecha_param)
 
     # --- LOGO (OPCIONAL) ---
     # Dibuja un logo en la parte superior si la ruta es válida.
@@ -131,10 +133,30 @@ def portada_canvas(canvas, doc):
             logo = Image(doc.logo_path_param, width=4*cm, height=2*cm)
             logo.hAlign = 'CENTER'
             # Dibuja el logo directamente en el canvas en una posición específica.
-            logo.drawOn(canvas, ancho/2 - logo.width/2, alto - margen - logo.height - 0.5*cm)
+            logo.drawOn(canvas, ancho/2 - logo.drawWidth/2, alto - margen - logo.drawHeight - 0.5*cm)
         except Exception as e:
-            print(f"Advertencia: No se pudo dibujar el logo en la portada: {e}")
+            _advertir(f"No se pudo dibujar el logo en la portada: {e}")
+
+    canvas.restoreState()
+
+def _datos_portada(canvas, pagesize, codcat, fecha_str):
+    """Dibuja en la portada los datos propios del predio: el código catastral y la fecha.
 
+    Args:
+        canvas (reportlab.pdfgen.canvas.Canvas): El objeto canvas sobre el que se dibuja.
+        pagesize (tuple): Ancho y alto de la página, en puntos.
+        codcat (str): Código catastral del predio.
+        fecha_str (str): Fecha del informe ya formateada.
+    """
+    ancho, alto = pagesize
+    margen = 2 * cm
+    canvas.saveState()
+    canvas.setFont('Helvetica-Bold', 20)
+    canvas.setFillColor(black)
+    canvas.drawCentredString(ancho / 2, alto * 0.40, codcat)
+    canvas.setFont('Helvetica', 10)
+    canvas.setFillColor(gray)
+    canvas.drawCentredString(ancho / 2, margen + 0.5 * cm, fecha_str)
     canvas.restoreState()
 
 def footer_canvas(canvas, doc):
@@ -160,7 +182,1031 @@ def footer_canvas(canvas, doc):
     canvas.drawString(0.75 * inch, 0.75 * inch, "Informe Confidencial - Cartography Hub")
     canvas.restoreState()
 
-def generar_informe_predio_pdf(gdf, codcat, output_filename, autor="Cartography Hub", fecha_reporte=None, logo_path=None, map_image_path=None):
+@functools.lru_cache(maxsize=None)
+def _estilos_informe():
+    """Crea los estilos de párrafo del informe.
+
+    Se guardan en caché porque son iguales para todos los predios; en modo lote
+    o servicio se construyen una sola vez por proceso.
+
+    Returns:
+        dict: Diccionario {nombre: ParagraphStyle}.
+    """
+    styles = getSampleStyleSheet()
+    body_style = ParagraphStyle(name='BodyStyle', parent=styles['Normal'], fontSize=10, alignment=TA_JUSTIFY, spaceAfter=6, leading=14)
+    return {
+        'title': ParagraphStyle(name='TitleStyle', parent=styles['h1'], fontSize=18, alignment=TA_CENTER, textColor=navy, spaceAfter=14),
+        'heading1': ParagraphStyle(name='Heading1Style', parent=styles['h2'], fontSize=14, textColor=navy, leftIndent=0, spaceBefore=12, spaceAfter=6),
+        'heading2': ParagraphStyle(name='Heading2Style', parent=styles['h3'], fontSize=11, textColor=black, leftIndent=0, spaceBefore=8, spaceAfter=4),
+        'body': body_style,
+        'list_item': ParagraphStyle(name='ListItemStyle', parent=body_style, leftIndent=1*cm, spaceAfter=2),
+        'code': ParagraphStyle(name='CodeStyle', parent=styles['Code'], fontSize=9, textColor=gray, leftIndent=0, spaceBefore=0, spaceAfter=6),
+        'caption': ParagraphStyle(name='CaptionStyle', parent=styles['Normal'], fontSize=9, alignment=TA_CENTER, textColor=gray, fontName='Helvetica-Oblique'),
+        'table_header': ParagraphStyle(name='TableHeader', parent=body_style, fontName='Helvetica-Bold', alignment=TA_CENTER),
+        'table_cell': ParagraphStyle(name='TableCell', parent=body_style, alignment=TA_RIGHT),
+        'note': ParagraphStyle(name='NoteStyle', parent=styles['Normal'], fontSize=8, alignment=TA_JUSTIFY, textColor=gray),
+    }
+
+def construir_indice_codcat(gdf):
+    """Construye un índice hash sobre la columna 'Codigo_Cat'.
+
+    Recorre el GeoDataFrame una sola vez y agrupa las posiciones de fila por
+    código catastral, de modo que cada búsqueda posterior es O(1) en lugar de
+    un filtrado booleano completo sobre todo el catastro.
+
+    Args:
+        gdf (gpd.GeoDataFrame): GeoDataFrame con la columna 'Codigo_Cat'.
+
+    Returns:
+        dict: Diccionario {codigo_catastral: np.ndarray de posiciones (iloc)}.
+              Los códigos nulos no se indexan.
+    """
+    return gdf.groupby('Codigo_Cat', sort=False).indices
+
+def revisar_codigos(indice_codcat, codigos):
+    """Detecta códigos faltantes y duplicados antes de generar los informes.
+
+    Args:
+        indice_codcat (dict): Índice creado con `construir_indice_codcat`.
+        codigos (iterable de str): Códigos catastrales solicitados.
+
+    Returns:
+        tuple[list, dict]: Lista de códigos que no existen en el índice y
+                           diccionario {codigo: número de registros} de los
+                           códigos que aparecen más de una vez.
+    """
+    faltantes = [c for c in codigos if c not in indice_codcat]
+    duplicados = {c: len(indice_codcat[c]) for c in codigos if c in indice_codcat and len(indice_codcat[c]) > 1}
+    return faltantes, duplicados
+
+def _nombre_archivo_seguro(codcat):
+    """Reemplaza los caracteres de un código catastral no válidos en nombres de archivo."""
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in str(codcat))
+
+# --- LECTURA FILTRADA Y POR BLOQUES DEL CATASTRO ---
+MAX_CODIGOS_CONSULTA = 500 # Códigos por cláusula IN en cada lectura filtrada.
+
+def _literal_sql(valor):
+    """Escapa un valor como literal de cadena SQL (OGR SQL)."""
+    return "'" + str(valor).replace("'", "''") + "'"
+
+def _condicion_lectura(codigos=None, where=None):
+    """Combina el filtro por códigos y la consulta por atributos en una cláusula WHERE."""
+    condiciones = []
+    if codigos:
+        condiciones.append(f"Codigo_Cat IN ({', '.join(_literal_sql(c) for c in codigos)})")
+    if where:
+        condiciones.append(f"({where})")
+    return " AND ".join(condiciones) or None
+
+def cargar_predios(ruta, codigos=None, bbox=None, where=None, columnas=None, incluir_vecinos=False, **kwargs):
+    """Lee del archivo de origen solo los predios que cumplen el filtro.
+
+    El filtro se envía al lector (GDAL/OGR), de modo que solo se decodifican los
+    registros que coinciden en lugar de cargar todo el catastro en memoria para
+    usar unas pocas filas.
+
+    Args:
+        ruta (str): Archivo de predios (Shapefile, GeoJSON, GeoPackage...).
+        codigos (iterable de str, optional): Códigos catastrales a leer.
+        bbox (tuple, optional): Extensión (minx, miny, maxx, maxy) en el CRS del
+            archivo; solo se leen los predios que la intersectan.
+        where (str, optional): Consulta SQL sobre los atributos (p. ej.
+            "Uso_de_Edi = 'Vivienda'").
+        columnas (list, optional): Columnas a leer. 'Codigo_Cat' se añade siempre.
+        incluir_vecinos (bool, optional): Si es True, además de los predios
+            filtrados se leen los que aparecen alrededor de ellos en el mapa
+            del informe. Defaults to False.
+        **kwargs: Argumentos adicionales para `gpd.read_file`.
+
+    Returns:
+        gpd.GeoDataFrame: Los predios leídos.
+    """
+    if columnas is not None and 'Codigo_Cat' not in columnas:
+        columnas = ['Codigo_Cat'] + list(columnas)
+    opciones = dict(bbox=bbox, columns=columnas, **kwargs)
+
+    if codigos is not None:
+        # Las listas largas se dividen para no exceder los límites del intérprete SQL.
+        codigos = list(dict.fromkeys(codigos))
+        partes = [gpd.read_file(ruta, where=_condicion_lectura(codigos[k:k + MAX_CODIGOS_CONSULTA], where), **opciones)
+                  for k in range(0, len(codigos), MAX_CODIGOS_CONSULTA)]
+        if not partes: # Lista vacía: se devuelve la estructura de la capa sin registros.
+            partes = [gpd.read_file(ruta, where="1 = 0", **opciones)]
+        gdf = pd.concat(partes, ignore_index=True) if len(partes) > 1 else partes[0]
+    else:
+        gdf = gpd.read_file(ruta, where=_condicion_lectura(where=where), **opciones)
+
+    if incluir_vecinos and not gdf.empty:
+        # Una lectura por cada grupo de predios cercanos trae los vecinos de los mapas.
+        opciones.pop('bbox')
+        gdf = _unir_lecturas(gdf, [gpd.read_file(ruta, bbox=extension, **opciones) for extension in _extensiones_vecinos(gdf)])
+    return gdf
+
+def leer_predios_por_bloques(ruta, tamano_bloque=10000, codigos=None, bbox=None, where=None, columnas=None):
+    """Lee el catastro en bloques de tamaño fijo, con memoria acotada.
+
+    Con pyarrow instalado se usa el lector en streaming de pyogrio (una sola
+    pasada sobre el archivo); si no, se leen bloques sucesivos con
+    `skip_features`/`max_features`.
+
+    Args:
+        ruta (str): Archivo de predios.
+        tamano_bloque (int, optional): Número de predios por bloque. Defaults to 10000.
+        codigos, bbox, where, columnas: Filtros, igual que en `cargar_predios`.
+
+    Yields:
+        gpd.GeoDataFrame: Bloques de como máximo `tamano_bloque` predios.
+    """
+    if columnas is not None and 'Codigo_Cat' not in columnas:
+        columnas = ['Codigo_Cat'] + list(columnas)
+    condicion = _condicion_lectura(list(codigos) if codigos is not None else None, where)
+
+    try:
+        import pyarrow # noqa: F401 (solo se comprueba que está disponible)
+        from pyogrio import open_arrow
+    except ImportError:
+        open_arrow = None
+
+    if open_arrow is not None:
+        with open_arrow(ruta, where=condicion, bbox=bbox, columns=columnas, batch_size=tamano_bloque, use_pyarrow=True) as (meta, lector):
+            columna_geom = meta['geometry_name'] or 'wkb_geometry'
+            for lote_arrow in lector:
+                if lote_arrow.num_rows == 0:
+                    continue
+                df = lote_arrow.to_pandas()
+                geometria = gpd.GeoSeries.from_wkb(df.pop(columna_geom), crs=meta['crs'])
+                yield gpd.GeoDataFrame(df, geometry=geometria)
+        return
+
+    desplazamiento = 0
+    while True:
+        bloque = gpd.read_file(ruta, where=condicion, bbox=bbox, columns=columnas,
+                               skip_features=desplazamiento, max_features=tamano_bloque)
+        if bloque.empty:
+            return
+        yield bloque
+        desplazamiento += len(bloque)
+        if len(bloque) < tamano_bloque:
+            return
+
+# --- NORMALIZACIÓN Y CONTROL DE CALIDAD DEL CATASTRO ---
+COLUMNAS_NUMERICAS = ['Area_Escri', 'Shape__Area', 'Shape__Length', 'Longitud_N', 'Longitud_S', 'Longitud_E', 'Longitud_O']
+# Valor que muestra la ficha cuando falta un atributo de texto.
+COLUMNAS_TEXTO = {'Uso_de_Edi': 'No especificado', 'Lindero_No': 'No especificado', 'Lindero_Su': 'No especificado',
+                  'Lindero_Es': 'No especificado', 'Lindero_Oe': 'No especificado', 'Calle': 'No especificada'}
+TOLERANCIA_AREA = 0.05 # Diferencia relativa entre 'Area_Escri' y 'Shape__Area' que se marca como discrepancia.
+
+def normalizar_predios(gdf, tolerancia_area=TOLERANCIA_AREA, reparar_geometrias=True, imprimir=True):
+    """Limpia y tipa los atributos de todo el catastro en una sola pasada vectorizada.
+
+    Reemplaza la conversión campo a campo que hacía cada informe:
+
+    - Las columnas numéricas ('Area_Escri', 'Shape__Area', 'Longitud_*'...) se
+      convierten a float; los valores vacíos o no numéricos quedan en 0.0.
+    - Los atributos de texto vacíos se rellenan con su valor por defecto.
+    - Las geometrías inválidas se reparan con `shapely.make_valid` (columna
+      'Geometria_Reparada').
+    - Se marcan los predios cuya área de escritura difiere del área de la
+      geometría en más de `tolerancia_area` (columna 'Discrepancia_Area').
+
+    El resumen de calidad se guarda en `gdf.attrs['normalizacion']`, que también
+    indica a los informes que pueden leer las columnas sin validarlas.
+
+    Args:
+        gdf (gpd.GeoDataFrame): GeoDataFrame de predios.
+        tolerancia_area (float, optional): Diferencia relativa máxima entre
+            'Area_Escri' y 'Shape__Area'. Defaults to TOLERANCIA_AREA.
+        reparar_geometrias (bool, optional): Repara las geometrías inválidas.
+            Defaults to True.
+        imprimir (bool, optional): Muestra el resumen de calidad. Defaults to True.
+
+    Returns:
+        gpd.GeoDataFrame: Copia normalizada del GeoDataFrame.
+    """
+    gdf = gdf.copy()
+    resumen = {'predios': len(gdf), 'crs': "No definido", 'crs_geografico': False,
+               'numericos_invalidos': {}, 'numericos_vacios': {}, 'textos_vacios': {}}
+
+    # --- SISTEMA DE COORDENADAS (UNA SOLA VEZ PARA TODO EL CATASTRO) ---
+    if gdf.crs is not None:
+        try:
+            epsg = gdf.crs.to_epsg()
+            resumen['crs'] = f"{gdf.crs.name} (EPSG:{epsg})" if epsg else gdf.crs.name
+        except Exception:
+            resumen['crs'] = str(gdf.crs)
+        resumen['crs_geografico'] = bool(gdf.crs.is_geographic)
+
+    # --- COLUMNAS NUMÉRICAS ---
+    for columna in COLUMNAS_NUMERICAS:
+        original = gdf[columna] if columna in gdf.columns else pd.Series(np.nan, index=gdf.index)
+        valores = pd.to_numeric(original, errors='coerce')
+        vacios = original.isna() | (original.astype(str).str.strip() == '')
+        resumen['numericos_vacios'][columna] = int(vacios.sum())
+        resumen['numericos_invalidos'][columna] = int((valores.isna() & ~vacios).sum())
+        gdf[columna] = valores.fillna(0.0).astype(float)
+
+    # --- ATRIBUTOS DE TEXTO ---
+    for columna, defecto in COLUMNAS_TEXTO.items():
+        original = gdf[columna] if columna in gdf.columns else pd.Series(None, index=gdf.index, dtype=object)
+        vacios = original.isna() | (original.astype(str).str.strip() == '')
+        resumen['textos_vacios'][columna] = int(vacios.sum())
+        gdf[columna] = original.where(~vacios, defecto)
+
+    # --- GEOMETRÍAS ---
+    geometrias = np.asarray(gdf.geometry.values)
+    nulas = shapely.is_missing(geometrias) | shapely.is_empty(geometrias)
+    invalidas = ~nulas & ~shapely.is_valid(geometrias)
+    reparadas = invalidas if reparar_geometrias else np.zeros(len(gdf), dtype=bool)
+    if reparadas.any():
+        # 'structure' conserva el tipo poligonal y descarta las partes degeneradas.
+        geometrias = geometrias.copy()
+        try:
+            geometrias[reparadas] = shapely.make_valid(geometrias[reparadas], method='structure', keep_collapsed=False)
+        except TypeError: # Shapely < 2.1 solo ofrece el método por defecto.
+            geometrias[reparadas] = shapely.make_valid(geometrias[reparadas])
+        gdf[gdf.geometry.name] = gpd.GeoSeries(geometrias, index=gdf.index, crs=gdf.crs)
+    gdf['Geometria_Reparada'] = reparadas
+    resumen.update(geometrias_nulas=int(nulas.sum()), geometrias_invalidas=int(invalidas.sum()),
+                   geometrias_reparadas=int(reparadas.sum()))
+
+    # --- DISCREPANCIAS DE ÁREA ---
+    area_escritura = gdf['Area_Escri'].to_numpy()
+    area_geometria = gdf['Shape__Area'].to_numpy()
+    comparables = (area_escritura > 0) & (area_geometria > 0)
+    diferencia = np.abs(area_escritura - area_geometria) / np.where(comparables, area_geometria, 1.0)
+    gdf['Discrepancia_Area'] = comparables & (diferencia > tolerancia_area)
+    resumen.update(discrepancias_area=int(gdf['Discrepancia_Area'].sum()), tolerancia_area=tolerancia_area)
+
+    gdf.attrs['normalizacion'] = resumen
+    if imprimir:
+        imprimir_resumen_calidad(resumen)
+    return gdf
+
+def imprimir_resumen_calidad(resumen):
+    """Muestra el resumen de calidad de `normalizar_predios`."""
+    print(f"Control de calidad: {resumen['predios']} predios, CRS {resumen['crs']}.")
+    lineas = []
+    if resumen['crs'] == "No definido" or not resumen['crs_geografico']:
+        lineas.append("El CRS no es geográfico (WGS 84): no se podrán calcular las coordenadas UTM.")
+    for columna in COLUMNAS_NUMERICAS:
+        invalidos, vacios = resumen['numericos_invalidos'][columna], resumen['numericos_vacios'][columna]
+        if invalidos or vacios:
+            lineas.append(f"{columna}: {invalidos} valores no numéricos y {vacios} vacíos (se toman como 0).")
+    for columna, defecto in COLUMNAS_TEXTO.items():
+        if resumen['textos_vacios'][columna]:
+            lineas.append(f"{columna}: {resumen['textos_vacios'][columna]} valores vacíos (se muestra '{defecto}').")
+    if resumen['geometrias_nulas'] or resumen['geometrias_invalidas']:
+        lineas.append(f"Geometrías: {resumen['geometrias_nulas']} nulas o vacías, "
+                      f"{resumen['geometrias_invalidas']} inválidas ({resumen['geometrias_reparadas']} reparadas).")
+    if resumen['discrepancias_area']:
+        lineas.append(f"Áreas: {resumen['discrepancias_area']} predios con una diferencia mayor al "
+                      f"{resumen['tolerancia_area']:.0%} entre 'Area_Escri' y 'Shape__Area' (columna 'Discrepancia_Area').")
+    for linea in lineas or ["Sin observaciones."]:
+        print(f"  - {linea}")
+
+# --- CACHÉ COLUMNAR DEL CATASTRO (GEOPARQUET) ---
+VERSION_CACHE = 2
+FILAS_POR_GRUPO_CACHE = 10000 # Tamaño de los grupos de filas del archivo Parquet.
+
+def _ruta_cache_predios(ruta_origen):
+    """Ruta por defecto de la caché: junto al archivo de origen, con extensión '.cache.parquet'."""
+    return os.path.splitext(ruta_origen)[0] + '.cache.parquet'
+
+def _archivos_origen(ruta_origen, ruta_cache=None):
+    """Archivos que componen la capa de origen (un Shapefile incluye .dbf, .shx, .prj...).
+
+    Se excluyen la caché por defecto y, si se indica, `ruta_cache` con sus archivos
+    auxiliares ('.json', '.tmp'), que pueden compartir el nombre base del origen.
+    """
+    base = os.path.splitext(ruta_origen)[0]
+    directorio = os.path.dirname(ruta_origen) or "."
+    prefijo = os.path.basename(base) + "."
+    excluidos = set()
+    if ruta_cache is not None:
+        excluidos = {os.path.abspath(ruta_cache + sufijo) for sufijo in ("", ".json", ".tmp")}
+    archivos = [os.path.join(directorio, f) for f in os.listdir(directorio)
+                if f.startswith(prefijo) and not f.startswith(prefijo + "cache.")
+                and os.path.abspath(os.path.join(directorio, f)) not in excluidos]
+    return sorted(archivos) or [ruta_origen]
+
+def _estado_origen(ruta_origen, ruta_cache=None):
+    """Fecha de modificación y tamaño de cada archivo de la capa de origen."""
+    return {os.path.basename(f): [os.stat(f).st_mtime_ns, os.stat(f).st_size] for f in _archivos_origen(ruta_origen, ruta_cache)}
+
+def _hash_origen(ruta_origen, ruta_cache=None):
+    """Hash SHA-256 del contenido de los archivos de la capa de origen."""
+    import hashlib
+
+    h = hashlib.sha256()
+    for archivo in _archivos_origen(ruta_origen, ruta_cache):
+        h.update(os.path.basename(archivo).encode("utf-8"))
+        with open(archivo, "rb") as f:
+            for bloque in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloque)
+    return h.hexdigest()
+
+def construir_cache_predios(ruta_origen, ruta_cache=None, verificar_hash=False):
+    """Convierte la capa de origen en una caché GeoParquet ordenada por 'Codigo_Cat'.
+
+    Los predios se guardan ya normalizados (ver `normalizar_predios`), y los
+    registros se ordenan por código catastral en grupos de filas, de modo que la
+    lectura de un predio solo descomprime el grupo que lo contiene. Junto a la
+    caché se escribe un archivo '.json' con el estado del origen para invalidarla
+    cuando éste cambie y el resumen de calidad.
+
+    Args:
+        ruta_origen (str): Archivo de predios (Shapefile, GeoJSON, GeoPackage...).
+        ruta_cache (str, optional): Ruta del archivo Parquet. Por defecto se crea
+            junto al origen con extensión '.cache.parquet'.
+        verificar_hash (bool, optional): Guarda también el hash del contenido del
+            origen, para distinguir un cambio real de una simple modificación de
+            la fecha del archivo. Defaults to False.
+
+    Returns:
+        str: La ruta de la caché creada.
+    """
+    import json
+
+    ruta_cache = ruta_cache or _ruta_cache_predios(ruta_origen)
+    estado = _estado_origen(ruta_origen, ruta_cache)
+    gdf = gpd.read_file(ruta_origen)
+
+    # La normalización se paga una sola vez: las lecturas posteriores la reutilizan.
+    gdf = normalizar_predios(gdf)
+    gdf = gdf.sort_values('Codigo_Cat', kind='stable', na_position='last').reset_index(drop=True)
+
+    temporal = ruta_cache + ".tmp"
+    gdf.to_parquet(temporal, index=False, row_group_size=FILAS_POR_GRUPO_CACHE, write_covering_bbox=True)
+    os.replace(temporal, ruta_cache)
+
+    metadatos = {'version': VERSION_CACHE, 'origen': estado, 'predios': len(gdf),
+                 'normalizacion': gdf.attrs['normalizacion']}
+    if verificar_hash:
+        metadatos['sha256'] = _hash_origen(ruta_origen, ruta_cache)
+    with open(ruta_cache + ".json", "w", encoding="utf-8") as f:
+        json.dump(metadatos, f)
+    return ruta_cache
+
+def cache_vigente(ruta_origen, ruta_cache=None, verificar_hash=False):
+    """Indica si la caché existe y corresponde a la versión actual del origen.
+
+    Si la fecha o el tamaño de los archivos cambió pero la caché guarda el hash
+    del contenido y `verificar_hash` es True, se compara el hash antes de darla
+    por caducada.
+    """
+    import json
+
+    ruta_cache = ruta_cache or _ruta_cache_predios(ruta_origen)
+    try:
+        with open(ruta_cache + ".json", encoding="utf-8") as f:
+            metadatos = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if metadatos.get('version') != VERSION_CACHE or not os.path.exists(ruta_cache):
+        return False
+    estado = _estado_origen(ruta_origen, ruta_cache)
+    if metadatos.get('origen') == estado:
+        return True
+    if verificar_hash and metadatos.get('sha256') and metadatos['sha256'] == _hash_origen(ruta_origen, ruta_cache):
+        # El contenido no cambió: se actualiza el estado para no volver a calcular el hash.
+        metadatos['origen'] = estado
+        with open(ruta_cache + ".json", "w", encoding="utf-8") as f:
+            json.dump(metadatos, f)
+        return True
+    return False
+
+def cargar_cache_predios(ruta_origen, codigos=None, bbox=None, columnas=None, incluir_vecinos=False, ruta_cache=None, verificar_hash=False):
+    """Lee los predios desde la caché GeoParquet, reconstruyéndola si está caducada.
+
+    El archivo se abre con memoria mapeada y los filtros se aplican con las
+    estadísticas de los grupos de filas: como la caché está ordenada por
+    'Codigo_Cat', buscar un predio solo lee el grupo que lo contiene.
+
+    Args:
+        ruta_origen (str): Archivo de predios de origen.
+        codigos, bbox, columnas, incluir_vecinos: Igual que en `cargar_predios`.
+        ruta_cache (str, optional): Ruta de la caché. Defaults to None.
+        verificar_hash (bool, optional): Ver `cache_vigente`. Defaults to False.
+
+    Returns:
+        gpd.GeoDataFrame: Los predios leídos.
+    """
+    ruta_cache = ruta_cache or _ruta_cache_predios(ruta_origen)
+    if not cache_vigente(ruta_origen, ruta_cache, verificar_hash):
+        print(f"Construyendo la caché de predios en {ruta_cache}...")
+        construir_cache_predios(ruta_origen, ruta_cache, verificar_hash)
+
+    if columnas is not None and 'Codigo_Cat' not in columnas:
+        columnas = ['Codigo_Cat'] + list(columnas)
+    opciones = dict(columns=columnas, memory_map=True)
+    filtros = [('Codigo_Cat', 'in', list(dict.fromkeys(codigos)))] if codigos is not None else None
+    gdf = gpd.read_parquet(ruta_cache, bbox=bbox, filters=filtros, **opciones)
+
+    if incluir_vecinos and not gdf.empty:
+        gdf = _unir_lecturas(gdf, [gpd.read_parquet(ruta_cache, bbox=extension, **opciones) for extension in _extensiones_vecinos(gdf)])
+    return gdf
+
+# --- REPROYECCIÓN UTM AGRUPADA POR ZONA ---
+@functools.lru_cache(maxsize=None)
+def _obtener_transformador(crs_origen, crs_destino):
+    """Devuelve (y reutiliza) el transformador pyproj entre dos CRS.
+
+    Crear un `Transformer` es costoso; con esta caché se construye uno solo por
+    cada par de sistemas durante toda la vida del proceso.
+    """
+    return Transformer.from_crs(CRS.from_user_input(crs_origen), CRS.from_user_input(crs_destino), always_xy=True)
+
+def _transformar_geometrias(geometrias, transformador):
+    """Reproyecta un arreglo de geometrías shapely con una sola llamada vectorizada."""
+    def _transformar_coords(coords):
+        x, y = transformador.transform(coords[:, 0], coords[:, 1])
+        return np.column_stack([x, y])
+    return shapely.transform(geometrias, _transformar_coords)
+
+def precalcular_utm(gdf, posiciones=None):
+    """Asigna la zona UTM de cada predio y reproyecta los predios agrupados por zona.
+
+    Sustituye el cálculo por informe (centroide, zona y `to_crs` de un GeoDataFrame
+    de una fila) por una etapa previa: las zonas se calculan para todos los predios
+    en una sola pasada vectorizada y cada zona se reproyecta en bloque con un
+    transformador en caché.
+
+    Args:
+        gdf (gpd.GeoDataFrame): GeoDataFrame de predios en un CRS geográfico (WGS 84).
+        posiciones (iterable de int, optional): Posiciones (iloc) de los predios a
+            precalcular. Si es None se precalculan todos.
+
+    Returns:
+        pd.DataFrame: Tabla indexada por la posición (iloc) del predio en `gdf`, con
+                      las columnas 'utm_epsg', 'utm_nombre' y 'geometry_utm'. Los
+                      predios sin geometría tienen 'utm_epsg' igual a 0.
+
+    Raises:
+        ValueError: Si el GeoDataFrame no tiene CRS o su CRS no es geográfico.
+    """
+    if not gdf.crs:
+        raise ValueError("El GeoDataFrame de entrada no tiene un Sistema de Coordenadas (CRS) definido.")
+    if not gdf.crs.is_geographic:
+        raise ValueError(f"El CRS de entrada '{gdf.crs.name}' no es geográfico. Se esperaba WGS 84 (EPSG:4326).")
+
+    posiciones = np.arange(len(gdf)) if posiciones is None else np.asarray(list(posiciones), dtype=int)
+    geometrias = np.asarray(gdf.geometry.values)[posiciones]
+
+    # --- ZONA UTM DE CADA PREDIO (VECTORIZADO) ---
+    centroides = shapely.centroid(geometrias)
+    cx, cy = shapely.get_x(centroides), shapely.get_y(centroides)
+    validos = ~(np.isnan(cx) | np.isnan(cy))
+    zonas = np.zeros(len(posiciones), dtype=int)
+    zonas[validos] = np.clip(((cx[validos] + 180) // 6).astype(int) + 1, 1, 60)
+    norte = cy >= 0
+    epsg = np.where(validos, np.where(norte, 32600, 32700) + zonas, 0)
+
+    # --- REPROYECCIÓN EN BLOQUE POR ZONA ---
+    geometrias_utm = np.empty(len(posiciones), dtype=object)
+    crs_origen = gdf.crs.to_wkt()
+    for codigo_epsg in np.unique(epsg[validos]):
+        grupo = epsg == codigo_epsg
+        transformador = _obtener_transformador(crs_origen, f"EPSG:{codigo_epsg}")
+        geometrias_utm[grupo] = _transformar_geometrias(geometrias[grupo], transformador)
+
+    nombres = [f"WGS 84 / UTM zone {z}{'N' if n else 'S'}" if v else "" for z, n, v in zip(zonas, norte, validos)]
+    return pd.DataFrame({'utm_epsg': epsg, 'utm_nombre': nombres, 'geometry_utm': geometrias_utm}, index=posiciones)
+
+# --- MAPA VECTORIAL DEL PREDIO ---
+MARGEN_MAPA = 0.25 # Margen alrededor del predio, como fracción de su extensión.
+
+def _extension_mapa(bounds):
+    """Amplía la extensión (minx, miny, maxx, maxy) de un predio con el margen del mapa."""
+    minx, miny, maxx, maxy = bounds
+    dx = max(maxx - minx, 1e-9) * MARGEN_MAPA
+    dy = max(maxy - miny, 1e-9) * MARGEN_MAPA
+    return minx - dx, miny - dy, maxx + dx, maxy + dy
+
+def _extensiones_vecinos(gdf):
+    """Agrupa las extensiones de mapa de los predios en rectángulos que no se solapan.
+
+    Una sola extensión para todos los predios leería casi toda la capa cuando los
+    códigos están dispersos; con estos grupos se lee solo el entorno de cada
+    conjunto de predios cercanos.
+
+    Returns:
+        list[tuple]: Extensiones (minx, miny, maxx, maxy) a leer.
+    """
+    limites = gdf.geometry.bounds.dropna().to_numpy()
+    if len(limites) == 0:
+        return []
+    margen = np.maximum(limites[:, 2:] - limites[:, :2], 1e-9) * MARGEN_MAPA
+    cajas = shapely.box(*(limites[:, :2] - margen).T, *(limites[:, 2:] + margen).T)
+    # Se unen las cajas que se tocan hasta que las envolventes de los grupos sean disjuntas.
+    while True:
+        grupos = shapely.envelope(shapely.get_parts(shapely.union_all(cajas)))
+        if len(grupos) == len(cajas):
+            return [tuple(b) for b in shapely.bounds(grupos)]
+        cajas = grupos
+
+def _unir_lecturas(gdf, partes):
+    """Une las lecturas de `_extensiones_vecinos`, sin repetir los predios que caen en dos."""
+    if not partes:
+        return gdf
+    if len(partes) == 1:
+        return partes[0]
+    unidos = pd.concat(partes, ignore_index=True)
+    clave = pd.DataFrame({'codigo': unidos['Codigo_Cat'], 'wkb': shapely.to_wkb(np.asarray(unidos.geometry.values))})
+    return unidos[~clave.duplicated().to_numpy()].reset_index(drop=True)
+
+def _buscar_vecinos_mapa(gdf, posicion):
+    """Obtiene los predios visibles en el mapa de un predio con el índice espacial.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Catastro completo.
+        posicion (int): Posición (iloc) del predio reportado.
+
+    Returns:
+        list: Lista de (codigo_catastral, geometria) de los predios cuya geometría
+              intersecta la extensión del mapa, sin incluir el propio predio.
+    """
+    geom = gdf.geometry.iloc[posicion]
+    if geom is None or geom.is_empty:
+        return []
+    candidatos = gdf.sindex.query(shapely.box(*_extension_mapa(geom.bounds)), predicate='intersects')
+    candidatos = candidatos[candidatos != posicion]
+    return list(zip(gdf['Codigo_Cat'].iloc[candidatos], gdf.geometry.iloc[candidatos]))
+
+# Por encima de este número de vértices, el mapa no los etiqueta (serían ilegibles).
+MAX_ETIQUETAS_MAPA = 150
+
+def _num_vertices(geom):
+    """Número de vértices del predio: las coordenadas sin el cierre repetido de cada anillo."""
+    if geom is None or geom.is_empty:
+        return 0
+    return int(shapely.get_num_coordinates(geom)) - len(shapely.get_rings(shapely.get_parts(geom)))
+
+def _vertices_predio(geom_wgs84, geom_utm, tolerancia=0.0):
+    """Devuelve los vértices del predio que se listan en el cuadro de coordenadas.
+
+    Se recorren todas las partes de un multipolígono y todos sus anillos
+    (exterior y huecos) con operaciones vectorizadas de shapely. El último punto
+    de cada anillo (igual al primero) se excluye, de modo que el vértice i del
+    resultado corresponde a la etiqueta V-(i+1) de la tabla y del mapa.
+
+    Args:
+        geom_wgs84 (shapely.Geometry): Geometría del predio en coordenadas geográficas.
+        geom_utm (shapely.Geometry): La misma geometría en UTM, vértice a vértice.
+        tolerancia (float, optional): Si es mayor que 0, se omiten los vértices que
+            desaparecen al simplificar la geometría UTM con esa tolerancia (en
+            metros). Los vértices conservados son un subconjunto de los originales.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: Coordenadas UTM y
+            geográficas (N x 2), y para cada vértice el número de polígono y de
+            anillo (0 = exterior). Arreglos vacíos si el tipo de geometría no es
+            soportado.
+    """
+    vacio = np.empty((0, 2)), np.empty((0, 2)), np.empty(0, dtype=int), np.empty(0, dtype=int)
+    if geom_wgs84.geom_type not in ('Polygon', 'MultiPolygon'):
+        return vacio
+
+    partes_utm = shapely.get_parts(geom_utm)
+    partes_wgs = shapely.get_parts(geom_wgs84)
+    anillos_utm, num_poligono = shapely.get_rings(partes_utm, return_index=True)
+    anillos_wgs = shapely.get_rings(partes_wgs)
+    conteos = shapely.get_num_coordinates(anillos_utm)
+    if not len(conteos):
+        return vacio
+    # Número de anillo dentro de su polígono: 0 para el exterior, 1.. para los huecos.
+    inicio_poligono = np.r_[True, num_poligono[1:] != num_poligono[:-1]]
+    posicion = np.arange(len(num_poligono))
+    num_anillo = posicion - np.maximum.accumulate(np.where(inicio_poligono, posicion, 0))
+
+    coords_utm = shapely.get_coordinates(anillos_utm)
+    coords_wgs = shapely.get_coordinates(anillos_wgs)
+    conservar = np.ones(len(coords_utm), dtype=bool)
+    conservar[np.cumsum(conteos) - 1] = False # Punto de cierre de cada anillo.
+    if tolerancia and tolerancia > 0:
+        simplificada = shapely.simplify(geom_utm, tolerancia, preserve_topology=True)
+        restantes = shapely.get_coordinates(simplificada)
+        conservar &= np.isin(coords_utm[:, 0] + 1j * coords_utm[:, 1], restantes[:, 0] + 1j * restantes[:, 1])
+
+    poligono = np.repeat(num_poligono, conteos)[conservar]
+    anillo = np.repeat(num_anillo, conteos)[conservar]
+    return coords_utm[conservar], coords_wgs[conservar], poligono, anillo
+
+class _TablaCoordenadas(Flowable):
+    """Cuadro de coordenadas que se divide entre páginas en tiempo lineal.
+
+    Todas las filas tienen una altura fija, así que el número de filas que cabe
+    en el espacio disponible se calcula directamente y solo se construye una
+    `Table` de ReportLab por página (dividir una única `Table` grande vuelve a
+    medir todas las filas restantes en cada página). El encabezado se repite en
+    cada página.
+
+    Args:
+        encabezado (list): Celdas del encabezado.
+        filas (list[list[str]]): Filas de la tabla, ya formateadas.
+        filas_grupo (np.ndarray): Posiciones en `filas` de las filas que
+            identifican un polígono o anillo (ocupan todo el ancho).
+        anchos (list[float]): Ancho de cada columna.
+        inicio (int, optional): Primera fila de `filas` que contiene esta parte.
+    """
+    ALTO_ENCABEZADO = 0.8*cm
+    ALTO_FILA = 0.6*cm
+
+    def __init__(self, encabezado, filas, filas_grupo, anchos, inicio=0):
+        Flowable.__init__(self)
+        self.encabezado, self.filas, self.filas_grupo = encabezado, filas, filas_grupo
+        self.anchos, self.inicio = anchos, inicio
+        self.hAlign = 'CENTER'
+
+    def _tabla(self, fin):
+        estilos = [
+            ('BACKGROUND', (0, 0), (-1, 0), Color(0.9,0.9,0.9)),
+            ('GRID', (0,0), (-1,-1), 1, colors.black),
+            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+            ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+            ('VALIGN', (0,0), (-1,-1), 'MIDDLE')
+        ]
+        grupos = self.filas_grupo[(self.filas_grupo >= self.inicio) & (self.filas_grupo < fin)]
+        for fila in (grupos - self.inicio + 1).tolist():
+            estilos.extend([('SPAN', (0, fila), (-1, fila)), ('BACKGROUND', (0, fila), (-1, fila), Color(0.96,0.96,0.96)),
+                            ('FONTNAME', (0, fila), (-1, fila), 'Helvetica-Oblique'), ('ALIGN', (0, fila), (-1, fila), 'LEFT')])
+        tabla = Table([self.encabezado] + self.filas[self.inicio:fin], colWidths=self.anchos,
+                      rowHeights=[self.ALTO_ENCABEZADO] + [self.ALTO_FILA] * (fin - self.inicio))
+        tabla.setStyle(TableStyle(estilos))
+        tabla.rango = (self.inicio, fin)
+        return tabla
+
+    @property
+    def rango(self):
+        """Filas (inicio, fin) de `filas` que contiene esta parte de la tabla."""
+        return self.inicio, len(self.filas)
+
+    def parte(self, inicio, fin):
+        """Devuelve la `Table` con las filas [inicio, fin), como las que produce `split`."""
+        return _TablaCoordenadas(self.encabezado, self.filas, self.filas_grupo, self.anchos, inicio=inicio)._tabla(fin)
+
+    def wrap(self, availWidth, availHeight):
+        self.width = sum(self.anchos)
+        self.height = self.ALTO_ENCABEZADO + (len(self.filas) - self.inicio) * self.ALTO_FILA
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        caben = int((availHeight - self.ALTO_ENCABEZADO) // self.ALTO_FILA)
+        if caben <= 0:
+            return []
+        fin = self.inicio + caben
+        if fin >= len(self.filas):
+            return [self._tabla(len(self.filas))]
+        return [self._tabla(fin), _TablaCoordenadas(self.encabezado, self.filas, self.filas_grupo, self.anchos, inicio=fin)]
+
+    def draw(self):
+        tabla = self._tabla(len(self.filas))
+        tabla.wrapOn(self.canv, self.width, self.height)
+        tabla.drawOn(self.canv, 0, 0)
+
+def _tabla_coordenadas(utm_coords, wgs_coords, poligono, anillo, estilo_encabezado):
+    """Construye el cuadro de coordenadas a partir de los arreglos de vértices.
+
+    Las celdas se formatean de forma vectorizada. Si el predio tiene varias partes
+    o huecos, cada anillo va precedido de una fila que lo identifica.
+
+    Returns:
+        _TablaCoordenadas: Tabla que se divide entre páginas con encabezado repetido.
+    """
+    etiquetas = np.char.add("V-", np.arange(1, len(utm_coords) + 1).astype(str))
+    columnas = [etiquetas,
+                np.char.mod("%.2f", utm_coords[:, 0]), np.char.mod("%.2f", utm_coords[:, 1]),
+                np.char.mod("%.6f", wgs_coords[:, 0]), np.char.mod("%.6f", wgs_coords[:, 1])]
+    filas = np.column_stack(columnas).tolist()
+    encabezado = [Paragraph("<b>Punto</b>", estilo_encabezado), Paragraph("<b>Este (UTM)</b>", estilo_encabezado), Paragraph("<b>Norte (UTM)</b>", estilo_encabezado), Paragraph("<b>Longitud (°)</b>", estilo_encabezado), Paragraph("<b>Latitud (°)</b>", estilo_encabezado)]
+
+    cambios = np.flatnonzero(np.r_[True, (poligono[1:] != poligono[:-1]) | (anillo[1:] != anillo[:-1])])
+    filas_grupo = np.empty(0, dtype=int)
+    if len(cambios) > 1 or anillo[0] != 0:
+        # Se intercala una fila de grupo antes de cada anillo.
+        limites = np.r_[cambios, len(filas)]
+        con_grupos = []
+        for inicio, fin in zip(limites[:-1], limites[1:]):
+            texto = f"Polígono {poligono[inicio] + 1}"
+            texto += f" — Hueco {anillo[inicio]}" if anillo[inicio] else " — Contorno exterior"
+            con_grupos.append([texto, "", "", "", ""])
+            con_grupos.extend(filas[inicio:fin])
+        filas = con_grupos
+        filas_grupo = cambios + np.arange(len(cambios))
+    return _TablaCoordenadas(encabezado, filas, filas_grupo, [1.5*cm, 3.5*cm, 3.5*cm, 3.5*cm, 3.5*cm])
+
+def _longitud_escala(metros):
+    """Elige una longitud 'redonda' (1, 2 o 5 x 10^n metros) para la barra de escala."""
+    exponente = 10 ** np.floor(np.log10(metros))
+    for factor in (5, 2, 1):
+        if factor * exponente <= metros:
+            return factor * exponente
+    return exponente
+
+def _dibujar_mapa_predio(geom_utm, ancho, alto, vertices=None, vecinos=()):
+    """Dibuja el mapa del predio como un `Drawing` vectorial de ReportLab.
+
+    Incluye el polígono del predio (con sus huecos), los vértices etiquetados
+    igual que el cuadro de coordenadas, los predios vecinos recortados a la
+    extensión del mapa, una barra de escala y una flecha de norte.
+
+    Args:
+        geom_utm (shapely.Geometry): Geometría del predio en UTM (metros).
+        ancho (float): Ancho del dibujo en puntos.
+        alto (float): Alto del dibujo en puntos.
+        vertices (array-like, optional): Vértices UTM a etiquetar como V-1, V-2...
+            Con más de MAX_ETIQUETAS_MAPA vértices solo se marcan los puntos.
+        vecinos (iterable, optional): Pares (codigo_catastral, geometria_utm).
+
+    Returns:
+        reportlab.graphics.shapes.Drawing: El mapa listo para añadir al 'story'.
+    """
+    from reportlab.graphics.shapes import Drawing, Polygon as RLPolygon, Rect, Circle, String, Line
+
+    minx, miny, maxx, maxy = _extension_mapa(geom_utm.bounds)
+    escala = min(ancho / (maxx - minx), alto / (maxy - miny))
+    # Centra la extensión del predio dentro del dibujo.
+    dx = (ancho - (maxx - minx) * escala) / 2
+    dy = (alto - (maxy - miny) * escala) / 2
+
+    def a_pantalla(coords):
+        coords = np.asarray(coords)[:, :2]
+        puntos = np.column_stack([(coords[:, 0] - minx) * escala + dx, (coords[:, 1] - miny) * escala + dy])
+        return puntos.ravel().tolist()
+
+    def dibujar_poligonos(geom, relleno, borde, ancho_linea):
+        for poligono in getattr(geom, 'geoms', [geom]):
+            if poligono.geom_type != 'Polygon' or poligono.is_empty:
+                continue
+            d.add(RLPolygon(a_pantalla(poligono.exterior.coords), fillColor=relleno, strokeColor=borde, strokeWidth=ancho_linea))
+            for hueco in poligono.interiors:
+                d.add(RLPolygon(a_pantalla(hueco.coords), fillColor=colors.white, strokeColor=borde, strokeWidth=ancho_linea))
+
+    d = Drawing(ancho, alto)
+    d.add(Rect(0, 0, ancho, alto, fillColor=colors.white, strokeColor=gray, strokeWidth=0.5))
+
+    # --- PREDIOS VECINOS ---
+    for codigo_vecino, geom_vecino in vecinos:
+        recorte = shapely.clip_by_rect(geom_vecino, minx, miny, maxx, maxy)
+        if recorte.is_empty:
+            continue
+        dibujar_poligonos(recorte, Color(0.93, 0.93, 0.93), gray, 0.5)
+        punto = recorte.representative_point()
+        x, y = a_pantalla([(punto.x, punto.y)])
+        d.add(String(x, y, str(codigo_vecino), fontName='Helvetica', fontSize=6, fillColor=gray, textAnchor='middle'))
+
+    # --- PREDIO ---
+    dibujar_poligonos(geom_utm, Color(0.80, 0.86, 0.95), navy, 1.5)
+
+    # --- VÉRTICES ETIQUETADOS ---
+    if vertices is not None and len(vertices):
+        centro = geom_utm.centroid
+        cx, cy = a_pantalla([(centro.x, centro.y)])
+        puntos = a_pantalla(vertices)
+        for i in range(len(vertices)):
+            x, y = puntos[2 * i], puntos[2 * i + 1]
+            d.add(Circle(x, y, 1.8, fillColor=navy, strokeColor=None))
+            if len(vertices) > MAX_ETIQUETAS_MAPA:
+                continue
+            # La etiqueta se desplaza hacia afuera del predio.
+            vx, vy = x - cx, y - cy
+            norma = max(np.hypot(vx, vy), 1e-9)
+            d.add(String(x + 7 * vx / norma, y + 7 * vy / norma - 2.5, f"V-{i+1}", fontName='Helvetica-Bold',
+                         fontSize=7, fillColor=black, textAnchor='middle'))
+
+    # --- BARRA DE ESCALA ---
+    metros = _longitud_escala((maxx - minx) / 4)
+    largo = metros * escala
+    x0, y0 = 0.5 * cm, 0.5 * cm
+    for k in range(2):
+        d.add(Rect(x0 + k * largo / 2, y0, largo / 2, 4, fillColor=black if k == 0 else colors.white, strokeColor=black, strokeWidth=0.5))
+    etiqueta = f"{metros:g} m" if metros < 1000 else f"{metros / 1000:g} km"
+    d.add(String(x0, y0 + 7, "0", fontName='Helvetica', fontSize=7, textAnchor='middle'))
+    d.add(String(x0 + largo, y0 + 7, etiqueta, fontName='Helvetica', fontSize=7, textAnchor='middle'))
+
+    # --- FLECHA DE NORTE ---
+    nx, ny = ancho - 0.8 * cm, alto - 1.6 * cm
+    d.add(RLPolygon([nx - 5, ny, nx, ny + 18, nx + 5, ny, nx, ny + 5], fillColor=black, strokeColor=black, strokeWidth=0.5))
+    d.add(Line(nx, ny - 3, nx, ny + 5, strokeColor=black, strokeWidth=0.5))
+    d.add(String(nx, ny + 21, "N", fontName='Helvetica-Bold', fontSize=9, textAnchor='middle'))
+    return d
+
+# --- COLINDANCIAS A PARTIR DE LA GEOMETRÍA ---
+def _lado_cardinal(dx, dy):
+    """Clasifica vectorialmente direcciones (dx, dy) en 'Norte', 'Sur', 'Este' u 'Oeste'."""
+    angulo = np.degrees(np.arctan2(dy, dx))
+    return np.select([(angulo >= 45) & (angulo < 135), (angulo >= -135) & (angulo < -45), np.abs(angulo) < 45],
+                     ['Norte', 'Sur', 'Este'], default='Oeste')
+
+def calcular_colindancias(gdf, tolerancia=0.05, longitud_minima=0.01):
+    """Calcula los colindantes de todos los predios en una sola pasada espacial.
+
+    Consulta el índice espacial (STRtree) con todas las geometrías a la vez para
+    obtener los pares de predios que se tocan, y para cada par calcula en bloque
+    el tramo de lindero compartido, su longitud en metros y el lado cardinal del
+    predio en el que se encuentra (según la dirección desde el centroide del
+    predio hasta el centro del tramo).
+
+    Args:
+        gdf (gpd.GeoDataFrame): Catastro con la columna 'Codigo_Cat'.
+        tolerancia (float, optional): Distancia en metros dentro de la cual dos
+            linderos se consideran coincidentes, para absorber pequeños huecos o
+            traslapes de digitalización. Defaults to 0.05.
+        longitud_minima (float, optional): Longitud mínima en metros de un lindero
+            compartido; los contactos en un solo punto o menores se descartan.
+            Defaults to 0.01.
+
+    Returns:
+        pd.DataFrame: Tabla indexada por 'Codigo_Cat' (ordenada) con las columnas
+                      'Colindante', 'Lado' y 'Longitud'. Cada par aparece dos veces,
+                      una desde cada predio.
+    """
+    # Las longitudes se miden en metros: un CRS geográfico se proyecta completo,
+    # en una sola transformación, a la zona UTM que mejor lo representa.
+    geometrias = np.asarray(gdf.geometry.values)
+    if gdf.crs is not None and gdf.crs.is_geographic:
+        transformador = _obtener_transformador(gdf.crs.to_wkt(), gdf.estimate_utm_crs().to_wkt())
+        geometrias = _transformar_geometrias(geometrias, transformador)
+
+    # --- PARES CANDIDATOS (UNA SOLA CONSULTA AL ÍNDICE ESPACIAL) ---
+    arbol = shapely.STRtree(geometrias)
+    i, j = arbol.query(geometrias, predicate='dwithin', distance=tolerancia)
+    unicos = i < j
+    i, j = i[unicos], j[unicos]
+
+    # --- LINDEROS COMPARTIDOS Y SU LONGITUD ---
+    # Antes de intersecar, el borde de un predio se ajusta (snap) al del otro para
+    # que los tramos comunes coincidan exactamente pese a los errores de digitalización.
+    bordes = shapely.boundary(geometrias)
+    compartidos = shapely.intersection(shapely.snap(bordes[i], bordes[j], tolerancia), bordes[j])
+    longitudes = shapely.length(compartidos)
+    validos = longitudes > longitud_minima
+    i, j, compartidos, longitudes = i[validos], j[validos], compartidos[validos], longitudes[validos]
+
+    # --- LADO CARDINAL DESDE CADA PREDIO ---
+    centroides = shapely.centroid(geometrias)
+    medios = shapely.centroid(compartidos) # Punto medio (ponderado por longitud) del tramo.
+    mx, my = shapely.get_x(medios), shapely.get_y(medios)
+    cx, cy = shapely.get_x(centroides), shapely.get_y(centroides)
+    lado_i = _lado_cardinal(mx - cx[i], my - cy[i])
+    lado_j = _lado_cardinal(mx - cx[j], my - cy[j])
+
+    codigos = gdf['Codigo_Cat'].to_numpy()
+    tabla = pd.DataFrame({
+        'Codigo_Cat': np.concatenate([codigos[i], codigos[j]]),
+        'Colindante': np.concatenate([codigos[j], codigos[i]]),
+        'Lado': np.concatenate([lado_i, lado_j]),
+        'Longitud': np.concatenate([longitudes, longitudes]),
+    })
+    return tabla.sort_values(['Codigo_Cat', 'Lado', 'Longitud'], ascending=[True, True, False]).set_index('Codigo_Cat')
+
+def cargar_colindancias(ruta):
+    """Lee una tabla de colindancias guardada en Parquet o CSV y la deja indexada."""
+    tabla = pd.read_parquet(ruta) if ruta.endswith('.parquet') else pd.read_csv(ruta, dtype={'Codigo_Cat': str, 'Colindante': str})
+    if 'Codigo_Cat' in tabla.columns:
+        tabla = tabla.set_index('Codigo_Cat')
+    return tabla.sort_index()
+
+def guardar_colindancias(tabla, ruta):
+    """Guarda la tabla de colindancias en Parquet o CSV según la extensión."""
+    if ruta.endswith('.parquet'):
+        tabla.to_parquet(ruta)
+    else:
+        tabla.to_csv(ruta)
+
+def _linderos_geometricos(filas):
+    """Resume las colindancias de un predio por lado cardinal.
+
+    Args:
+        filas (pd.DataFrame): Filas de la tabla de colindancias de un predio.
+
+    Returns:
+        dict: {lado: (texto de colindantes, longitud total en metros)}.
+    """
+    lados = {}
+    for lado, grupo in filas.groupby('Lado', sort=False):
+        texto = ", ".join(f"Predio {c} ({l:.2f} m)" for c, l in zip(grupo['Colindante'], grupo['Longitud']))
+        lados[lado] = (texto, float(grupo['Longitud'].sum()))
+    return lados
+
+# --- MÉTRICAS E INSTRUMENTACIÓN ---
+# Lista donde se acumulan las advertencias del informe en curso. Es una variable
+# de contexto para que cada hilo (p. ej. en el servicio residente) tenga la suya.
+_ADVERTENCIAS = contextvars.ContextVar('advertencias_informe', default=None)
+
+def _advertir(mensaje, imprimir=True):
+    """Muestra una advertencia y la registra en el resultado del informe en curso."""
+    if imprimir:
+        print(f"Advertencia: {mensaje}")
+    advertencias = _ADVERTENCIAS.get()
+    if advertencias is not None:
+        advertencias.append(mensaje)
+
+@dataclasses.dataclass
+class ResultadoInforme:
+    """Resultado detallado de `generar_informe_predio_pdf`.
+
+    Se puede desempaquetar como la tupla `(exito, mensaje)` que devolvía la
+    función originalmente: `ok, mensaje = generar_informe_predio_pdf(...)`.
+
+    Attributes:
+        ok (bool): True si el PDF se generó correctamente.
+        mensaje (str): Mensaje descriptivo del resultado.
+        codcat (str): Código catastral del predio.
+        duraciones (dict[str, float]): Segundos de cada fase ('busqueda',
+            'vecinos', 'reproyeccion', 'story', 'build' o, con el motor de plantillas,
+            'estampado', y 'total').
+        tamano_bytes (int): Tamaño del PDF generado.
+        paginas (int): Número de páginas del PDF.
+        vertices (int): Número de vértices de la geometría del predio.
+        advertencias (list[str]): Advertencias emitidas durante la generación.
+        contenido (bytes): Contenido del PDF cuando se genera en memoria
+            (`output_filename=None`); None en otro caso.
+    """
+    ok: bool
+    mensaje: str
+    codcat: str = None
+    duraciones: dict = dataclasses.field(default_factory=dict)
+    tamano_bytes: int = 0
+    paginas: int = 0
+    vertices: int = 0
+    advertencias: list = dataclasses.field(default_factory=list)
+    contenido: bytes = dataclasses.field(default=None, repr=False)
+
+    def __iter__(self):
+        return iter((self.ok, self.mensaje))
+
+    def __getitem__(self, i):
+        return (self.ok, self.mensaje)[i]
+
+class MetricasPrometheus:
+    """Acumula métricas de los informes y las exporta en formato de texto de Prometheus.
+
+    Se pasa como `metricas` a `generar_informe_predio_pdf` (o a cualquier función
+    de generación por lotes); el archivo escrito con `escribir` puede leerlo el
+    colector 'textfile' de node_exporter.
+
+    Ejemplo:
+        metricas = MetricasPrometheus()
+        for _ in generar_informes_lote(gdf, output_dir="informes", metricas=metricas):
+            pass
+        metricas.escribir("/var/lib/node_exporter/predio_report.prom")
+    """
+    PREFIJO = "predio_report"
+
+    def __init__(self):
+        import threading
+
+        self._bloqueo = threading.Lock()
+        self.informes = {'ok': 0, 'error': 0}
+        self.fases_segundos = {}
+        self.fases_cuenta = {}
+        self.tamano_bytes = self.paginas = self.vertices = self.advertencias = 0
+
+    def __call__(self, resultado):
+        with self._bloqueo:
+            self.informes['ok' if resultado.ok else 'error'] += 1
+            for fase, duracion in resultado.duraciones.items():
+                self.fases_segundos[fase] = self.fases_segundos.get(fase, 0.0) + duracion
+                self.fases_cuenta[fase] = self.fases_cuenta.get(fase, 0) + 1
+            self.tamano_bytes += resultado.tamano_bytes
+            self.paginas += resultado.paginas
+            self.vertices += resultado.vertices
+            self.advertencias += len(resultado.advertencias)
+
+    def texto(self):
+        """Devuelve las métricas en el formato de exposición de texto de Prometheus."""
+        p = self.PREFIJO
+        with self._bloqueo:
+            lineas = [f"# HELP {p}_informes_total Informes generados por resultado.",
+                      f"# TYPE {p}_informes_total counter"]
+            lineas += [f'{p}_informes_total{{resultado="{r}"}} {n}' for r, n in self.informes.items()]
+            lineas += [f"# HELP {p}_fase_segundos Tiempo dedicado a cada fase del informe.",
+                       f"# TYPE {p}_fase_segundos summary"]
+            for fase in self.fases_segundos:
+                lineas.append(f'{p}_fase_segundos_sum{{fase="{fase}"}} {self.fases_segundos[fase]:.6f}')
+                lineas.append(f'{p}_fase_segundos_count{{fase="{fase}"}} {self.fases_cuenta[fase]}')
+            for nombre, valor, ayuda in (('bytes_total', self.tamano_bytes, "Bytes de PDF escritos."),
+                                         ('paginas_total', self.paginas, "Páginas de PDF generadas."),
+                                         ('vertices_total', self.vertices, "Vértices de los predios reportados."),
+                                         ('advertencias_total', self.advertencias, "Advertencias emitidas.")):
+                lineas += [f"# HELP {p}_{nombre} {ayuda}", f"# TYPE {p}_{nombre} counter", f"{p}_{nombre} {valor}"]
+        return "\n".join(lineas) + "\n"
+
+    def escribir(self, ruta):
+        """Escribe las métricas en `ruta` de forma atómica (archivo temporal y reemplazo)."""
+        temporal = ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            f.write(self.texto())
+        os.replace(temporal, ruta)
+
+def _notificar(resultado, metricas):
+    """Entrega el resultado al callback de métricas, si lo hay, y lo devuelve."""
+    if metricas is not None:
+        metricas(resultado)
+    return resultado
+
+def generar_informe_predio_pdf(gdf, codcat, output_filename, autor="Cartography Hub", fecha_reporte=None, logo_path=None, map_image_path=None, indice_codcat=None, utm_precalculado=None, mapa_vectorial=True, mapa_vecinos=True, colindancias=None, tolerancia_vertices=0.0, metricas=None, motor="reportlab"):
     """Genera un informe técnico completo de un predio en formato PDF.
 
     Esta función toma un GeoDataFrame, filtra un predio específico por su código
@@ -172,7 +1218,10 @@ def generar_informe_predio_pdf(gdf, codcat, output_filename, autor="Cartography
         gdf (gpd.GeoDataFrame): GeoDataFrame que contiene los datos de los predios.
             Debe tener una columna 'Codigo_Cat' y una geometría válida.
         codcat (str): El código catastral del predio a buscar en el GeoDataFrame.
-        output_filename (str): La ruta y nombre del archivo PDF a generar (ej: "informe.pdf").
+        output_filename (str, archivo binario o None): La ruta y nombre del archivo PDF
+            a generar (ej: "informe.pdf"), cualquier objeto binario con método
+            `write` (p. ej. `io.BytesIO` o la respuesta de un servidor web), o None
+            para generar el PDF en memoria y devolverlo en `resultado.contenido`.
         autor (str, optional): Nombre del autor del informe. Defaults to "Cartography Hub".
         fecha_reporte (datetime.date or str, optional): La fecha para el informe.
             Si es una cadena, debe estar en formato 'YYYY-MM-DD'. Si es None, se
@@ -180,29 +1229,90 @@ def generar_informe_predio_pdf(gdf, codcat, output_filename, autor="Cartography
         logo_path (str, optional): Ruta al archivo de imagen del logo para la portada
             y el encabezado. Defaults to None.
         map_image_path (str, optional): Ruta a una imagen del mapa del predio para
-            incluir en el informe. Defaults to None.
+            incluir en el informe. Si es None, el mapa se dibuja a partir de la
+            geometría del predio. Defaults to None.
+        indice_codcat (dict, optional): Índice creado con `construir_indice_codcat`.
+            Si se proporciona, la búsqueda del predio es directa en lugar de
+            recorrer todo el GeoDataFrame. Defaults to None.
+        utm_precalculado (pd.DataFrame, optional): Resultado de `precalcular_utm`
+            sobre el mismo GeoDataFrame. Si contiene el predio, se usa su
+            geometría UTM en lugar de reproyectarlo. Defaults to None.
+        mapa_vectorial (bool, optional): Si no se indica `map_image_path`, dibuja
+            el mapa del predio como gráficos vectoriales. Defaults to True.
+        mapa_vecinos (bool, optional): Incluye en el mapa los predios vecinos,
+            obtenidos con el índice espacial del GeoDataFrame. Defaults to True.
+        colindancias (pd.DataFrame, optional): Tabla de `calcular_colindancias`.
+            Si contiene el predio, los linderos se toman de la geometría en lugar
+            de las columnas 'Lindero_*' y 'Longitud_*'. Defaults to None.
+        tolerancia_vertices (float, optional): Tolerancia en metros para omitir
+            del cuadro de coordenadas los vértices casi alineados (por ejemplo, en
+            lotes curvos). Con 0 se listan todos. Defaults to 0.0.
+        metricas (callable, optional): Función que recibe el `ResultadoInforme`
+            al terminar cada informe (por ejemplo, un `MetricasPrometheus`).
+            Defaults to None.
+        motor (str, optional): 'reportlab' compone cada ficha completa; 'pymupdf'
+            compone una sola vez la parte fija de cada diseño de ficha y estampa
+            sobre ella los datos del predio (requiere PyMuPDF). Las fichas que no
+            admiten plantilla se generan con ReportLab. Defaults to "reportlab".
 
     Returns:
-        tuple[bool, str]: Una tupla donde el primer elemento es True si la
-                         generación fue exitosa y False en caso contrario. El segundo
-                         elemento es un mensaje descriptivo del resultado.
+        ResultadoInforme: Resultado con la duración de cada fase, el tamaño, las
+                          páginas y las advertencias. Se desempaqueta como una
+                          tupla `(exito, mensaje)`, donde el primer elemento es True
+                          si la generación fue exitosa y el segundo es un mensaje
+                          descriptivo del resultado.
     """
+    inicio = time.perf_counter()
     # --- 1. VALIDACIÓN DE DATOS Y EXTRACCIÓN DEL PREDIO ---
     # Asegura que los datos de entrada sean correctos antes de procesar.
     if not isinstance(gdf, gpd.GeoDataFrame):
-        return False, "Error: El primer argumento debe ser un GeoDataFrame."
+        return _notificar(ResultadoInforme(False, "Error: El primer argumento debe ser un GeoDataFrame.", codcat), metricas)
     if 'Codigo_Cat' not in gdf.columns:
-        return False, "Error: El GeoDataFrame no contiene la columna 'Codigo_Cat'."
+        return _notificar(ResultadoInforme(False, "Error: El GeoDataFrame no contiene la columna 'Codigo_Cat'.", codcat), metricas)
+    if motor not in MOTORES_PDF:
+        return _notificar(ResultadoInforme(False, f"Error: Motor de PDF no reconocido: {motor}. Opciones: {', '.join(MOTORES_PDF)}.", codcat), metricas)
 
     # Filtra el GeoDataFrame para obtener solo la fila del predio de interés.
-    gdf_filtrado = gdf[gdf['Codigo_Cat'] == codcat].copy()
-    if gdf_filtrado.empty:
-        return False, f"Error: No se encontró ningún predio con el Código Catastral: {codcat}"
+    # Con un índice precalculado se toma directamente la posición de la fila.
+    if indice_codcat is not None:
+        posiciones = indice_codcat.get(codcat, [])
+    else:
+        posiciones = np.flatnonzero((gdf['Codigo_Cat'] == codcat).to_numpy())
+    if len(posiciones) == 0:
+        return _notificar(ResultadoInforme(False, f"Error: No se encontró ningún predio con el Código Catastral: {codcat}", codcat), metricas)
+    gdf_filtrado = gdf.iloc[posiciones[:1]]
 
-    # Extrae la primera (y única) fila de datos del predio.
-    predio_data = gdf_filtrado.iloc[0]
+    utm = None
+    if utm_precalculado is not None and posiciones[0] in utm_precalculado.index:
+        fila_utm = utm_precalculado.loc[posiciones[0]]
+        if fila_utm['utm_epsg']:
+            utm = (int(fila_utm['utm_epsg']), fila_utm['utm_nombre'], fila_utm['geometry_utm'])
 
-    # --- 2. FORMATEO DE FECHA ---
+    # La búsqueda de vecinos en el índice espacial se mide como una fase propia.
+    duraciones = {'busqueda': time.perf_counter() - inicio}
+    vecinos = None
+    if mapa_vectorial and mapa_vecinos and not map_image_path:
+        marca = time.perf_counter()
+        vecinos = _buscar_vecinos_mapa(gdf, posiciones[0])
+        duraciones['vecinos'] = time.perf_counter() - marca
+
+    return _generar_informe_desde_fila(gdf_filtrado, codcat, output_filename, autor=autor,
+                                       fecha_reporte=fecha_reporte, logo_path=logo_path,
+                                       map_image_path=map_image_path, crs=gdf.crs, utm=utm,
+                                       mapa_vectorial=mapa_vectorial, vecinos=vecinos,
+                                       colindancias=colindancias, tolerancia_vertices=tolerancia_vertices,
+                                       metricas=metricas, inicio=inicio, duraciones=duraciones, motor=motor)
+
+def _formatear_fecha(fecha_reporte):
+    """Convierte la fecha del informe al texto que se muestra en el PDF.
+
+    Args:
+        fecha_reporte (datetime.date, str o None): Fecha del informe. Una cadena
+            debe estar en formato 'YYYY-MM-DD'; None equivale a la fecha actual.
+
+    Returns:
+        str: La fecha en español ("dd de Mes de YYYY").
+    """
     # Procesa la fecha de entrada para mostrarla en un formato legible.
     if fecha_reporte is None:
         fecha_dt = datetime.now()
@@ -210,231 +1320,1878 @@ def generar_informe_predio_pdf(gdf, codcat, output_filename, autor="Cartography
         try:
             fecha_dt = datetime.strptime(fecha_reporte, "%Y-%m-%d")
         except ValueError:
-            print("Advertencia: Formato de fecha no reconocido (se esperaba YYYY-MM-DD). Usando fecha actual.")
+            _advertir("Formato de fecha no reconocido (se esperaba YYYY-MM-DD). Usando fecha actual.")
             fecha_dt = datetime.now()
     elif hasattr(fecha_reporte, 'strftime'): # Comprueba si es un objeto de fecha/datetime
          fecha_dt = fecha_reporte
     else:
-         print("Advertencia: Tipo de fecha no reconocido. Usando fecha actual.")
+         _advertir("Tipo de fecha no reconocido. Usando fecha actual.")
          fecha_dt = datetime.now()
     # Formatea la fecha al español ("dd de Mes de YYYY").
-    fecha_str = fecha_dt.strftime("%d de %B de %Y").capitalize()
+    return fecha_dt.strftime("%d de %B de %Y").capitalize()
 
-    # --- 3. EXTRACCIÓN DE ATRIBUTOS DEL PREDIO ---
-    # Obtiene cada valor de las columnas del GeoDataFrame con manejo de errores y valores por defecto.
-    uso_edi = predio_data.get('Uso_de_Edi', 'No especificado')
-    lindero_n = predio_data.get('Lindero_No', 'No especificado')
-    lindero_s = predio_data.get('Lindero_Su', 'No especificado')
-    lindero_e = predio_data.get('Lindero_Es', 'No especificado')
-    lindero_o = predio_data.get('Lindero_Oe', 'No especificado')
-    try: long_n = float(predio_data.get('Longitud_N', 0.0))
-    except (ValueError, TypeError): long_n = 0.0
-    try: long_s = float(predio_data.get('Longitud_S', 0.0))
-    except (ValueError, TypeError): long_s = 0.0
-    try: long_e = float(predio_data.get('Longitud_E', 0.0))
-    except (ValueError, TypeError): long_e = 0.0
-    try: long_o = float(predio_data.get('Longitud_O', 0.0))
-    except (ValueError, TypeError): long_o = 0.0
-    try: area_esc = float(predio_data.get('Area_Escri', 0.0))
-    except (ValueError, TypeError): area_esc = 0.0
-    calle = predio_data.get('Calle', 'No especificada')
-    try: shape_area = float(predio_data.get('Shape__Area', 0.0))
-    except (ValueError, TypeError): shape_area = 0.0
-    try: shape_len = float(predio_data.get('Shape__Length', 0.0))
-    except (ValueError, TypeError): shape_len = 0.0
+def _generar_informe_desde_fila(gdf_filtrado, codcat, output_filename, autor="Cartography Hub", fecha_reporte=None, logo_path=None, map_image_path=None, crs=None, utm=None, mapa_vectorial=True, vecinos=None, colindancias=None, tolerancia_vertices=0.0, metricas=None, inicio=None, duraciones=None, motor="reportlab"):
+    """Genera el PDF a partir del GeoDataFrame de una sola fila ya localizado.
 
-    # --- 4. MANEJO DEL SISTEMA DE COORDENADAS (CRS) ---
-    try:
-        crs_info = f"{gdf.crs.name} (EPSG:{gdf.crs.to_epsg()})" if gdf.crs else "No definido"
-    except Exception:
-        crs_info = str(gdf.crs) if gdf.crs else "No definido"
+    Contiene el cuerpo de `generar_informe_predio_pdf` una vez resuelta la
+    búsqueda del predio, para que el modo por lotes pueda reutilizarlo sin
+    repetir la validación ni el filtrado.
+
+    Args:
+        gdf_filtrado (gpd.GeoDataFrame): GeoDataFrame con la fila del predio.
+        crs (pyproj.CRS, optional): CRS del catastro de origen. Si es None se
+            usa el de `gdf_filtrado`.
+        utm (tuple, optional): (epsg, nombre_sistema, geometria_utm) precalculados
+            con `precalcular_utm`. Si es None se reproyecta el predio aquí.
+        mapa_vectorial (bool, optional): Dibuja el mapa del predio si no se indica
+            `map_image_path`. Defaults to True.
+        vecinos (list, optional): Lista de (codigo_catastral, geometria) en el CRS
+            de origen con los predios vecinos que se dibujan en el mapa.
+        colindancias (pd.DataFrame, optional): Tabla de `calcular_colindancias`.
+        metricas (callable, optional): Ver `generar_informe_predio_pdf`.
+        inicio (float, optional): Instante (`time.perf_counter`) en que empezó la
+            búsqueda del predio, para medir la duración total.
+        duraciones (dict, optional): Fases ya medidas por quien llama ('busqueda'
+            y 'vecinos'), que se copian al resultado.
+        motor (str, optional): Ver `generar_informe_predio_pdf`.
+
+    Returns:
+        ResultadoInforme: Igual que `generar_informe_predio_pdf`.
+    """
+    resultado = ResultadoInforme(False, "", codcat, duraciones=dict(duraciones or {}))
+    marca = time.perf_counter()
+    if inicio is None:
+        inicio = marca
+    contexto = _ADVERTENCIAS.set(resultado.advertencias)
+    en_memoria = output_filename is None
+    if en_memoria:
+        import io
+        output_filename = io.BytesIO()
+    # Los destinos que no son una ruta se envuelven para contar los bytes escritos.
+    salida = output_filename if isinstance(output_filename, (str, os.PathLike)) else _SalidaContada(output_filename)
 
     try:
-        # --- 5. CONFIGURACIÓN DEL DOCUMENTO PDF ---
-        doc = SimpleDocTemplate(output_filename,
-                                pagesize=(21*cm, 21*cm), # Formato cuadrado personalizado
-                                leftMargin=1.5*cm, rightMargin=1.5*cm,
-                                topMargin=2.0*cm, bottomMargin=2.5*cm)
-
-        # Se añaden parámetros personalizados al objeto 'doc' para que estén
-        # disponibles en la función de la portada (portada_canvas).
-        doc.codcat_param = codcat
-        doc.fecha_param = fecha_str
-        doc.logo_path_param = logo_path
+        # --- 2. FORMATEO DE FECHA ---
+        fecha_str = _formatear_fecha(fecha_reporte)
+
+        # --- 4. REPROYECCIÓN A UTM ---
+        # Si falla, la sección de coordenadas muestra el error en el informe.
+        if utm is None:
+            try:
+                fila_utm = precalcular_utm(gdf_filtrado).iloc[0]
+                if fila_utm['utm_epsg']:
+                    utm = (int(fila_utm['utm_epsg']), fila_utm['utm_nombre'], fila_utm['geometry_utm'])
+            except ValueError:
+                pass
+        geom = gdf_filtrado.geometry.iloc[0]
+        resultado.vertices = _num_vertices(geom)
+        marca = _medir(resultado, 'reproyeccion', marca)
 
-        # --- 6. DEFINICIÓN DE ESTILOS DE PÁRRAFO ---
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(name='TitleStyle', parent=styles['h1'], fontSize=18, alignment=TA_CENTER, textColor=navy, spaceAfter=14)
-        heading1_style = ParagraphStyle(name='Heading1Style', parent=styles['h2'], fontSize=14, textColor=navy, leftIndent=0, spaceBefore=12, spaceAfter=6)
-        heading2_style = ParagraphStyle(name='Heading2Style', parent=styles['h3'], fontSize=11, textColor=black, leftIndent=0, spaceBefore=8, spaceAfter=4)
-        body_style = ParagraphStyle(name='BodyStyle', parent=styles['Normal'], fontSize=10, alignment=TA_JUSTIFY, spaceAfter=6, leading=14)
-        list_item_style = ParagraphStyle(name='ListItemStyle', parent=body_style, leftIndent=1*cm, spaceAfter=2)
-        code_style = ParagraphStyle(name='CodeStyle', parent=styles['Code'], fontSize=9, textColor=gray, leftIndent=0, spaceBefore=0, spaceAfter=6)
-        caption_style = ParagraphStyle(name='CaptionStyle', parent=styles['Normal'], fontSize=9, alignment=TA_CENTER, textColor=gray, fontName='Helvetica-Oblique')
-        table_header_style = ParagraphStyle(name='TableHeader', parent=body_style, fontName='Helvetica-Bold', alignment=TA_CENTER)
-        table_cell_style = ParagraphStyle(name='TableCell', parent=body_style, alignment=TA_RIGHT)
+        # --- 5. CONFIGURACIÓN DEL DOCUMENTO PDF ---
+        doc = _documento_ficha(salida, codcat, fecha_str, logo_path)
 
         # --- 7. CONSTRUCCIÓN DEL CONTENIDO DEL PDF ('story') ---
-        # 'story' es una lista de objetos de ReportLab (párrafos, imágenes, etc.) que se dibujarán en el PDF.
-        story = []
-
         # Se inserta un salto de página al principio. Esto asegura que el contenido
         # del informe comience en la página 2, dejando la página 1 vacía para
         # que sea dibujada por la función `portada_canvas`.
-        story.append(PageBreak())
-
-        # --- Sección de Encabezado (Página 2 en adelante) ---
-        if logo_path and os.path.exists(logo_path):
-             try:
-                 img = Image(logo_path, width=4*cm, height=2*cm)
-                 img.hAlign = 'CENTER'
-                 story.append(img)
-                 story.append(Spacer(1, 0.5*cm))
-             except Exception as img_err:
-                 print(f"Advertencia: No se pudo cargar el logo '{logo_path}': {img_err}")
-        story.append(Paragraph("INFORME TÉCNICO DE PREDIO URBANO", title_style))
-        story.append(Spacer(1, 0.5*cm))
-        story.append(Paragraph(f"<b>Ciudad:</b> Guayaquil", body_style))
-        story.append(Paragraph(f"<b>Fecha:</b> {fecha_str}", body_style))
-        story.append(Paragraph(f"<b>Código Catastral:</b> {codcat}", body_style))
-        story.append(Spacer(1, 0.7*cm))
-
-        # --- Sección 1: Identificación ---
-        story.append(Paragraph("1. Identificación del Predio", heading1_style))
-        story.append(Paragraph(f"<b>Código Catastral:</b> {codcat}", body_style))
-        story.append(Paragraph(f"<b>Ubicación:</b> Frente a la Calle {calle}", body_style))
-        story.append(Spacer(1, 0.3*cm))
-
-        # --- Sección 2: Características ---
-        story.append(Paragraph("2. Características Generales", heading1_style))
-        story.append(Paragraph(f"<b>Uso Principal:</b> {uso_edi}", body_style))
-        story.append(Paragraph(f"<b>Área según Escritura:</b> {area_esc:.2f} m² ({num_a_letras(area_esc)} metros cuadrados)", body_style))
-        story.append(Spacer(1, 0.3*cm))
-
-        # --- Sección 3: Linderos ---
-        story.append(Paragraph("3. Linderos y Dimensiones", heading1_style))
-        story.append(Paragraph("Se detallan los colindantes y las longitudes aproximadas de cada lindero:", body_style))
-        story.append(Spacer(1, 0.2*cm))
-        story.append(Paragraph("<b>Lindero Norte:</b>", heading2_style))
-        story.append(Paragraph(f"Colinda con: {lindero_n}", list_item_style))
-        story.append(Paragraph(f"Longitud: {long_n:.2f} metros", list_item_style))
-        # (Se repite para Sur, Este y Oeste)
-        story.append(Paragraph("<b>Lindero Sur:</b>", heading2_style))
-        story.append(Paragraph(f"Colinda con: {lindero_s}", list_item_style))
-        story.append(Paragraph(f"Longitud: {long_s:.2f} metros", list_item_style))
-        story.append(Paragraph("<b>Lindero Este:</b>", heading2_style))
-        story.append(Paragraph(f"Colinda con: {lindero_e}", list_item_style))
-        story.append(Paragraph(f"Longitud: {long_e:.2f} metros", list_item_style))
-        story.append(Paragraph("<b>Lindero Oeste:</b>", heading2_style))
-        story.append(Paragraph(f"Colinda con: {lindero_o}", list_item_style))
-        story.append(Paragraph(f"Longitud: {long_o:.2f} metros", list_item_style))
-        story.append(Spacer(1, 0.3*cm))
-
-        # --- Sección 4: Cuadro de Coordenadas ---
-        story.append(Paragraph("4. Cuadro de Coordenadas", heading1_style))
-        story.append(Paragraph(
-            "A continuación se presentan las coordenadas de los vértices del predio. Las coordenadas geográficas "
-            "(Latitud/Longitud) corresponden al sistema de origen de los datos, y las coordenadas proyectadas "
-            "(Este/Norte) han sido calculadas en la zona UTM correspondiente.",
-            body_style
-        ))
-        story.append(Spacer(1, 0.5 * cm))
+        campos = _CamposFicha() if motor == 'pymupdf' else None
+        story = [PageBreak()]
+        story.extend(_construir_story_predio(gdf_filtrado, codcat, fecha_str, doc.width, autor=autor,
+                                             logo_path=logo_path, map_image_path=map_image_path, crs=crs,
+                                             utm=utm, mapa_vectorial=mapa_vectorial, vecinos=vecinos,
+                                             colindancias=colindancias, tolerancia_vertices=tolerancia_vertices,
+                                             campos=campos))
+        marca = _medir(resultado, 'story', marca)
 
-        try:
-            # Validación del CRS de entrada.
-            if not gdf_filtrado.crs:
-                raise ValueError("El GeoDataFrame de entrada no tiene un Sistema de Coordenadas (CRS) definido.")
-            if not gdf_filtrado.crs.is_geographic:
-                raise ValueError(f"El CRS de entrada '{gdf_filtrado.crs.name}' no es geográfico. Se esperaba WGS 84 (EPSG:4326).")
-
-            # Lógica para determinar la zona UTM correcta y reproyectar.
-            predio_geom_wgs84 = gdf_filtrado.iloc[0].geometry
-            centroid = predio_geom_wgs84.centroid
-            utm_zone = int((centroid.x + 180) // 6) + 1
-            target_epsg_code = 32600 + utm_zone if centroid.y >= 0 else 32700 + utm_zone
-            utm_system_name = f"WGS 84 / UTM zone {utm_zone}{'N' if centroid.y >= 0 else 'S'}"
-            gdf_utm = gdf_filtrado.to_crs(epsg=target_epsg_code)
-            predio_geom_utm = gdf_utm.iloc[0].geometry
-
-            # Extracción de coordenadas de los vértices del polígono.
-            if predio_geom_wgs84.geom_type == 'Polygon':
-                wgs_coords = list(predio_geom_wgs84.exterior.coords)
-                utm_coords = list(predio_geom_utm.exterior.coords)
-            elif predio_geom_wgs84.geom_type == 'MultiPolygon':
-                # Si es un multipolígono, se usa el polígono más grande.
-                largest_poly_wgs84 = max(predio_geom_wgs84.geoms, key=lambda p: p.area)
-                largest_poly_utm = max(predio_geom_utm.geoms, key=lambda p: p.area)
-                wgs_coords = list(largest_poly_wgs84.exterior.coords)
-                utm_coords = list(largest_poly_utm.exterior.coords)
+        # --- 8. GENERACIÓN FINAL DEL PDF ---
+        # Con el motor de plantillas se estampan los datos del predio sobre la parte fija.
+        estampado = _estampar_ficha(doc, story, campos, map_image_path) if campos is not None else None
+        if estampado is not None:
+            contenido, resultado.paginas = estampado
+            if isinstance(output_filename, (str, os.PathLike)):
+                with open(output_filename, "wb") as f:
+                    f.write(contenido)
             else:
-                utm_coords, wgs_coords = [], []
-                story.append(Paragraph(f"Advertencia: Tipo de geometría no soportado ({predio_geom_wgs84.geom_type}).", body_style))
-
-            # Creación y estilización de la tabla de coordenadas.
-            if utm_coords:
-                table_data = [[Paragraph("<b>Punto</b>", table_header_style), Paragraph("<b>Este (UTM)</b>", table_header_style), Paragraph("<b>Norte (UTM)</b>", table_header_style), Paragraph("<b>Longitud (°)</b>", table_header_style), Paragraph("<b>Latitud (°)</b>", table_header_style)]]
-                for i, (utm, wgs) in enumerate(zip(utm_coords[:-1], wgs_coords[:-1])): # Excluye el último punto que es igual al primero.
-                    table_data.append([f"V-{i+1}", f"{utm[0]:.2f}", f"{utm[1]:.2f}", f"{wgs[0]:.6f}", f"{wgs[1]:.6f}"])
-                coord_table = Table(table_data, colWidths=[1.5*cm, 3.5*cm, 3.5*cm, 3.5*cm, 3.5*cm])
-                coord_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), Color(0.9,0.9,0.9)),
-                    ('GRID', (0,0), (-1,-1), 1, colors.black),
-                    ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-                    ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-                    ('VALIGN', (0,0), (-1,-1), 'MIDDLE')
-                ]))
-                story.append(KeepTogether([coord_table])) # Evita que la tabla se divida entre páginas.
+                salida.write(contenido)
+            _medir(resultado, 'estampado', marca)
+        else:
+            # El método build() toma el 'story' y lo renderiza en el archivo PDF.
+            # onFirstPage y onLaterPages asignan las funciones de callback para la portada y el pie de página.
+            doc.build(story, onFirstPage=portada_canvas, onLaterPages=footer_canvas)
+            _medir(resultado, 'build', marca)
+            resultado.paginas = doc.page
+
+        if en_memoria:
+            resultado.contenido = output_filename.getvalue()
+            resultado.tamano_bytes = len(resultado.contenido)
+            resultado.ok, resultado.mensaje = True, "Informe PDF generado exitosamente en memoria."
+        elif isinstance(output_filename, (str, os.PathLike)):
+            resultado.tamano_bytes = os.path.getsize(output_filename)
+            resultado.ok, resultado.mensaje = True, f"Informe PDF generado exitosamente como: {output_filename}"
+        else:
+            resultado.tamano_bytes = salida.escritos
+            resultado.ok, resultado.mensaje = True, f"Informe PDF generado exitosamente en: {salida.name}"
+
+    except Exception as e:
+        # Captura cualquier error inesperado durante la creación del PDF.
+        resultado.mensaje = f"Error al generar el informe PDF: {e}"
+    finally:
+        _ADVERTENCIAS.reset(contexto)
+
+    resultado.duraciones['total'] = time.perf_counter() - inicio
+    return _notificar(resultado, metricas)
+
+class _SalidaContada:
+    """Destino binario (archivo, tubería, socket...) que cuenta los bytes escritos.
+
+    No todos los destinos admiten `tell()`, por lo que el tamaño del PDF se mide
+    al escribirlo. `name` es la etiqueta del destino en los mensajes.
+    """
+
+    def __init__(self, destino):
+        self.destino = destino
+        self.escritos = 0
+        nombre = getattr(destino, 'name', None)
+        if isinstance(nombre, int): # Archivo abierto a partir de un descriptor (os.fdopen, sys.stdout.buffer...).
+            self.name = f"<descriptor {nombre}>"
+        else:
+            self.name = nombre if isinstance(nombre, str) else type(destino).__name__
+
+    def write(self, datos):
+        self.escritos += len(datos)
+        return self.destino.write(datos)
+
+def _medir(resultado, fase, desde):
+    """Registra la duración de una fase en el resultado y devuelve el instante actual."""
+    ahora = time.perf_counter()
+    resultado.duraciones[fase] = ahora - desde
+    return ahora
+
+def _documento_ficha(output_filename, codcat, fecha_str, logo_path=None):
+    """Crea el documento de ReportLab de una ficha individual (21 x 21 cm)."""
+    doc = SimpleDocTemplate(output_filename,
+                            pagesize=(21*cm, 21*cm), # Formato cuadrado personalizado
+                            leftMargin=1.5*cm, rightMargin=1.5*cm,
+                            topMargin=2.0*cm, bottomMargin=2.5*cm)
+
+    # Se añaden parámetros personalizados al objeto 'doc' para que estén
+    # disponibles en la función de la portada (portada_canvas).
+    doc.codcat_param = codcat
+    doc.fecha_param = fecha_str
+    doc.logo_path_param = logo_path
+    return doc
+
+# Clave en la ficha y columna de origen de cada atributo.
+_ATRIBUTOS_TEXTO = (('uso_edi', 'Uso_de_Edi'), ('lindero_n', 'Lindero_No'), ('lindero_s', 'Lindero_Su'),
+                    ('lindero_e', 'Lindero_Es'), ('lindero_o', 'Lindero_Oe'), ('calle', 'Calle'))
+_ATRIBUTOS_NUMERICOS = (('long_n', 'Longitud_N'), ('long_s', 'Longitud_S'), ('long_e', 'Longitud_E'),
+                        ('long_o', 'Longitud_O'), ('area_esc', 'Area_Escri'),
+                        ('shape_area', 'Shape__Area'), ('shape_len', 'Shape__Length'))
+
+def _extraer_atributos(predio_data, normalizado=False):
+    """Obtiene los atributos de la ficha con manejo de errores y valores por defecto.
+
+    Args:
+        predio_data (pd.Series): Fila del predio.
+        normalizado (bool, optional): La fila proviene de `normalizar_predios`,
+            por lo que sus columnas ya están tipadas y completas. Defaults to False.
+
+    Returns:
+        dict: Valores de uso, linderos, longitudes, áreas y calle del predio.
+    """
+    atributos = {clave: predio_data.get(columna, COLUMNAS_TEXTO[columna]) for clave, columna in _ATRIBUTOS_TEXTO}
+    if normalizado:
+        atributos.update((clave, float(predio_data.get(columna, 0.0))) for clave, columna in _ATRIBUTOS_NUMERICOS)
+        return atributos
+    for clave, columna in _ATRIBUTOS_NUMERICOS:
+        try: atributos[clave] = float(predio_data.get(columna, 0.0))
+        except (ValueError, TypeError): atributos[clave] = 0.0
+    return atributos
+
+def _construir_story_predio(gdf_filtrado, codcat, fecha_str, ancho, autor="Cartography Hub", logo_path=None, map_image_path=None, crs=None, utm=None, mapa_vectorial=True, vecinos=None, colindancias=None, tolerancia_vertices=0.0, campos=None):
+    """Construye el contenido (páginas 2 en adelante) de la ficha de un predio.
+
+    Se separa de la configuración del documento para que la misma ficha pueda
+    añadirse a un PDF individual o a un libro con muchas fichas.
+
+    Args:
+        gdf_filtrado (gpd.GeoDataFrame): GeoDataFrame con la fila del predio.
+        codcat (str): Código catastral del predio.
+        fecha_str (str): Fecha ya formateada (ver `_formatear_fecha`).
+        ancho (float): Ancho útil del marco de la página, en puntos.
+        campos (_CamposFicha, optional): Si se indica, cada contenido que cambia
+            de un predio a otro se registra en él con un nombre, para el motor
+            de plantillas (ver `_estampar_ficha`). Defaults to None.
+        Resto de argumentos: ver `_generar_informe_desde_fila`.
+
+    Returns:
+        list: Lista de flowables de ReportLab.
+    """
+    if crs is None:
+        crs = gdf_filtrado.crs
+    # Sin motor de plantillas, los contenidos variables se añaden tal cual.
+    campo = campos if campos is not None else (lambda nombre, flowable: flowable)
+
+    # Extrae la primera (y única) fila de datos del predio.
+    predio_data = gdf_filtrado.iloc[0]
+
+    # --- 3. EXTRACCIÓN DE ATRIBUTOS DEL PREDIO ---
+    # Con un catastro normalizado las columnas se leen sin volver a validarlas.
+    atributos = _extraer_atributos(predio_data, normalizado='normalizacion' in gdf_filtrado.attrs)
+    uso_edi, calle = atributos['uso_edi'], atributos['calle']
+    lindero_n, lindero_s = atributos['lindero_n'], atributos['lindero_s']
+    lindero_e, lindero_o = atributos['lindero_e'], atributos['lindero_o']
+    long_n, long_s, long_e, long_o = atributos['long_n'], atributos['long_s'], atributos['long_e'], atributos['long_o']
+    area_esc, shape_area, shape_len = atributos['area_esc'], atributos['shape_area'], atributos['shape_len']
+
+    # Si se dispone de la tabla de colindancias geométricas, sus linderos reemplazan
+    # a los de los atributos en los lados donde el predio tiene vecinos.
+    linderos_geometricos = colindancias is not None and codcat in colindancias.index
+    if linderos_geometricos:
+        lados = _linderos_geometricos(colindancias.loc[[codcat]])
+        lindero_n, long_n = lados.get('Norte', (lindero_n, long_n))
+        lindero_s, long_s = lados.get('Sur', (lindero_s, long_s))
+        lindero_e, long_e = lados.get('Este', (lindero_e, long_e))
+        lindero_o, long_o = lados.get('Oeste', (lindero_o, long_o))
+
+    # --- 4. MANEJO DEL SISTEMA DE COORDENADAS (CRS) ---
+    try:
+        crs_info = f"{crs.name} (EPSG:{crs.to_epsg()})" if crs else "No definido"
+    except Exception:
+        crs_info = str(crs) if crs else "No definido"
+
+    # --- 6. DEFINICIÓN DE ESTILOS DE PÁRRAFO ---
+    # Los estilos se crean una sola vez por proceso (ver `_estilos_informe`).
+    estilos = _estilos_informe()
+    title_style = estilos['title']
+    heading1_style = estilos['heading1']
+    heading2_style = estilos['heading2']
+    body_style = estilos['body']
+    list_item_style = estilos['list_item']
+    code_style = estilos['code']
+    caption_style = estilos['caption']
+    table_header_style = estilos['table_header']
+    note_style = estilos['note']
+
+    # --- 7. CONSTRUCCIÓN DEL CONTENIDO DEL PDF ('story') ---
+    # 'story' es una lista de objetos de ReportLab (párrafos, imágenes, etc.) que se dibujarán en el PDF.
+    story = []
+
+    # --- Sección de Encabezado (Página 2 en adelante) ---
+    if logo_path and os.path.exists(logo_path):
+         try:
+             img = Image(logo_path, width=4*cm, height=2*cm)
+             img.hAlign = 'CENTER'
+             story.append(img)
+             story.append(Spacer(1, 0.5*cm))
+         except Exception as img_err:
+             _advertir(f"No se pudo cargar el logo '{logo_path}': {img_err}")
+    story.append(Paragraph("INFORME TÉCNICO DE PREDIO URBANO", title_style))
+    story.append(Spacer(1, 0.5*cm))
+    story.append(Paragraph(f"<b>Ciudad:</b> Guayaquil", body_style))
+    story.append(campo('encabezado_fecha', Paragraph(f"<b>Fecha:</b> {fecha_str}", body_style)))
+    story.append(campo('encabezado_codcat', Paragraph(f"<b>Código Catastral:</b> {codcat}", body_style)))
+    story.append(Spacer(1, 0.7*cm))
+
+    # --- Sección 1: Identificación ---
+    story.append(Paragraph("1. Identificación del Predio", heading1_style))
+    story.append(campo('codcat', Paragraph(f"<b>Código Catastral:</b> {codcat}", body_style)))
+    story.append(campo('ubicacion', Paragraph(f"<b>Ubicación:</b> Frente a la Calle {calle}", body_style)))
+    story.append(Spacer(1, 0.3*cm))
+
+    # --- Sección 2: Características ---
+    story.append(Paragraph("2. Características Generales", heading1_style))
+    story.append(campo('uso', Paragraph(f"<b>Uso Principal:</b> {uso_edi}", body_style)))
+    story.append(campo('area_escritura', Paragraph(f"<b>Área según Escritura:</b> {area_esc:.2f} m² ({num_a_letras(area_esc)} metros cuadrados)", body_style)))
+    story.append(Spacer(1, 0.3*cm))
+
+    # --- Sección 3: Linderos ---
+    story.append(Paragraph("3. Linderos y Dimensiones", heading1_style))
+    story.append(Paragraph("Se detallan los colindantes y las longitudes aproximadas de cada lindero:", body_style))
+    if linderos_geometricos:
+        story.append(campo('nota_linderos', Paragraph("Los colindantes y longitudes con predios vecinos fueron calculados a partir de la geometría catastral; "
+                                                      "los lados sin predio vecino conservan los datos registrados.", note_style)))
+    story.append(Spacer(1, 0.2*cm))
+    story.append(Paragraph("<b>Lindero Norte:</b>", heading2_style))
+    story.append(campo('colinda_n', Paragraph(f"Colinda con: {lindero_n}", list_item_style)))
+    story.append(campo('longitud_n', Paragraph(f"Longitud: {long_n:.2f} metros", list_item_style)))
+    # (Se repite para Sur, Este y Oeste)
+    story.append(Paragraph("<b>Lindero Sur:</b>", heading2_style))
+    story.append(campo('colinda_s', Paragraph(f"Colinda con: {lindero_s}", list_item_style)))
+    story.append(campo('longitud_s', Paragraph(f"Longitud: {long_s:.2f} metros", list_item_style)))
+    story.append(Paragraph("<b>Lindero Este:</b>", heading2_style))
+    story.append(campo('colinda_e', Paragraph(f"Colinda con: {lindero_e}", list_item_style)))
+    story.append(campo('longitud_e', Paragraph(f"Longitud: {long_e:.2f} metros", list_item_style)))
+    story.append(Paragraph("<b>Lindero Oeste:</b>", heading2_style))
+    story.append(campo('colinda_o', Paragraph(f"Colinda con: {lindero_o}", list_item_style)))
+    story.append(campo('longitud_o', Paragraph(f"Longitud: {long_o:.2f} metros", list_item_style)))
+    story.append(Spacer(1, 0.3*cm))
+
+    # --- Sección 4: Cuadro de Coordenadas ---
+    story.append(Paragraph("4. Cuadro de Coordenadas", heading1_style))
+    story.append(Paragraph(
+        "A continuación se presentan las coordenadas de los vértices del predio. Las coordenadas geográficas "
+        "(Latitud/Longitud) corresponden al sistema de origen de los datos, y las coordenadas proyectadas "
+        "(Este/Norte) han sido calculadas en la zona UTM correspondiente.",
+        body_style
+    ))
+    story.append(Spacer(1, 0.5 * cm))
+
+    predio_geom_utm = utm_coords = None
+    try:
+        predio_geom_wgs84 = gdf_filtrado.iloc[0].geometry
+        if utm is None:
+            # Sin precálculo: se determina la zona UTM y se reproyecta el predio.
+            utm = precalcular_utm(gdf_filtrado).iloc[0]
+            if not utm['utm_epsg']:
+                raise ValueError("El predio no tiene una geometría válida.")
+            utm = (int(utm['utm_epsg']), utm['utm_nombre'], utm['geometry_utm'])
+        target_epsg_code, utm_system_name, predio_geom_utm = utm
+
+        # Extracción de coordenadas de los vértices de todas las partes y anillos.
+        utm_coords, wgs_coords, poligono, anillo = _vertices_predio(predio_geom_wgs84, predio_geom_utm, tolerancia_vertices)
+        if not len(utm_coords):
+            story.append(campo('geometria_no_soportada', Paragraph(f"Advertencia: Tipo de geometría no soportado ({predio_geom_wgs84.geom_type}).", body_style)))
+            _advertir(f"Tipo de geometría no soportado ({predio_geom_wgs84.geom_type}) en el predio {codcat}.", imprimir=False)
+
+        # Creación de la tabla de coordenadas (se divide entre páginas si es necesario).
+        if len(utm_coords):
+            story.append(campo('tabla_coordenadas', _tabla_coordenadas(utm_coords, wgs_coords, poligono, anillo, table_header_style)))
+            if tolerancia_vertices and tolerancia_vertices > 0:
+                total = _num_vertices(predio_geom_utm)
                 story.append(Spacer(1, 0.2*cm))
-                note_style = ParagraphStyle(name='NoteStyle', parent=styles['Normal'], fontSize=8, alignment=TA_JUSTIFY, textColor=gray)
-                story.append(Paragraph(f"<b>Nota:</b> Las coordenadas UTM fueron calculadas en el sistema <b>{utm_system_name} (EPSG:{target_epsg_code})</b>.", note_style))
+                story.append(campo('nota_tolerancia', Paragraph(f"<b>Nota:</b> Se listan {len(utm_coords)} de {total} vértices; se omitieron los que se apartan "
+                                                                f"menos de {tolerancia_vertices:g} m del contorno simplificado.", note_style)))
+            story.append(Spacer(1, 0.2*cm))
+            story.append(campo('nota_utm', Paragraph(f"<b>Nota:</b> Las coordenadas UTM fueron calculadas en el sistema <b>{utm_system_name} (EPSG:{target_epsg_code})</b>.", note_style)))
 
-        except Exception as coord_err:
-            story.append(Paragraph(f"<i>No se pudo generar el cuadro de coordenadas. Error: {coord_err}</i>", caption_style))
-        story.append(Spacer(1, 0.5*cm))
+    except Exception as coord_err:
+        story.append(campo('error_coordenadas', Paragraph(f"<i>No se pudo generar el cuadro de coordenadas. Error: {coord_err}</i>", caption_style)))
+        _advertir(f"No se pudo generar el cuadro de coordenadas del predio {codcat}: {coord_err}", imprimir=False)
+    story.append(Spacer(1, 0.5*cm))
 
-        # --- Sección 5: Información Geométrica y Mapa ---
-        story.append(Paragraph("5. Información Geométrica (Calculada)", heading1_style))
+    # --- Sección 5: Información Geométrica y Mapa ---
+    story.append(Paragraph("5. Información Geométrica (Calculada)", heading1_style))
 
-        # Inserta la imagen del mapa si se proporciona.
-        if map_image_path and os.path.exists(map_image_path):
-            try:
-                # Lógica para escalar la imagen para que encaje en la página sin distorsión.
-                pil_img = PILImage.open(map_image_path)
-                aspect_ratio = pil_img.height / float(pil_img.width)
-                display_width = doc.width * 0.95
-                display_height = display_width * aspect_ratio
-                img = Image(map_image_path, width=display_width, height=display_height)
-                img.hAlign = 'CENTER'
-                # Agrupa la imagen y su pie de foto para evitar que se separen entre páginas.
-                image_group = [Spacer(1, 0.5*cm), img, Spacer(1, 0.2*cm), Paragraph("<i>Figura 1: Representación gráfica del predio.</i>", caption_style)]
-                story.append(KeepTogether(image_group))
-                story.append(Spacer(1, 0.5*cm))
-            except Exception as img_err:
-                 print(f"Advertencia: No se pudo procesar la imagen del mapa '{map_image_path}': {img_err}")
-
-        story.append(Paragraph(f"<b>Área Calculada (GIS):</b> {shape_area:.2f} m² ({num_a_letras(shape_area)} metros cuadrados)", body_style))
-        story.append(Paragraph(f"<b>Perímetro Calculado (GIS):</b> {shape_len:.2f} metros", body_style))
-        story.append(Paragraph(f"<b>Sistema de Coordenadas de Origen:</b> {crs_info}", code_style))
-        story.append(Spacer(1, 0.3*cm))
-
-        # --- Sección 6: Observaciones ---
-        story.append(Paragraph("6. Observaciones", heading1_style))
-        story.append(Paragraph(f"Se constata una diferencia entre el área registrada en la escritura ({area_esc:.2f} m²) y el área calculada ({shape_area:.2f} m²). Esta discrepancia puede deberse a métodos de medición históricos o actualizaciones catastrales. Se recomienda una verificación.", body_style))
-        story.append(Spacer(1, 0.3*cm))
-
-        # --- Sección 7: Fuente y Autoría ---
-        story.append(Paragraph("7. Fuente de Datos", heading1_style))
-        story.append(Paragraph(f"Información extraída del registro con Código Catastral {codcat}.", body_style))
-        story.append(Spacer(1, 0.5*cm))
-        story.append(Paragraph(f"<b>Elaborado por:</b><br/>{autor}", body_style))
+    # Inserta la imagen del mapa si se proporciona.
+    if map_image_path and os.path.exists(map_image_path):
+        try:
+            # Lógica para escalar la imagen para que encaje en la página sin distorsión.
+            from PIL import Image as PILImage
+            pil_img = PILImage.open(map_image_path)
+            aspect_ratio = pil_img.height / float(pil_img.width)
+            display_width = ancho * 0.95
+            display_height = display_width * aspect_ratio
+            img = Image(map_image_path, width=display_width, height=display_height)
+            img.hAlign = 'CENTER'
+            # Agrupa la imagen y su pie de foto para evitar que se separen entre páginas.
+            image_group = [Spacer(1, 0.5*cm), img, Spacer(1, 0.2*cm), Paragraph("<i>Figura 1: Representación gráfica del predio.</i>", caption_style)]
+            story.append(KeepTogether(image_group))
+            story.append(Spacer(1, 0.5*cm))
+        except Exception as img_err:
+             _advertir(f"No se pudo procesar la imagen del mapa '{map_image_path}': {img_err}")
+    elif mapa_vectorial and predio_geom_utm is not None:
+        # Sin imagen externa, el mapa se dibuja como gráficos vectoriales.
+        try:
+            vecinos_utm = []
+            if vecinos:
+                transformador = _obtener_transformador(crs.to_wkt(), f"EPSG:{target_epsg_code}")
+                geoms_vecinos = _transformar_geometrias(np.array([g for _, g in vecinos], dtype=object), transformador)
+                vecinos_utm = list(zip([c for c, _ in vecinos], geoms_vecinos))
+            mapa = _dibujar_mapa_predio(predio_geom_utm, ancho, 11*cm, vertices=utm_coords, vecinos=vecinos_utm)
+            mapa.hAlign = 'CENTER'
+            map_group = [Spacer(1, 0.5*cm), campo('mapa', mapa), Spacer(1, 0.2*cm), Paragraph("<i>Figura 1: Representación gráfica del predio.</i>", caption_style)]
+            story.append(KeepTogether(map_group))
+            story.append(Spacer(1, 0.5*cm))
+        except Exception as map_err:
+            _advertir(f"No se pudo dibujar el mapa del predio {codcat}: {map_err}")
 
-        # --- 8. GENERACIÓN FINAL DEL PDF ---
-        # El método build() toma el 'story' y lo renderiza en el archivo PDF.
-        # onFirstPage y onLaterPages asignan las funciones de callback para la portada y el pie de página.
-        doc.build(story, onFirstPage=portada_canvas, onLaterPages=footer_canvas)
+    story.append(campo('area_calculada', Paragraph(f"<b>Área Calculada (GIS):</b> {shape_area:.2f} m² ({num_a_letras(shape_area)} metros cuadrados)", body_style)))
+    story.append(campo('perimetro', Paragraph(f"<b>Perímetro Calculado (GIS):</b> {shape_len:.2f} metros", body_style)))
+    story.append(campo('crs', Paragraph(f"<b>Sistema de Coordenadas de Origen:</b> {crs_info}", code_style)))
+    story.append(Spacer(1, 0.3*cm))
+
+    # --- Sección 6: Observaciones ---
+    story.append(Paragraph("6. Observaciones", heading1_style))
+    story.append(campo('observaciones', Paragraph(f"Se constata una diferencia entre el área registrada en la escritura ({area_esc:.2f} m²) y el área calculada ({shape_area:.2f} m²). Esta discrepancia puede deberse a métodos de medición históricos o actualizaciones catastrales. Se recomienda una verificación.", body_style)))
+    story.append(Spacer(1, 0.3*cm))
+
+    # --- Sección 7: Fuente y Autoría ---
+    story.append(Paragraph("7. Fuente de Datos", heading1_style))
+    story.append(campo('fuente', Paragraph(f"Información extraída del registro con Código Catastral {codcat}.", body_style)))
+    story.append(Spacer(1, 0.5*cm))
+    story.append(campo('autor', Paragraph(f"<b>Elaborado por:</b><br/>{autor}", body_style)))
+
+    return story
+
+# --- MOTOR RÁPIDO CON PLANTILLAS (PyMuPDF) ---
+# Casi toda la ficha es igual para todos los predios: la portada, los títulos, los
+# textos fijos y los pies de página. Con motor="pymupdf" esa parte se compone con
+# ReportLab una sola vez por diseño (plantilla) y, para cada predio, solo se dibujan
+# los contenidos variables y se añaden con PyMuPDF a una copia de la plantilla.
+MOTORES_PDF = ('reportlab', 'pymupdf')
+# Número máximo de plantillas (diseños distintos) que se guardan en memoria. Al
+# llenarse se descarta la más antigua.
+MAX_PLANTILLAS = 256
+_PLANTILLAS = {}
+# El estampado lee detalles internos del canvas de ReportLab (`_code`, `_doc.fontMapping`),
+# por lo que solo se usa con las versiones verificadas, [desde, hasta); con otras, las
+# fichas se generan con ReportLab. La verificación está en benchmark_predio_report.py.
+VERSIONES_REPORTLAB_PLANTILLAS = ((5, 0), (5, 1))
+
+@functools.lru_cache(maxsize=None)
+def _reportlab_admite_plantillas():
+    """Indica si la versión instalada de ReportLab está verificada para el motor de plantillas."""
+    import re
+    import reportlab
+
+    version = tuple(int(n) for n in re.findall(r"\d+", reportlab.Version)[:2])
+    desde, hasta = VERSIONES_REPORTLAB_PLANTILLAS
+    if desde <= version < hasta:
+        return True
+    _advertir(f"El motor de plantillas no está verificado con ReportLab {reportlab.Version}; "
+              f"las fichas se generan con ReportLab.")
+    return False
+
+class _CamposFicha:
+    """Contenidos variables de una ficha, por nombre (ver `_construir_story_predio`).
+
+    Al llamarlo con un nombre y un flowable, registra el flowable y devuelve un
+    `_Campo` que lo reemplaza en el 'story'.
+    """
+
+    def __init__(self):
+        self.flowables = {}
+        self.posiciones = []
+        self.grabando = False
+        self.apta = True
+        self.ancho = None
+
+    def __call__(self, nombre, flowable):
+        self.flowables[nombre] = flowable
+        return _Campo(nombre, flowable, self)
+
+class _Campo(Flowable):
+    """Contenido variable de la ficha.
+
+    Ocupa el mismo espacio que el flowable que envuelve y normalmente lo dibuja.
+    Mientras se compone una plantilla (`campos.grabando`) no dibuja nada: anota la
+    página y la posición donde el motor debe estampar el contenido de cada predio.
+    """
+
+    def __init__(self, nombre, contenido, campos):
+        Flowable.__init__(self)
+        self.nombre, self.contenido, self.campos = nombre, contenido, campos
+
+    def wrap(self, availWidth, availHeight):
+        self.campos.ancho = availWidth
+        self.width, self.height = self.contenido.wrap(availWidth, availHeight)
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        partes = self.contenido.split(availWidth, availHeight)
+        if partes and not hasattr(self.contenido, 'parte'):
+            # Un párrafo partido entre páginas no se puede reproducir al estampar.
+            self.campos.apta = False
+        return [_Campo(self.nombre, parte, self.campos) for parte in partes]
+
+    def getSpaceBefore(self):
+        return self.contenido.getSpaceBefore()
+
+    def getSpaceAfter(self):
+        return self.contenido.getSpaceAfter()
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        if not self.campos.grabando:
+            self.contenido.drawOn(canvas, x, y, _sW)
+            return
+        rango = getattr(self.contenido, 'rango', None)
+        self.campos.posiciones.append((canvas.getPageNumber() - 1, self.nombre, rango, x, y, _sW))
+
+@dataclasses.dataclass
+class _PlantillaFicha:
+    """Plantilla compuesta con ReportLab y preparada para estampar con PyMuPDF.
+
+    Attributes:
+        contenido (bytes): PDF de la plantilla, sin los contenidos variables.
+        paginas (int): Número de páginas.
+        posiciones (dict): {pagina: [(nombre, rango, x, y, _sW)]} de los campos.
+        contenidos (dict): {pagina: (xref_pagina, referencias)} con los flujos de
+            contenido de cada página que recibe campos.
+        fuentes (list[str]): Fuentes de la plantilla en el orden de sus nombres
+            internos (F1, F2...), para que el contenido estampado las comparta.
+    """
+    contenido: bytes
+    paginas: int
+    posiciones: dict
+    contenidos: dict
+    fuentes: list
+
+def _importar_pymupdf():
+    """Importa PyMuPDF con su nombre actual o con el antiguo (`fitz`)."""
+    try:
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf
+    return pymupdf
+
+def _construir_plantilla(doc, story, campos):
+    """Compone con ReportLab la plantilla de una ficha a partir del 'story' de un predio.
+
+    Args:
+        doc (SimpleDocTemplate): Documento del predio (ver `_documento_ficha`).
+        story (list): 'story' del predio, construido con `campos`.
+        campos (_CamposFicha): Contenidos variables del predio.
+
+    Returns:
+        _PlantillaFicha o None: None si el diseño no admite plantilla (por ejemplo,
+                                si un párrafo variable se parte entre páginas).
+    """
+    import io
+
+    pymupdf = _importar_pymupdf()
+    salida = io.BytesIO()
+    doc = _documento_ficha(salida, doc.codcat_param, doc.fecha_param, doc.logo_path_param)
+    doc.plantilla_param = True
+    ancho = campos.ancho
+    campos.posiciones, campos.grabando = [], True
+    try:
+        doc.build(list(story), onFirstPage=portada_canvas, onLaterPages=footer_canvas)
+    finally:
+        campos.grabando = False
+        # ReportLab marca los flowables que pospone a la página siguiente; se limpian
+        # para que el mismo 'story' pueda componerse de nuevo si no hay plantilla.
+        for flowable in story:
+            flowable.__dict__.pop('_postponed', None)
+    if not campos.apta or campos.ancho != ancho:
+        return None
+
+    posiciones = {0: []} # La portada recibe el código y la fecha.
+    for pagina, nombre, rango, x, y, desplazamiento in campos.posiciones:
+        posiciones.setdefault(pagina, []).append((nombre, rango, x, y, desplazamiento))
+
+    # Cada página con campos envuelve su contenido original en q ... Q, para que el
+    # contenido estampado empiece con el estado gráfico inicial de la página.
+    pdf = pymupdf.open("pdf", salida.getvalue())
+    guardar = pdf.get_new_xref()
+    pdf.update_object(guardar, "<<>>")
+    pdf.update_stream(guardar, b"q\n")
+    contenidos = {}
+    for pagina in posiciones:
+        xref = pdf[pagina].xref
+        referencias = f"{guardar} 0 R {pdf.xref_get_key(xref, 'Contents')[1].strip('[]')}"
+        pdf.xref_set_key(xref, "Contents", f"[{referencias}]")
+        contenidos[pagina] = (xref, referencias)
+
+    internas = sorted((f[4], f[3]) for f in pdf[0].get_fonts() if f[4][1:].isdigit())
+    fuentes = [base for _, base in sorted(internas, key=lambda f: int(f[0][1:]))]
+    return _PlantillaFicha(pdf.tobytes(), pdf.page_count, posiciones, contenidos, fuentes)
+
+def _guardar_plantilla(clave, plantilla):
+    """Guarda una plantilla (o None si el diseño no la admite) en la caché acotada."""
+    while len(_PLANTILLAS) >= MAX_PLANTILLAS:
+        _PLANTILLAS.pop(next(iter(_PLANTILLAS)), None)
+    _PLANTILLAS[clave] = plantilla
+
+def _estampar_ficha(doc, story, campos, map_image_path=None):
+    """Genera el PDF de un predio estampando sus campos sobre la plantilla de su diseño.
+
+    El diseño de una ficha depende solo de la altura de cada contenido variable
+    (párrafos de una o más líneas, filas del cuadro de coordenadas...) y de las
+    imágenes fijas. Con esas alturas se busca la plantilla; si no existe, se compone
+    con este mismo predio. Luego cada campo se dibuja con ReportLab en la posición
+    anotada en la plantilla y sus operaciones se añaden a la página con PyMuPDF, de
+    modo que el resultado se ve igual que el de `doc.build`.
+
+    Args:
+        doc (SimpleDocTemplate): Documento del predio (ver `_documento_ficha`).
+        story (list): 'story' del predio, construido con `campos`.
+        campos (_CamposFicha): Contenidos variables del predio.
+        map_image_path (str, optional): Ver `generar_informe_predio_pdf`.
+
+    Returns:
+        tuple[bytes, int] o None: PDF y número de páginas, o None si la ficha no
+                                  admite plantilla y debe generarse con ReportLab.
+    """
+    import io
+    from reportlab.pdfgen.canvas import Canvas
+
+    if not _reportlab_admite_plantillas():
+        return None
+    ancho = doc.width - 12 # Relleno por defecto (6 pt a cada lado) del marco de SimpleDocTemplate.
+    clave = (doc.logo_path_param, map_image_path) + tuple((nombre, flowable.wrap(ancho, doc.height)[1])
+                                                for nombre, flowable in campos.flowables.items())
+    plantilla = _PLANTILLAS.get(clave, False)
+    nueva = plantilla is False
+    if nueva:
+        # La plantilla solo se publica en la caché ya terminada (ver el final), porque
+        # el servicio residente puede estampar fichas desde varios hilos a la vez.
+        campos.ancho = ancho
+        plantilla = _construir_plantilla(doc, story, campos)
+        if plantilla is None:
+            _guardar_plantilla(clave, None)
+    if plantilla is None:
+        return None
+
+    # --- DIBUJO DE LOS CAMPOS ---
+    # Las operaciones de dibujo de cada página se toman del canvas sin escribir un PDF.
+    # Las fuentes se registran en el mismo orden que en la plantilla para que sus
+    # nombres internos (F1, F2...) coincidan.
+    lienzo = Canvas(io.BytesIO(), pagesize=doc.pagesize)
+    for fuente in plantilla.fuentes:
+        lienzo._doc.getInternalFontName(fuente)
+    flujos = {}
+    for pagina, posiciones in plantilla.posiciones.items():
+        if pagina == 0:
+            _datos_portada(lienzo, doc.pagesize, doc.codcat_param, doc.fecha_param)
+        for nombre, rango, x, y, desplazamiento in posiciones:
+            flowable = campos.flowables[nombre]
+            if rango is not None:
+                flowable = flowable.parte(*rango)
+                flowable.wrapOn(lienzo, ancho, doc.height)
+            flowable.drawOn(lienzo, x, y, _sW=desplazamiento)
+        flujos[pagina] = "\n".join(lienzo._code)
+        lienzo.showPage()
+
+    # --- ESTAMPADO SOBRE UNA COPIA DE LA PLANTILLA ---
+    pymupdf = _importar_pymupdf()
+    pdf = pymupdf.open("pdf", plantilla.contenido)
+    nuevas = [f for f in sorted(lienzo._doc.fontMapping, key=lambda f: int(lienzo._doc.fontMapping[f][2:]))
+              if f not in plantilla.fuentes]
+    if nuevas:
+        # Fuentes que solo usan los campos (p. ej. Courier en el párrafo del CRS): se
+        # declaran en la plantilla nueva con los nombres internos que siguen. En una
+        # plantilla ya publicada no se modifican; la ficha se genera con ReportLab.
+        # Se admiten las fuentes estándar de texto (Symbol y ZapfDingbats no usan
+        # WinAnsiEncoding).
+        from reportlab.pdfbase.pdfmetrics import standardFonts
+
+        tipo, fuentes_pagina = pdf.xref_get_key(pdf[0].xref, "Resources/Font")
+        if not nueva or tipo != 'xref' or any(f not in standardFonts[:12] for f in nuevas):
+            return None
+        xref_fuentes = int(fuentes_pagina.split()[0])
+        for fuente in nuevas:
+            xref = pdf.get_new_xref()
+            nombre = lienzo._doc.fontMapping[fuente][1:]
+            pdf.update_object(xref, f"<</Type/Font/Subtype/Type1/Name/{nombre}/BaseFont/{fuente}/Encoding/WinAnsiEncoding>>")
+            pdf.xref_set_key(xref_fuentes, nombre, f"{xref} 0 R")
+            plantilla.fuentes.append(fuente)
+        plantilla.contenido = pdf.tobytes()
+    if nueva:
+        _guardar_plantilla(clave, plantilla)
+
+    for pagina, codigo in flujos.items():
+        xref_pagina, referencias = plantilla.contenidos[pagina]
+        xref = pdf.get_new_xref()
+        pdf.update_object(xref, "<<>>")
+        pdf.update_stream(xref, ("Q\n" + codigo).encode("latin-1"))
+        pdf.xref_set_key(xref_pagina, "Contents", f"[{referencias} {xref} 0 R]")
+    return pdf.tobytes(), plantilla.paginas
+
+def _preparar_codigos(gdf, indice, codigos=None, filtro=None):
+    """Resuelve la lista de códigos de un lote y reporta los problemas previos.
+
+    Returns:
+        tuple[list, list]: Códigos existentes (sin repetidos, en el orden
+                           solicitado) y códigos que no existen en el índice.
+    """
+    # --- SELECCIÓN DE CÓDIGOS ---
+    if codigos is None:
+        if filtro is not None:
+            codigos = gdf.loc[filtro(gdf), 'Codigo_Cat'].dropna()
+        else:
+            codigos = indice.keys()
+    codigos = list(dict.fromkeys(codigos)) # Elimina repetidos conservando el orden.
+
+    # --- REVISIÓN PREVIA ---
+    faltantes, duplicados = revisar_codigos(indice, codigos)
+    for codcat, n in duplicados.items():
+        print(f"Advertencia: El Código Catastral {codcat} aparece en {n} registros. Se usará el primero.")
+    faltantes_set = set(faltantes)
+    return [c for c in codigos if c not in faltantes_set], faltantes
+
+def generar_informes_lote(gdf, codigos=None, filtro=None, output_dir=".", plantilla_nombre="Ficha_{codcat}.pdf", **kwargs):
+    """Genera los informes PDF de varios predios reutilizando un único índice.
+
+    El índice sobre 'Codigo_Cat' se construye una sola vez, de modo que el costo
+    total es proporcional al tamaño del catastro más el número de informes, y no
+    a su producto. Los códigos faltantes o duplicados se reportan antes de
+    empezar a generar.
+
+    Args:
+        gdf (gpd.GeoDataFrame): GeoDataFrame con los datos de los predios.
+        codigos (iterable de str, optional): Códigos catastrales a reportar. Los
+            repetidos en la lista se generan una sola vez.
+        filtro (callable, optional): Función que recibe el GeoDataFrame y devuelve
+            una máscara booleana con los predios a reportar. Se usa si no se
+            indican `codigos`. Si ambos son None se reportan todos los predios.
+        output_dir (str, optional): Carpeta de salida. Defaults to ".".
+        plantilla_nombre (str, optional): Plantilla del nombre de cada PDF; admite
+            el campo `{codcat}`. Defaults to "Ficha_{codcat}.pdf".
+        **kwargs: Argumentos adicionales para `generar_informe_predio_pdf`
+            (autor, fecha_reporte, logo_path, map_image_path).
+
+    Yields:
+        tuple[str, bool, str]: (codigo_catastral, exito, mensaje) de cada predio,
+                               en cuanto termina su informe.
+    """
+    if not isinstance(gdf, gpd.GeoDataFrame):
+        raise TypeError("El primer argumento debe ser un GeoDataFrame.")
+    if 'Codigo_Cat' not in gdf.columns:
+        raise ValueError("El GeoDataFrame no contiene la columna 'Codigo_Cat'.")
+
+    indice = construir_indice_codcat(gdf)
+    codigos, faltantes = _preparar_codigos(gdf, indice, codigos, filtro)
+    for codcat in faltantes:
+        resultado = _notificar(ResultadoInforme(False, f"Error: No se encontró ningún predio con el Código Catastral: {codcat}", codcat), kwargs.get('metricas'))
+        yield codcat, resultado.ok, resultado.mensaje
+
+    # Reproyección UTM de todos los predios del lote en una sola etapa.
+    if 'utm_precalculado' not in kwargs:
+        try:
+            kwargs['utm_precalculado'] = precalcular_utm(gdf, posiciones=[indice[c][0] for c in codigos])
+        except ValueError as e:
+            print(f"Advertencia: No se pudo precalcular la reproyección UTM: {e}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    for codcat in codigos:
+        output_filename = os.path.join(output_dir, plantilla_nombre.format(codcat=_nombre_archivo_seguro(codcat)))
+        ok, mensaje = generar_informe_predio_pdf(gdf, codcat, output_filename, indice_codcat=indice, **kwargs)
+        yield codcat, ok, mensaje
+
+def generar_informes_por_bloques(ruta, codigos=None, tamano_bloque=10000, bbox=None, where=None, **kwargs):
+    """Genera los informes leyendo el catastro en bloques, con memoria acotada.
+
+    Equivale a `generar_informes_lote` sobre el archivo completo, pero solo mantiene
+    en memoria un bloque a la vez, sin importar el tamaño de la capa de origen.
+    Los mapas solo muestran los vecinos que caen en el mismo bloque, y los códigos
+    duplicados en bloques distintos no se detectan. Cada bloque se normaliza con
+    `normalizar_predios` antes de generar sus informes.
+
+    Args:
+        ruta (str): Archivo de predios.
+        codigos (iterable de str, optional): Códigos a reportar; el filtro se
+            envía al lector. Si es None se reportan todos los predios leídos.
+        tamano_bloque (int, optional): Predios por bloque. Defaults to 10000.
+        bbox, where: Filtros de lectura, igual que en `cargar_predios`.
+        **kwargs: Argumentos para `generar_informes_lote` (output_dir, autor...).
+
+    Yields:
+        tuple[str, bool, str]: (codigo_catastral, exito, mensaje) de cada predio.
+    """
+    pendientes = None if codigos is None else list(dict.fromkeys(codigos))
+    encontrados = set()
+    for bloque in leer_predios_por_bloques(ruta, tamano_bloque=tamano_bloque, codigos=pendientes, bbox=bbox, where=where):
+        codigos_bloque = [c for c in bloque['Codigo_Cat'].dropna().unique() if c not in encontrados]
+        encontrados.update(codigos_bloque)
+        yield from generar_informes_lote(normalizar_predios(bloque, imprimir=False), codigos=codigos_bloque, **kwargs)
+
+    for codcat in pendientes or []:
+        if codcat not in encontrados:
+            resultado = _notificar(ResultadoInforme(False, f"Error: No se encontró ningún predio con el Código Catastral: {codcat}", codcat), kwargs.get('metricas'))
+            yield codcat, resultado.ok, resultado.mensaje
+
+# --- EXPORTACIÓN A ARCHIVOS ZIP O TAR ---
+FORMATOS_ARCHIVO = ('zip', 'tar', 'tar.gz')
+
+def _informes_en_memoria(gdf, codigos=None, filtro=None, **kwargs):
+    """Genera en memoria, uno a la vez, los informes de varios predios.
+
+    Prepara el lote igual que `generar_informes_lote` (índice, códigos faltantes,
+    reproyección UTM conjunta) pero sin escribir archivos.
+
+    Yields:
+        ResultadoInforme: Resultado de cada predio, con el PDF en `contenido`.
+    """
+    if not isinstance(gdf, gpd.GeoDataFrame):
+        raise TypeError("El primer argumento debe ser un GeoDataFrame.")
+    if 'Codigo_Cat' not in gdf.columns:
+        raise ValueError("El GeoDataFrame no contiene la columna 'Codigo_Cat'.")
+
+    indice = kwargs.pop('indice_codcat', None)
+    if indice is None:
+        indice = construir_indice_codcat(gdf)
+    codigos, faltantes = _preparar_codigos(gdf, indice, codigos, filtro)
+    for codcat in faltantes:
+        yield _notificar(ResultadoInforme(False, f"Error: No se encontró ningún predio con el Código Catastral: {codcat}", codcat), kwargs.get('metricas'))
+
+    if kwargs.get('utm_precalculado') is None:
+        try:
+            kwargs['utm_precalculado'] = precalcular_utm(gdf, posiciones=[indice[c][0] for c in codigos])
+        except ValueError as e:
+            print(f"Advertencia: No se pudo precalcular la reproyección UTM: {e}")
+
+    for codcat in codigos:
+        yield generar_informe_predio_pdf(gdf, codcat, None, indice_codcat=indice, **kwargs)
+
+def exportar_informes_archivo(gdf, destino, codigos=None, filtro=None, formato=None, plantilla_nombre="Ficha_{codcat}.pdf", **kwargs):
+    """Genera varios informes y los escribe directamente en un archivo ZIP o tar.
+
+    Cada PDF se genera en memoria y se añade al archivo en cuanto termina, sin
+    pasar por archivos intermedios en disco, de modo que la memoria usada no
+    depende del número de predios sino del tamaño de un informe. El destino puede
+    ser una ruta o un objeto binario de solo escritura (no necesita `seek`, por
+    ejemplo la respuesta de un servidor web).
+
+    Args:
+        gdf (gpd.GeoDataFrame): GeoDataFrame con los datos de los predios.
+        destino (str o archivo binario): Ruta del archivo o flujo de salida.
+        codigos (iterable de str, optional): Códigos catastrales a exportar.
+        filtro (callable, optional): Igual que en `generar_informes_lote`.
+        formato (str, optional): 'zip', 'tar' o 'tar.gz'. Si es None se deduce de
+            la extensión del destino ('zip' por defecto).
+        plantilla_nombre (str, optional): Nombre de cada PDF dentro del archivo.
+        **kwargs: Argumentos adicionales para `generar_informe_predio_pdf`.
+
+    Yields:
+        tuple[str, bool, str]: (codigo_catastral, exito, mensaje) de cada predio.
+    """
+    import io
+    import tarfile
+    import zipfile
+
+    if formato is None:
+        nombre = str(destino if isinstance(destino, (str, os.PathLike)) else getattr(destino, 'name', '')).lower()
+        formato = 'tar.gz' if nombre.endswith(('.tar.gz', '.tgz')) else 'tar' if nombre.endswith('.tar') else 'zip'
+    if formato not in FORMATOS_ARCHIVO:
+        raise ValueError(f"Formato de archivo no soportado: {formato}. Use uno de {FORMATOS_ARCHIVO}.")
+    if not isinstance(gdf, gpd.GeoDataFrame):
+        raise TypeError("El primer argumento debe ser un GeoDataFrame.")
+    if 'Codigo_Cat' not in gdf.columns:
+        raise ValueError("El GeoDataFrame no contiene la columna 'Codigo_Cat'.")
+
+    if formato == 'zip':
+        archivo = zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_DEFLATED)
+    else:
+        # Modo de flujo ('w|'): escribe secuencialmente, sin volver atrás en el destino.
+        modo = 'w|gz' if formato == 'tar.gz' else 'w|'
+        if isinstance(destino, (str, os.PathLike)):
+            archivo = tarfile.open(destino, modo)
+        else:
+            archivo = tarfile.open(fileobj=destino, mode=modo)
+
+    with archivo:
+        for resultado in _informes_en_memoria(gdf, codigos, filtro, **kwargs):
+            codcat = resultado.codcat
+            nombre = plantilla_nombre.format(codcat=_nombre_archivo_seguro(codcat))
+            if not resultado.ok:
+                yield codcat, False, resultado.mensaje
+                continue
+            if formato == 'zip':
+                archivo.writestr(zipfile.ZipInfo(nombre, time.localtime()[:6]), resultado.contenido,
+                                 compress_type=zipfile.ZIP_DEFLATED)
+            else:
+                info = tarfile.TarInfo(nombre)
+                info.size, info.mtime, info.mode = len(resultado.contenido), time.time(), 0o644
+                archivo.addfile(info, io.BytesIO(resultado.contenido))
+            yield codcat, True, f"Informe PDF añadido al archivo como: {nombre}"
+
+# --- REGENERACIÓN INCREMENTAL CON MANIFIESTO ---
+# Versión de la plantilla del informe. Debe incrementarse cuando cambie el
+# contenido o el diseño de la ficha, para que se regeneren todos los PDF.
+VERSION_PLANTILLA = "2"
+
+def _hash_archivo(ruta):
+    """Hash SHA-256 del contenido de un archivo, o None si no existe."""
+    import hashlib
+
+    if not ruta or not os.path.exists(ruta):
+        return None
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+def calcular_huellas(gdf, posiciones=None, colindancias=None):
+    """Calcula la huella (fingerprint) de los atributos y la geometría de cada predio.
+
+    Los atributos se resumen con `pd.util.hash_pandas_object` en una sola pasada
+    vectorizada y la geometría se serializa en WKB; ambos se combinan en un hash
+    por predio que cambia si cambia cualquier dato que aparece en la ficha.
+
+    Args:
+        gdf (gpd.GeoDataFrame): GeoDataFrame de predios.
+        posiciones (iterable de int, optional): Posiciones (iloc) de los predios.
+            Si es None se calculan todos.
+        colindancias (pd.DataFrame, optional): Tabla de `calcular_colindancias`.
+            Las filas de cada predio, que reemplazan sus linderos en la ficha,
+            forman parte de su huella. Defaults to None.
+
+    Returns:
+        list[str]: Huellas hexadecimales, en el orden de `posiciones`.
+    """
+    import hashlib
+
+    subconjunto = gdf if posiciones is None else gdf.iloc[list(posiciones)]
+    atributos = pd.DataFrame(subconjunto.drop(columns=subconjunto.geometry.name))
+    hash_atributos = pd.util.hash_pandas_object(atributos.astype(str), index=False).to_numpy()
+    wkb = shapely.to_wkb(np.asarray(subconjunto.geometry.values))
+
+    # Huella de las colindancias de cada código (vacía si el predio no figura en la tabla).
+    lados = {}
+    if colindancias is not None and len(colindancias):
+        hash_filas = pd.util.hash_pandas_object(colindancias.reset_index().astype(str), index=False).to_numpy()
+        por_codigo = pd.Series(hash_filas, index=colindancias.index).groupby(level=0, sort=False)
+        lados = {codcat: grupo.to_numpy().tobytes() for codcat, grupo in por_codigo}
+    return [hashlib.blake2b(int(a).to_bytes(8, 'little') + (g or b"") + lados.get(c, b""), digest_size=16).hexdigest()
+            for a, g, c in zip(hash_atributos, wkb, subconjunto['Codigo_Cat'])]
 
-        return True, f"Informe PDF generado exitosamente como: {output_filename}"
+def _huella_global(**opciones):
+    """Huella de todo lo que afecta a las fichas y no depende del predio.
+
+    Incluye la versión de la plantilla, el contenido del logo y del mapa externo
+    y las opciones del informe (autor, fecha explícita, tipo de mapa...).
+    """
+    import hashlib
+    import json
+
+    datos = {'plantilla': VERSION_PLANTILLA,
+             'logo': _hash_archivo(opciones.pop('logo_path', None)),
+             'mapa': _hash_archivo(opciones.pop('map_image_path', None))}
+    opciones.pop('motor', None) # Ambos motores producen la misma ficha.
+    if opciones.get('fecha_reporte') is not None:
+        opciones['fecha_reporte'] = str(opciones['fecha_reporte'])
+    datos.update({k: v for k, v in opciones.items() if isinstance(v, (str, int, float, bool, type(None)))})
+    return hashlib.sha256(json.dumps(datos, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _guardar_manifiesto(manifiesto, ruta):
+    """Escribe el manifiesto de forma atómica (archivo temporal y reemplazo)."""
+    import json
+
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=1)
+    os.replace(temporal, ruta)
+
+def generar_informes_incremental(gdf, output_dir=".", codigos=None, plantilla_nombre="Ficha_{codcat}.pdf", ruta_manifiesto=None,
+                                 eliminar_obsoletos=True, forzar=False, procesos=1, **kwargs):
+    """Regenera solo las fichas cuyos datos cambiaron desde la última ejecución.
+
+    Junto a los PDF se guarda un manifiesto (JSON) con la huella de cada predio
+    (atributos, geometría y colindancias, ver `calcular_huellas`) y una huella global con la
+    versión de la plantilla, el logo, el mapa y las opciones del informe. En cada
+    ejecución solo se generan los predios nuevos, los que cambiaron o cuyo PDF no
+    existe, y se eliminan los PDF de códigos que ya no están en el catastro.
+    Los cambios en predios vecinos (que solo aparecen en el mapa) no provocan la
+    regeneración.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Catastro completo (o el subconjunto a procesar).
+        output_dir (str, optional): Carpeta de salida. Defaults to ".".
+        codigos (iterable de str, optional): Limita el proceso a estos códigos.
+        plantilla_nombre (str, optional): Plantilla del nombre de cada PDF.
+        ruta_manifiesto (str, optional): Ruta del manifiesto. Por defecto
+            'manifiesto.json' dentro de `output_dir`.
+        eliminar_obsoletos (bool, optional): Elimina los PDF de los códigos que no
+            están en `gdf`. Debe desactivarse si `gdf` no es el catastro completo.
+            Defaults to True.
+        forzar (bool, optional): Regenera todas las fichas. Defaults to False.
+        procesos (int, optional): Si es distinto de 1, usa `generar_informes_paralelo`.
+        **kwargs: Argumentos para `generar_informe_predio_pdf`.
+
+    Yields:
+        tuple[str, bool, str]: (codigo_catastral, exito, mensaje) de cada predio
+                               regenerado o eliminado.
+    """
+    import json
+
+    if not isinstance(gdf, gpd.GeoDataFrame):
+        raise TypeError("El primer argumento debe ser un GeoDataFrame.")
+    if 'Codigo_Cat' not in gdf.columns:
+        raise ValueError("El GeoDataFrame no contiene la columna 'Codigo_Cat'.")
+
+    os.makedirs(output_dir, exist_ok=True)
+    ruta_manifiesto = ruta_manifiesto or os.path.join(output_dir, "manifiesto.json")
+    try:
+        with open(ruta_manifiesto, encoding="utf-8") as f:
+            manifiesto = json.load(f)
+    except (OSError, ValueError):
+        manifiesto = {}
+    huella_global = _huella_global(**kwargs)
+    fichas = manifiesto.get('fichas', {})
+    if manifiesto.get('global') != huella_global or forzar:
+        # Se regeneran todas, pero se conservan los archivos del manifiesto para poder
+        # eliminar los de los predios que ya no existen.
+        fichas = {codcat: {'huella': None, 'archivo': ficha['archivo']} for codcat, ficha in fichas.items()}
+    manifiesto = {'version': 1, 'global': huella_global, 'fichas': fichas}
+
+    # --- HUELLAS ACTUALES ---
+    indice = construir_indice_codcat(gdf)
+    codigos, faltantes = _preparar_codigos(gdf, indice, codigos)
+    for codcat in faltantes:
+        resultado = _notificar(ResultadoInforme(False, f"Error: No se encontró ningún predio con el Código Catastral: {codcat}", codcat), kwargs.get('metricas'))
+        yield codcat, resultado.ok, resultado.mensaje
+    huellas = dict(zip(codigos, calcular_huellas(gdf, [indice[c][0] for c in codigos], kwargs.get('colindancias'))))
+
+    # --- PDF OBSOLETOS ---
+    if eliminar_obsoletos:
+        for codcat in [c for c in fichas if c not in indice]:
+            archivo = os.path.join(output_dir, fichas.pop(codcat)['archivo'])
+            if os.path.exists(archivo):
+                os.remove(archivo)
+            yield codcat, True, f"Informe eliminado (el predio ya no existe): {archivo}"
+
+    # --- PREDIOS A REGENERAR ---
+    def _archivo(codcat):
+        return plantilla_nombre.format(codcat=_nombre_archivo_seguro(codcat))
+    pendientes = [c for c in codigos
+                  if fichas.get(c, {}).get('huella') != huellas[c]
+                  or not os.path.exists(os.path.join(output_dir, _archivo(c)))]
+    print(f"Regeneración incremental: {len(pendientes)} de {len(codigos)} fichas con cambios.")
+
+    if procesos != 1:
+        resultados = generar_informes_paralelo(gdf, codigos=pendientes, output_dir=output_dir, plantilla_nombre=plantilla_nombre,
+                                               procesos=procesos or None, ordenado=False, **kwargs)
+    else:
+        resultados = generar_informes_lote(gdf, codigos=pendientes, output_dir=output_dir, plantilla_nombre=plantilla_nombre, **kwargs)
+    try:
+        for n, (codcat, ok, mensaje) in enumerate(resultados, 1):
+            if ok:
+                fichas[codcat] = {'huella': huellas[codcat], 'archivo': _archivo(codcat)}
+            else:
+                fichas.pop(codcat, None)
+            if n % 100 == 0: # Guarda el avance por si la ejecución se interrumpe.
+                _guardar_manifiesto(manifiesto, ruta_manifiesto)
+            yield codcat, ok, mensaje
+    finally:
+        _guardar_manifiesto(manifiesto, ruta_manifiesto)
+
+# --- LIBRO DE FICHAS EN UN SOLO PDF ---
+ENTRADAS_POR_PAGINA_INDICE = 30
+
+def _portada_libro(canvas, doc):
+    """Dibuja la portada de una ficha del libro y registra su marcador.
+
+    Además de la portada normal (`portada_canvas`), crea el destino al que
+    enlazan el índice y el esquema (outline) del PDF, y anota el número de
+    página de la ficha para el índice.
+    """
+    portada_canvas(canvas, doc)
+    clave = f"ficha-{doc.ficha_param}"
+    canvas.bookmarkPage(clave)
+    canvas.addOutlineEntry(doc.codcat_param, clave, level=0, closed=True)
+    doc.paginas_fichas[doc.ficha_param] = doc.page
+
+def _pagina_indice(canvas, doc):
+    """Dibuja una página del índice del libro.
+
+    Los números de página de las fichas no se conocen hasta terminar la
+    maquetación, así que el listado se dibuja como un formulario PDF (XObject)
+    que se define al final del documento; los enlaces a cada ficha sí se
+    crean aquí, porque su posición en la página es fija.
+    """
+    canvas.saveState()
+    ancho, alto = doc.pagesize
+    numero = doc.page - 1 # Página del índice, empezando en 0.
+    canvas.setFont('Helvetica-Bold', 18)
+    canvas.setFillColor(navy)
+    canvas.drawCentredString(ancho / 2, alto - doc.topMargin - 0.5 * cm, "ÍNDICE DE FICHAS CATASTRALES")
+    canvas.doForm(f"indice-{numero}")
+
+    inicio = numero * ENTRADAS_POR_PAGINA_INDICE
+    for k in range(inicio, min(inicio + ENTRADAS_POR_PAGINA_INDICE, len(doc.codigos_libro))):
+        y = _y_entrada_indice(doc, k - inicio)
+        canvas.linkRect("", f"ficha-{k}", (doc.leftMargin, y - 3, ancho - doc.rightMargin, y + 10), relative=1)
+    canvas.restoreState()
+    footer_canvas(canvas, doc)
+
+def _y_entrada_indice(doc, fila):
+    """Altura (en puntos) de la fila `fila` de una página del índice."""
+    return doc.pagesize[1] - doc.topMargin - 2 * cm - fila * 0.45 * cm
+
+class _FichaLibro(ActionFlowable):
+    """Indica al documento qué ficha comienza, antes del salto a su portada."""
+
+    def __init__(self, numero, codcat):
+        ActionFlowable.__init__(self)
+        self.numero = numero
+        self.codcat = codcat
+
+    def apply(self, doc):
+        doc.ficha_param = self.numero
+        doc.codcat_param = self.codcat
+
+class _CerrarIndice(Flowable):
+    """Último elemento del libro: define los formularios con el índice completo."""
+
+    def wrap(self, availWidth, availHeight):
+        return 0, 0
+
+    def draw(self):
+        canvas, doc = self.canv, self._doc
+        ancho = doc.pagesize[0]
+        paginas = max(1, -(-len(doc.codigos_libro) // ENTRADAS_POR_PAGINA_INDICE))
+        for numero in range(paginas):
+            canvas.beginForm(f"indice-{numero}")
+            canvas.setFont('Helvetica', 10)
+            inicio = numero * ENTRADAS_POR_PAGINA_INDICE
+            for k in range(inicio, min(inicio + ENTRADAS_POR_PAGINA_INDICE, len(doc.codigos_libro))):
+                y = _y_entrada_indice(doc, k - inicio)
+                canvas.setFillColor(black)
+                canvas.drawString(doc.leftMargin, y, f"Ficha {k + 1}: {doc.codigos_libro[k]}")
+                canvas.drawRightString(ancho - doc.rightMargin, y, str(doc.paginas_fichas.get(k, "")))
+                canvas.setStrokeColor(gray)
+                canvas.setDash(1, 2)
+                canvas.line(doc.leftMargin + 6 * cm, y + 1, ancho - doc.rightMargin - 1 * cm, y + 1)
+            canvas.endForm()
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        self._doc = canvas._doctemplate
+        Flowable.drawOn(self, canvas, x, y, _sW)
+
+def generar_libro_predios(gdf, output_filename, codigos=None, filtro=None, autor="Cartography Hub", fecha_reporte=None, logo_path=None, indice_codcat=None, **kwargs):
+    """Genera un único PDF ("libro") con las fichas de muchos predios.
+
+    Todas las fichas se maquetan en una sola llamada a `build`, con la misma
+    portada (`portada_canvas`) y pie de página (`footer_canvas`) que los informes
+    individuales. El logo y las fuentes se incrustan una sola vez en el archivo,
+    al principio se incluye un índice con enlaces a cada ficha y el esquema
+    (outline) del PDF tiene una entrada por código catastral.
+
+    Args:
+        gdf (gpd.GeoDataFrame): GeoDataFrame con los datos de los predios.
+        output_filename (str o archivo binario): Ruta del PDF a generar.
+        codigos (iterable de str, optional): Códigos catastrales a incluir.
+        filtro (callable, optional): Igual que en `generar_informes_lote`.
+        autor, fecha_reporte, logo_path: Igual que en `generar_informe_predio_pdf`.
+        indice_codcat (dict, optional): Índice de `construir_indice_codcat`.
+        **kwargs: Opciones de la ficha (map_image_path, mapa_vectorial,
+            mapa_vecinos, colindancias, tolerancia_vertices, utm_precalculado).
+
+    Returns:
+        tuple[bool, str]: (exito, mensaje), igual que `generar_informe_predio_pdf`.
+    """
+    if not isinstance(gdf, gpd.GeoDataFrame):
+        return False, "Error: El primer argumento debe ser un GeoDataFrame."
+    if 'Codigo_Cat' not in gdf.columns:
+        return False, "Error: El GeoDataFrame no contiene la columna 'Codigo_Cat'."
+
+    indice = indice_codcat if indice_codcat is not None else construir_indice_codcat(gdf)
+    codigos, faltantes = _preparar_codigos(gdf, indice, codigos, filtro)
+    for codcat in faltantes:
+        print(f"Advertencia: No se encontró ningún predio con el Código Catastral: {codcat}")
+    if not codigos:
+        return False, "Error: Ninguno de los códigos catastrales solicitados existe."
+
+    posiciones = [indice[c][0] for c in codigos]
+    utm_precalculado = kwargs.pop('utm_precalculado', None)
+    if utm_precalculado is None:
+        try:
+            utm_precalculado = precalcular_utm(gdf, posiciones=posiciones)
+        except ValueError as e:
+            print(f"Advertencia: No se pudo precalcular la reproyección UTM: {e}")
+    map_image_path = kwargs.pop('map_image_path', None)
+    mapa_vectorial = kwargs.pop('mapa_vectorial', True)
+    mapa_vecinos = kwargs.pop('mapa_vecinos', True)
+    colindancias = kwargs.pop('colindancias', None)
+    tolerancia_vertices = kwargs.pop('tolerancia_vertices', 0.0)
+    fecha_str = _formatear_fecha(fecha_reporte)
+
+    try:
+        doc = BaseDocTemplate(output_filename,
+                              pagesize=(21*cm, 21*cm),
+                              leftMargin=1.5*cm, rightMargin=1.5*cm,
+                              topMargin=2.0*cm, bottomMargin=2.5*cm,
+                              title="Fichas Técnicas Catastrales", author=autor)
+        marco = Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height, id='normal')
+        doc.addPageTemplates([
+            PageTemplate(id='indice', frames=[marco], onPage=_pagina_indice),
+            PageTemplate(id='portada', frames=[marco], onPage=_portada_libro),
+            PageTemplate(id='contenido', frames=[marco], onPage=footer_canvas),
+        ])
+        doc.codigos_libro = codigos
+        doc.paginas_fichas = {}
+        doc.fecha_param = fecha_str
+        doc.logo_path_param = logo_path
+        doc.ficha_param, doc.codcat_param = 0, codigos[0]
+
+        # --- ÍNDICE: páginas reservadas, se completan al final ---
+        story = []
+        paginas_indice = max(1, -(-len(codigos) // ENTRADAS_POR_PAGINA_INDICE))
+        for _ in range(paginas_indice - 1):
+            story.append(PageBreak())
+
+        # --- FICHAS ---
+        for numero, (codcat, posicion) in enumerate(zip(codigos, posiciones)):
+            utm = None
+            if utm_precalculado is not None and posicion in utm_precalculado.index:
+                fila_utm = utm_precalculado.loc[posicion]
+                if fila_utm['utm_epsg']:
+                    utm = (int(fila_utm['utm_epsg']), fila_utm['utm_nombre'], fila_utm['geometry_utm'])
+            vecinos = None
+            if mapa_vectorial and mapa_vecinos and not map_image_path:
+                vecinos = _buscar_vecinos_mapa(gdf, posicion)
+            story.extend([_FichaLibro(numero, codcat), NextPageTemplate('portada'), PageBreak(),
+                          NextPageTemplate('contenido'), PageBreak()])
+            story.extend(_construir_story_predio(gdf.iloc[[posicion]], codcat, fecha_str, doc.width, autor=autor,
+                                                 logo_path=logo_path, map_image_path=map_image_path, crs=gdf.crs,
+                                                 utm=utm, mapa_vectorial=mapa_vectorial, vecinos=vecinos,
+                                                 colindancias=colindancias, tolerancia_vertices=tolerancia_vertices))
+        story.append(_CerrarIndice())
+
+        doc.build(story)
+        return True, f"Libro PDF con {len(codigos)} fichas generado exitosamente como: {output_filename}"
 
     except Exception as e:
-        # Captura cualquier error inesperado durante la creación del PDF.
-        return False, f"Error al generar el informe PDF: {e}"
+        return False, f"Error al generar el libro PDF: {e}"
+
+# --- GENERACIÓN EN PARALELO ---
+# Estado de cada proceso trabajador. Se carga una sola vez en el inicializador
+# del pool para no serializar el GeoDataFrame en cada tarea.
+_TRABAJADOR_GDF = None
+_TRABAJADOR_INDICE = None
+_TRABAJADOR_UTM = None
+_TRABAJADOR_COLINDANCIAS = None
+
+def _inicializar_trabajador(fuente, colindancias=None):
+    """Carga el catastro (o la porción asignada) en un proceso trabajador."""
+    global _TRABAJADOR_GDF, _TRABAJADOR_INDICE, _TRABAJADOR_UTM, _TRABAJADOR_COLINDANCIAS
+    _TRABAJADOR_COLINDANCIAS = colindancias
+    _TRABAJADOR_GDF = normalizar_predios(gpd.read_file(fuente), imprimir=False) if isinstance(fuente, (str, os.PathLike)) else fuente
+    _TRABAJADOR_INDICE = construir_indice_codcat(_TRABAJADOR_GDF)
+    try:
+        _TRABAJADOR_UTM = precalcular_utm(_TRABAJADOR_GDF)
+    except ValueError:
+        _TRABAJADOR_UTM = None
+
+def _tarea_informe(tarea):
+    """Genera un informe dentro de un proceso trabajador.
+
+    Cualquier excepción se convierte en un resultado fallido para que un predio
+    defectuoso (p. ej. una geometría corrupta) no detenga el resto del lote.
+    """
+    codcat, output_filename, kwargs = tarea
+    try:
+        return generar_informe_predio_pdf(_TRABAJADOR_GDF, codcat, output_filename,
+                                          indice_codcat=_TRABAJADOR_INDICE,
+                                          utm_precalculado=_TRABAJADOR_UTM,
+                                          colindancias=_TRABAJADOR_COLINDANCIAS, **kwargs)
+    except Exception as e:
+        return ResultadoInforme(False, f"Error al generar el informe PDF: {e}", codcat)
+
+def generar_informes_paralelo(fuente, codigos=None, filtro=None, output_dir=".", plantilla_nombre="Ficha_{codcat}.pdf",
+                              procesos=None, tamano_bloque=4, ordenado=True, **kwargs):
+    """Genera los informes de varios predios repartiéndolos en un pool de procesos.
+
+    La construcción del PDF con ReportLab es código Python puro y limitado por
+    CPU, por lo que un solo proceso aprovecha un único núcleo. Esta función
+    reparte los predios entre varios procesos; cada uno carga el catastro una
+    sola vez al iniciar.
+
+    Args:
+        fuente (gpd.GeoDataFrame o str): GeoDataFrame en memoria o ruta al archivo
+            de predios. Con un GeoDataFrame, cada trabajador recibe solo las filas
+            de los códigos solicitados. Con una ruta, cada trabajador lee el archivo.
+        codigos (iterable de str, optional): Códigos catastrales a reportar.
+        filtro (callable, optional): Igual que en `generar_informes_lote`. Solo
+            se admite si `fuente` es un GeoDataFrame.
+        output_dir (str, optional): Carpeta de salida. Defaults to ".".
+        plantilla_nombre (str, optional): Plantilla del nombre de cada PDF.
+        procesos (int, optional): Número de procesos. Defaults to os.cpu_count().
+        tamano_bloque (int, optional): Número de predios que se envía a un
+            trabajador por vez. Defaults to 4.
+        ordenado (bool, optional): Si es True, los resultados se devuelven en el
+            orden de los códigos; si es False, en el orden en que terminan.
+            Defaults to True.
+        **kwargs: Argumentos adicionales para `generar_informe_predio_pdf`.
+
+    Yields:
+        tuple[str, bool, str]: (codigo_catastral, exito, mensaje) de cada predio.
+    """
+    import multiprocessing
+
+    # La tabla de colindancias se envía una vez por trabajador, no en cada tarea.
+    colindancias = kwargs.pop('colindancias', None)
+    # Las métricas se registran en el proceso principal con el resultado de cada tarea.
+    metricas = kwargs.pop('metricas', None)
+
+    if isinstance(fuente, gpd.GeoDataFrame):
+        if 'Codigo_Cat' not in fuente.columns:
+            raise ValueError("El GeoDataFrame no contiene la columna 'Codigo_Cat'.")
+        indice = construir_indice_codcat(fuente)
+        codigos, faltantes = _preparar_codigos(fuente, indice, codigos, filtro)
+        for codcat in faltantes:
+            resultado = _notificar(ResultadoInforme(False, f"Error: No se encontró ningún predio con el Código Catastral: {codcat}", codcat), metricas)
+            yield codcat, resultado.ok, resultado.mensaje
+        # Cada trabajador recibe solo las filas que va a necesitar: los predios
+        # solicitados y los vecinos que aparecen en sus mapas.
+        if len(codigos) < len(indice):
+            posiciones = np.array([indice[c][0] for c in codigos], dtype=int)
+            if kwargs.get('mapa_vectorial', True) and kwargs.get('mapa_vecinos', True):
+                extensiones = [shapely.box(*_extension_mapa(g.bounds)) for g in fuente.geometry.iloc[posiciones]
+                               if g is not None and not g.is_empty]
+                if extensiones:
+                    _, vecinos = fuente.sindex.query(np.array(extensiones, dtype=object), predicate='intersects')
+                    posiciones = np.concatenate([posiciones, vecinos])
+            fuente = fuente.iloc[np.unique(posiciones)]
+    else:
+        if filtro is not None:
+            raise ValueError("El parámetro 'filtro' requiere un GeoDataFrame en memoria.")
+        if codigos is None:
+            codigos = gpd.read_file(fuente, columns=['Codigo_Cat'], ignore_geometry=True)['Codigo_Cat'].dropna()
+        codigos = list(dict.fromkeys(codigos))
+
+    if not codigos:
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+    tareas = [(codcat, os.path.join(output_dir, plantilla_nombre.format(codcat=_nombre_archivo_seguro(codcat))), kwargs)
+              for codcat in codigos]
+    procesos = min(procesos or os.cpu_count() or 1, len(tareas))
+
+    if colindancias is not None:
+        colindancias = colindancias[colindancias.index.isin(codigos)]
+
+    with multiprocessing.Pool(procesos, initializer=_inicializar_trabajador, initargs=(fuente, colindancias)) as pool:
+        mapear = pool.imap if ordenado else pool.imap_unordered
+        for resultado in mapear(_tarea_informe, tareas, chunksize=max(1, tamano_bloque)):
+            _notificar(resultado, metricas)
+            yield resultado.codcat, resultado.ok, resultado.mensaje
+
+# --- SERVICIO RESIDENTE DE INFORMES ---
+class CatastroResidente:
+    """Catastro precargado en memoria para atender informes sin costo de arranque.
+
+    Mantiene el GeoDataFrame normalizado, su índice por 'Codigo_Cat' y la
+    reproyección UTM precalculada. Un hilo en segundo plano vigila la fecha de
+    modificación de los archivos de origen (en un Shapefile, también .dbf, .shx...)
+    y, si cambia, carga la nueva versión y la sustituye de forma atómica sin
+    interrumpir las peticiones en curso.
+
+    Args:
+        ruta_datos (str): Archivo de predios (Shapefile, GeoJSON, GeoPackage...).
+        intervalo_recarga (float, optional): Segundos entre comprobaciones del
+            archivo de origen. Si es None o 0 no se recarga. Defaults to 2.0.
+    """
+
+    def __init__(self, ruta_datos, intervalo_recarga=2.0):
+        import threading
+
+        self.ruta_datos = ruta_datos
+        self.intervalo_recarga = intervalo_recarga
+        self._estado = None
+        self._detener = threading.Event()
+        self.recargar()
+        if intervalo_recarga:
+            threading.Thread(target=self._vigilar, name="recarga-catastro", daemon=True).start()
+
+    def _mtime(self):
+        # Un Shapefile puede cambiar solo en sus archivos auxiliares (.dbf, .shx...).
+        try:
+            return max(os.path.getmtime(f) for f in _archivos_origen(self.ruta_datos))
+        except OSError:
+            return None
+
+    def recargar(self):
+        """Carga el archivo de origen y sustituye el estado actual."""
+        mtime = self._mtime()
+        gdf = normalizar_predios(gpd.read_file(self.ruta_datos))
+        indice = construir_indice_codcat(gdf)
+        try:
+            utm = precalcular_utm(gdf)
+        except ValueError as e:
+            print(f"Advertencia: No se pudo precalcular la reproyección UTM: {e}")
+            utm = None
+        # La tupla se reemplaza completa: los lectores ven siempre un estado coherente.
+        self._estado = (gdf, indice, utm, mtime)
+        print(f"Catastro cargado desde {self.ruta_datos}: {len(gdf)} predios.")
+
+    def _vigilar(self):
+        while not self._detener.wait(self.intervalo_recarga):
+            mtime = self._mtime()
+            if mtime is not None and mtime != self._estado[3]:
+                try:
+                    self.recargar()
+                except Exception as e:
+                    print(f"Advertencia: No se pudo recargar el catastro: {e}")
+
+    def detener(self):
+        """Detiene el hilo de recarga."""
+        self._detener.set()
+
+    @property
+    def num_predios(self):
+        return len(self._estado[0])
+
+    def generar_pdf(self, codcat, **kwargs):
+        """Genera el informe de un predio en memoria.
+
+        Args:
+            codcat (str): Código catastral del predio.
+            **kwargs: Argumentos adicionales para `generar_informe_predio_pdf`.
+
+        Returns:
+            tuple[bool, str, bytes]: (exito, mensaje, contenido del PDF o b"").
+        """
+        gdf, indice, utm, _ = self._estado
+        resultado = generar_informe_predio_pdf(gdf, codcat, None, indice_codcat=indice,
+                                               utm_precalculado=utm, **kwargs)
+        return resultado.ok, resultado.mensaje, resultado.contenido if resultado.ok else b""
+
+def servir_informes(ruta_datos, host="127.0.0.1", puerto=8765, socket_unix=None, intervalo_recarga=2.0, **kwargs):
+    """Inicia un servicio HTTP local que responde con los informes en PDF.
+
+    El catastro y los estilos se cargan una sola vez al iniciar, por lo que cada
+    petición solo paga la construcción del PDF. Rutas disponibles:
+
+    * ``GET /informe/<codcat>`` (o ``/informe?codcat=...``): devuelve el PDF.
+      Admite los parámetros ``fecha`` (YYYY-MM-DD) y ``autor``.
+    * ``GET /informes.zip?codcat=...&codcat=...`` (o ``.tar``, ``.tar.gz``):
+      genera los PDF de varios predios y los envía en un archivo comprimido a
+      medida que se generan. Los códigos inexistentes se omiten.
+    * ``GET /estado``: devuelve un JSON con el número de predios cargados.
+    * ``POST /recargar``: fuerza la recarga del archivo de origen.
+
+    Args:
+        ruta_datos (str): Archivo de predios.
+        host (str, optional): Dirección de escucha. Defaults to "127.0.0.1".
+        puerto (int, optional): Puerto TCP. Defaults to 8765.
+        socket_unix (str, optional): Si se indica, escucha en este socket Unix en
+            lugar de TCP. Defaults to None.
+        intervalo_recarga (float, optional): Segundos entre comprobaciones del
+            archivo de origen para la recarga en caliente. Defaults to 2.0.
+        **kwargs: Argumentos por defecto para `generar_informe_predio_pdf`
+            (autor, logo_path, map_image_path).
+    """
+    import json
+    import socketserver
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, unquote, urlparse
+
+    catastro = CatastroResidente(ruta_datos, intervalo_recarga=intervalo_recarga)
+    # ReportLab no garantiza ser seguro entre hilos; la construcción es además
+    # limitada por CPU, así que se serializa sin pérdida real de rendimiento.
+    bloqueo_render = threading.Lock()
+
+    # Calienta los módulos perezosos de ReportLab con un primer informe descartado.
+    primer_codigo = next(iter(catastro._estado[1]), None)
+    if primer_codigo is not None:
+        catastro.generar_pdf(primer_codigo, **kwargs)
+
+    class _Manejador(BaseHTTPRequestHandler):
+        def address_string(self):
+            # En un socket Unix la dirección del cliente es una cadena vacía.
+            return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+        def _responder(self, codigo, contenido, tipo="application/json", cabeceras=None):
+            self.send_response(codigo)
+            self.send_header("Content-Type", tipo)
+            self.send_header("Content-Length", str(len(contenido)))
+            for clave, valor in (cabeceras or {}).items():
+                self.send_header(clave, valor)
+            self.end_headers()
+            self.wfile.write(contenido)
+
+        def _responder_json(self, codigo, datos):
+            self._responder(codigo, json.dumps(datos, ensure_ascii=False).encode("utf-8"))
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parametros = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if url.path == "/estado":
+                return self._responder_json(200, {"predios": catastro.num_predios, "ruta": catastro.ruta_datos})
+            if url.path == "/informe" or url.path.startswith("/informe/"):
+                codcat = unquote(url.path[len("/informe/"):]) if url.path.startswith("/informe/") else parametros.get("codcat")
+                if not codcat:
+                    return self._responder_json(400, {"error": "Falta el código catastral."})
+                opciones = dict(kwargs)
+                if "fecha" in parametros:
+                    opciones["fecha_reporte"] = parametros["fecha"]
+                if "autor" in parametros:
+                    opciones["autor"] = parametros["autor"]
+                with bloqueo_render:
+                    ok, mensaje, pdf = catastro.generar_pdf(codcat, **opciones)
+                if ok:
+                    nombre = f"Ficha_{_nombre_archivo_seguro(codcat)}.pdf"
+                    return self._responder(200, pdf, "application/pdf",
+                                           {"Content-Disposition": f'inline; filename="{nombre}"'})
+                return self._responder_json(404 if "No se encontró" in mensaje else 500, {"error": mensaje})
+            if url.path in ("/informes.zip", "/informes.tar", "/informes.tar.gz"):
+                codigos = parse_qs(url.query).get("codcat", [])
+                if not codigos:
+                    return self._responder_json(400, {"error": "Falta el código catastral."})
+                formato = url.path[len("/informes."):]
+                opciones = dict(kwargs)
+                if "fecha" in parametros:
+                    opciones["fecha_reporte"] = parametros["fecha"]
+                gdf, indice, utm, _ = catastro._estado
+                # Sin Content-Length: el archivo se envía a medida que se genera y
+                # el fin de la respuesta lo marca el cierre de la conexión.
+                self.send_response(200)
+                self.send_header("Content-Type", {"zip": "application/zip", "tar": "application/x-tar"}.get(formato, "application/gzip"))
+                self.send_header("Content-Disposition", f'attachment; filename="informes.{formato}"')
+                self.end_headers()
+                with bloqueo_render:
+                    for _ in exportar_informes_archivo(gdf, self.wfile, codigos=codigos, formato=formato,
+                                                       indice_codcat=indice, utm_precalculado=utm, **opciones):
+                        pass
+                return
+            self._responder_json(404, {"error": "Ruta no encontrada."})
+
+        def do_POST(self):
+            if urlparse(self.path).path == "/recargar":
+                try:
+                    catastro.recargar()
+                except Exception as e:
+                    return self._responder_json(500, {"error": str(e)})
+                return self._responder_json(200, {"predios": catastro.num_predios})
+            self._responder_json(404, {"error": "Ruta no encontrada."})
+
+    if socket_unix:
+        class _ServidorUnix(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+        if os.path.exists(socket_unix):
+            os.remove(socket_unix)
+        servidor = _ServidorUnix(socket_unix, _Manejador)
+        print(f"Servicio de informes escuchando en el socket {socket_unix}")
+    else:
+        servidor = ThreadingHTTPServer((host, puerto), _Manejador)
+        print(f"Servicio de informes escuchando en http://{host}:{servidor.server_address[1]}")
+
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        catastro.detener()
+        if socket_unix and os.path.exists(socket_unix):
+            os.remove(socket_unix)
+
+# --- ENVÍO DE INFORMES POR TELEGRAM ---
+class _CuboTokens:
+    """Limitador de tasa por cubeta de fichas (token bucket) para asyncio.
+
+    Permite hasta `capacidad` envíos seguidos y, en régimen sostenido, `tasa`
+    envíos por segundo.
+    """
+    def __init__(self, tasa, capacidad=1):
+        self.tasa = float(tasa)
+        self.capacidad = max(1.0, float(capacidad))
+        self.fichas = self.capacidad
+        self.ultimo = time.monotonic()
+
+    async def tomar(self):
+        """Espera hasta que haya una ficha disponible y la consume."""
+        import asyncio
+
+        while True:
+            ahora = time.monotonic()
+            self.fichas = min(self.capacidad, self.fichas + (ahora - self.ultimo) * self.tasa)
+            self.ultimo = ahora
+            if self.fichas >= 1:
+                self.fichas -= 1
+                return
+            await asyncio.sleep((1 - self.fichas) / self.tasa)
+
+async def enviar_informes_telegram(gdf, token, chat_id, codigos=None, filtro=None, plantilla_nombre="Ficha_{codcat}.pdf",
+                                   base_url=None, mensajes_por_segundo=1.0, rafaga=1, tamano_cola=4,
+                                   max_reintentos=5, espera_base=1.0, al_enviar=None, **kwargs):
+    """Genera los informes y los envía por Telegram a medida que están listos.
+
+    La generación se ejecuta en un hilo aparte y deja cada PDF (en memoria) en
+    una cola acotada, de la que se toman para enviarlos con python-telegram-bot;
+    así la generación del siguiente informe se solapa con el envío del anterior y
+    la memoria queda limitada a `tamano_cola` informes. Los envíos respetan el
+    límite de Telegram con una cubeta de fichas, y los errores transitorios
+    (RetryAfter, TimedOut, NetworkError) se reintentan con espera exponencial;
+    los permanentes (BadRequest, Forbidden) marcan la ficha como fallida sin
+    reintentarla.
+
+    Args:
+        gdf (gpd.GeoDataFrame): GeoDataFrame con los datos de los predios.
+        token (str): Token del bot de Telegram.
+        chat_id (int o str): Chat de destino.
+        codigos (iterable de str, optional): Códigos catastrales a enviar.
+        filtro (callable, optional): Igual que en `generar_informes_lote`.
+        plantilla_nombre (str, optional): Nombre del documento enviado.
+        base_url (str, optional): URL base de la Bot API (p. ej.
+            "http://127.0.0.1:8081/bot" para un servidor local o de pruebas).
+            Por defecto se usa la de Telegram.
+        mensajes_por_segundo (float, optional): Tasa sostenida de envíos. Telegram
+            admite alrededor de un mensaje por segundo en un mismo chat.
+        rafaga (int, optional): Envíos seguidos permitidos antes de limitar.
+        tamano_cola (int, optional): Máximo de PDF generados en espera de envío.
+        max_reintentos (int, optional): Reintentos de cada envío ante errores
+            transitorios. Defaults to 5.
+        espera_base (float, optional): Segundos de espera del primer reintento;
+            se duplica en cada intento. Defaults to 1.0.
+        al_enviar (callable, optional): Función que recibe (codcat, exito, mensaje)
+            en cuanto termina cada predio.
+        **kwargs: Argumentos adicionales para `generar_informe_predio_pdf`.
+
+    Returns:
+        list[tuple[str, bool, str]]: (codigo_catastral, exito, mensaje) de cada predio.
+    """
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    import telegram
+    from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+    cola = asyncio.Queue(maxsize=max(1, tamano_cola))
+    fin = object()
+    resultados = []
+    loop = asyncio.get_running_loop()
+
+    def registrar(codcat, ok, mensaje):
+        resultados.append((codcat, ok, mensaje))
+        if al_enviar is not None:
+            al_enviar(codcat, ok, mensaje)
+
+    async def producir():
+        # Un único hilo de generación: ReportLab no es seguro entre hilos.
+        informes = _informes_en_memoria(gdf, codigos, filtro, **kwargs)
+        with ThreadPoolExecutor(max_workers=1) as ejecutor:
+            try:
+                while True:
+                    resultado = await loop.run_in_executor(ejecutor, next, informes, None)
+                    if resultado is None:
+                        break
+                    await cola.put(resultado)
+            finally:
+                await cola.put(fin)
+
+    async def enviar(bot):
+        cubo = _CuboTokens(mensajes_por_segundo, rafaga)
+        while True:
+            resultado = await cola.get()
+            if resultado is fin:
+                break
+            codcat = resultado.codcat
+            if not resultado.ok:
+                registrar(codcat, False, resultado.mensaje)
+                continue
+            nombre = plantilla_nombre.format(codcat=_nombre_archivo_seguro(codcat))
+            for intento in range(max_reintentos + 1):
+                await cubo.tomar()
+                try:
+                    await bot.send_document(chat_id, document=resultado.contenido, filename=nombre,
+                                            caption=f"Ficha catastral {codcat}")
+                    registrar(codcat, True, f"Informe PDF enviado por Telegram como: {nombre}")
+                    break
+                except RetryAfter as e:
+                    espera = e.retry_after
+                    espera = espera.total_seconds() if hasattr(espera, 'total_seconds') else float(espera)
+                    error = e
+                except (BadRequest, Forbidden) as e:
+                    # Errores permanentes (chat inválido, archivo rechazado...). Se comprueban
+                    # antes que NetworkError porque BadRequest es una subclase suya.
+                    registrar(codcat, False, f"Error al enviar el informe por Telegram: {e}")
+                    break
+                except NetworkError as e: # Incluye TimedOut.
+                    espera = espera_base * 2 ** intento
+                    error = e
+                except TelegramError as e: # Otros errores no transitorios (token inválido, conflicto...).
+                    registrar(codcat, False, f"Error al enviar el informe por Telegram: {e}")
+                    break
+                if intento == max_reintentos:
+                    registrar(codcat, False, f"Error al enviar el informe por Telegram tras {max_reintentos} reintentos: {error}")
+                    break
+                await asyncio.sleep(espera)
+            resultado.contenido = None # Libera el PDF en cuanto se envía.
+
+    bot = telegram.Bot(token, base_url=base_url) if base_url else telegram.Bot(token)
+    async with bot:
+        await asyncio.gather(producir(), enviar(bot))
+    return resultados
+
+def _leer_codigos(args):
+    """Reúne los códigos catastrales indicados en la línea de comandos."""
+    codigos = list(args.codigos or [])
+    if args.archivo_codigos:
+        with open(args.archivo_codigos, encoding='utf-8') as f:
+            codigos.extend(linea.strip() for linea in f if linea.strip())
+    return codigos or None
+
+def main(argv=None):
+    """Punto de entrada de la línea de comandos.
+
+    Ejemplo:
+        python predio_report.py lote data/predios.shp --codigos 0901-0101-001-01 --salida informes/
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generador de fichas catastrales en PDF.")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    p_lote = subparsers.add_parser('lote', help="Genera los informes de varios predios.")
+    p_lote.add_argument('ruta_datos', help="Archivo de predios (Shapefile, GeoJSON, GeoPackage...).")
+    p_lote.add_argument('--codigos', nargs='+', help="Códigos catastrales a reportar.")
+    p_lote.add_argument('--archivo-codigos', help="Archivo de texto con un código catastral por línea.")
+    p_lote.add_argument('--salida', default=".", help="Carpeta de salida de los PDF.")
+    p_lote.add_argument('--plantilla-nombre', default="Ficha_{codcat}.pdf", help="Plantilla del nombre de archivo.")
+    p_lote.add_argument('--autor', default="Cartography Hub")
+    p_lote.add_argument('--fecha', help="Fecha del informe (YYYY-MM-DD).")
+    p_lote.add_argument('--logo', help="Ruta al logo de la portada.")
+    p_lote.add_argument('--procesos', type=int, default=1, help="Número de procesos en paralelo (0 = todos los núcleos).")
+    p_lote.add_argument('--tamano-bloque', type=int, default=4, help="Predios enviados a cada proceso por vez.")
+    p_lote.add_argument('--desordenado', action='store_true', help="Devuelve los resultados en el orden en que terminan.")
+    p_lote.add_argument('--colindancias', help="Tabla de colindancias (Parquet o CSV) creada con el comando 'colindancias'.")
+    p_lote.add_argument('--tolerancia-vertices', type=float, default=0.0, help="Omite del cuadro de coordenadas los vértices a menos de esta distancia (m) del contorno simplificado.")
+    p_lote.add_argument('--where', help="Consulta SQL sobre los atributos para seleccionar los predios.")
+    p_lote.add_argument('--bbox', nargs=4, type=float, metavar=('MINX', 'MINY', 'MAXX', 'MAXY'), help="Extensión a leer.")
+    p_lote.add_argument('--bloque', type=int, help="Lee y procesa el catastro en bloques de este número de predios.")
+    p_lote.add_argument('--cache', action='store_true', help="Lee los predios desde la caché GeoParquet (se crea si no existe).")
+    p_lote.add_argument('--incremental', action='store_true', help="Regenera solo las fichas que cambiaron (usa un manifiesto en la carpeta de salida).")
+    p_lote.add_argument('--manifiesto', help="Ruta del manifiesto del modo incremental.")
+    p_lote.add_argument('--forzar', action='store_true', help="En modo incremental, regenera todas las fichas.")
+    p_lote.add_argument('--archivo', help="Escribe los PDF directamente en este archivo .zip, .tar o .tar.gz en lugar de la carpeta de salida.")
+    p_lote.add_argument('--metricas', help="Escribe las métricas del lote en este archivo (formato de texto de Prometheus).")
+    p_lote.add_argument('--motor', choices=MOTORES_PDF, default="reportlab", help="Motor de PDF ('pymupdf' estampa los datos sobre plantillas).")
+
+    p_cache = subparsers.add_parser('cache', help="Crea la caché GeoParquet del catastro, normalizada y ordenada por Codigo_Cat.")
+    p_cache.add_argument('ruta_datos', help="Archivo de predios.")
+    p_cache.add_argument('--salida', help="Ruta del archivo Parquet (por defecto, junto al origen).")
+    p_cache.add_argument('--hash', action='store_true', help="Guarda el hash del contenido para validar la caché.")
+
+    p_col = subparsers.add_parser('colindancias', help="Calcula los colindantes de todos los predios a partir de la geometría.")
+    p_col.add_argument('ruta_datos', help="Archivo de predios.")
+    p_col.add_argument('salida', help="Archivo de salida (.parquet o .csv).")
+    p_col.add_argument('--tolerancia', type=float, default=0.05, help="Distancia en metros para considerar dos linderos coincidentes.")
+
+    p_libro = subparsers.add_parser('libro', help="Genera un único PDF con las fichas de varios predios e índice.")
+    p_libro.add_argument('ruta_datos', help="Archivo de predios.")
+    p_libro.add_argument('salida', help="Ruta del PDF a generar.")
+    p_libro.add_argument('--codigos', nargs='+', help="Códigos catastrales a incluir.")
+    p_libro.add_argument('--archivo-codigos', help="Archivo de texto con un código catastral por línea.")
+    p_libro.add_argument('--where', help="Consulta SQL sobre los atributos para seleccionar los predios.")
+    p_libro.add_argument('--bbox', nargs=4, type=float, metavar=('MINX', 'MINY', 'MAXX', 'MAXY'), help="Extensión a leer.")
+    p_libro.add_argument('--autor', default="Cartography Hub")
+    p_libro.add_argument('--fecha', help="Fecha del informe (YYYY-MM-DD).")
+    p_libro.add_argument('--logo', help="Ruta al logo de la portada.")
+    p_libro.add_argument('--colindancias', help="Tabla de colindancias (Parquet o CSV).")
+    p_libro.add_argument('--tolerancia-vertices', type=float, default=0.0, help="Tolerancia (m) para simplificar el cuadro de coordenadas.")
+
+    p_tg = subparsers.add_parser('telegram', help="Genera los informes y los envía a un chat de Telegram.")
+    p_tg.add_argument('ruta_datos', help="Archivo de predios.")
+    p_tg.add_argument('--chat', required=True, help="Identificador del chat de destino.")
+    p_tg.add_argument('--token', default=os.environ.get('TELEGRAM_BOT_TOKEN'), help="Token del bot (por defecto, la variable TELEGRAM_BOT_TOKEN).")
+    p_tg.add_argument('--url-api', help="URL base de la Bot API (servidor local o de pruebas).")
+    p_tg.add_argument('--codigos', nargs='+', help="Códigos catastrales a enviar.")
+    p_tg.add_argument('--archivo-codigos', help="Archivo de texto con un código catastral por línea.")
+    p_tg.add_argument('--where', help="Consulta SQL sobre los atributos para seleccionar los predios.")
+    p_tg.add_argument('--bbox', nargs=4, type=float, metavar=('MINX', 'MINY', 'MAXX', 'MAXY'), help="Extensión a leer.")
+    p_tg.add_argument('--mensajes-por-segundo', type=float, default=1.0, help="Tasa máxima de envíos.")
+    p_tg.add_argument('--cola', type=int, default=4, help="Máximo de informes generados en espera de envío.")
+    p_tg.add_argument('--autor', default="Cartography Hub")
+    p_tg.add_argument('--fecha', help="Fecha del informe (YYYY-MM-DD).")
+    p_tg.add_argument('--logo', help="Ruta al logo de la portada.")
+    p_tg.add_argument('--motor', choices=MOTORES_PDF, default="reportlab", help="Motor de PDF.")
+
+    p_servir = subparsers.add_parser('servir', help="Inicia el servicio HTTP residente de informes.")
+    p_servir.add_argument('ruta_datos', help="Archivo de predios.")
+    p_servir.add_argument('--host', default="127.0.0.1")
+    p_servir.add_argument('--puerto', type=int, default=8765)
+    p_servir.add_argument('--socket', help="Ruta de un socket Unix (sustituye a host/puerto).")
+    p_servir.add_argument('--intervalo-recarga', type=float, default=2.0, help="Segundos entre comprobaciones del archivo (0 = sin recarga).")
+    p_servir.add_argument('--autor', default="Cartography Hub")
+    p_servir.add_argument('--logo', help="Ruta al logo de la portada.")
+    p_servir.add_argument('--motor', choices=MOTORES_PDF, default="reportlab", help="Motor de PDF.")
+
+    args = parser.parse_args(argv)
+
+    if args.comando == 'cache':
+        ruta_cache = construir_cache_predios(args.ruta_datos, args.salida, verificar_hash=args.hash)
+        print(f"Caché de predios creada en {ruta_cache}.")
+        return 0
+
+    if args.comando == 'colindancias':
+        tabla = calcular_colindancias(gpd.read_file(args.ruta_datos), tolerancia=args.tolerancia)
+        guardar_colindancias(tabla, args.salida)
+        print(f"Colindancias guardadas en {args.salida}: {len(tabla)} registros.")
+        return 0
+
+    if args.comando == 'libro':
+        codigos = _leer_codigos(args)
+        gdf = cargar_predios(args.ruta_datos, codigos=codigos, bbox=tuple(args.bbox) if args.bbox else None,
+                             where=args.where, incluir_vecinos=codigos is not None)
+        gdf = normalizar_predios(gdf)
+        opciones = dict(tolerancia_vertices=args.tolerancia_vertices)
+        if args.colindancias:
+            opciones['colindancias'] = cargar_colindancias(args.colindancias)
+        ok, mensaje = generar_libro_predios(gdf, args.salida, codigos=codigos, autor=args.autor,
+                                            fecha_reporte=args.fecha, logo_path=args.logo, **opciones)
+        print(mensaje)
+        return 0 if ok else 1
+
+    if args.comando == 'telegram':
+        import asyncio
+
+        if not args.token:
+            parser.error("Falta el token del bot (--token o la variable TELEGRAM_BOT_TOKEN).")
+        codigos = _leer_codigos(args)
+        gdf = cargar_predios(args.ruta_datos, codigos=codigos, bbox=tuple(args.bbox) if args.bbox else None,
+                             where=args.where, incluir_vecinos=codigos is not None)
+        gdf = normalizar_predios(gdf)
+        resultados = asyncio.run(enviar_informes_telegram(
+            gdf, args.token, args.chat, codigos=codigos, base_url=args.url_api,
+            mensajes_por_segundo=args.mensajes_por_segundo, tamano_cola=args.cola,
+            al_enviar=lambda codcat, ok, mensaje: print(f"[{'OK' if ok else 'ERROR'}] {codcat}: {mensaje}"),
+            autor=args.autor, fecha_reporte=args.fecha, logo_path=args.logo, motor=args.motor))
+        return 0 if all(ok for _, ok, _ in resultados) else 1
+
+    if args.comando == 'servir':
+        servir_informes(args.ruta_datos, host=args.host, puerto=args.puerto, socket_unix=args.socket,
+                        intervalo_recarga=args.intervalo_recarga, autor=args.autor, logo_path=args.logo,
+                        motor=args.motor)
+        return 0
+
+    if args.comando == 'lote':
+        # Las combinaciones que no se pueden atender se rechazan antes de leer los datos:
+        # la lectura por bloques solo genera PDF sueltos de forma secuencial, y el archivo
+        # ZIP/tar se escribe en un solo proceso y siempre completo.
+        for opcion, activa, incompatibles in (
+                ('--bloque', args.bloque, (('--archivo', args.archivo), ('--incremental', args.incremental),
+                                           ('--procesos', args.procesos != 1), ('--cache', args.cache))),
+                ('--archivo', args.archivo, (('--incremental', args.incremental), ('--procesos', args.procesos != 1))),
+                ('--cache', args.cache, (('--where', args.where),))):
+            conflictos = [nombre for nombre, usada in incompatibles if usada]
+            if activa and conflictos:
+                parser.error(f"{opcion} no se admite junto con {', '.join(conflictos)}.")
+
+        codigos = _leer_codigos(args)
+        opciones = dict(codigos=codigos, output_dir=args.salida,
+                        plantilla_nombre=args.plantilla_nombre, autor=args.autor,
+                        fecha_reporte=args.fecha, logo_path=args.logo,
+                        tolerancia_vertices=args.tolerancia_vertices, motor=args.motor)
+        if args.colindancias:
+            opciones['colindancias'] = cargar_colindancias(args.colindancias)
+        if args.metricas:
+            opciones['metricas'] = MetricasPrometheus()
+        bbox = tuple(args.bbox) if args.bbox else None
+        if args.bloque:
+            resultados = generar_informes_por_bloques(args.ruta_datos, tamano_bloque=args.bloque,
+                                                      bbox=bbox, where=args.where, **opciones)
+        else:
+            # Solo se leen los predios solicitados (y sus vecinos para el mapa).
+            if args.cache:
+                gdf = cargar_cache_predios(args.ruta_datos, codigos=codigos, bbox=bbox, incluir_vecinos=codigos is not None)
+            else:
+                gdf = normalizar_predios(cargar_predios(args.ruta_datos, codigos=codigos, bbox=bbox, where=args.where,
+                                                        incluir_vecinos=codigos is not None))
+            if args.archivo:
+                opciones.pop('output_dir')
+                resultados = exportar_informes_archivo(gdf, args.archivo, **opciones)
+            elif args.incremental:
+                # Los PDF de códigos ausentes solo se eliminan si se leyó el catastro completo.
+                completo = codigos is None and not args.where and not bbox
+                resultados = generar_informes_incremental(gdf, ruta_manifiesto=args.manifiesto, eliminar_obsoletos=completo,
+                                                          forzar=args.forzar, procesos=args.procesos, **opciones)
+            elif args.procesos != 1:
+                resultados = generar_informes_paralelo(gdf, procesos=args.procesos or None, tamano_bloque=args.tamano_bloque,
+                                                       ordenado=not args.desordenado, **opciones)
+            else:
+                resultados = generar_informes_lote(gdf, **opciones)
+        errores = 0
+        for codcat, ok, mensaje in resultados:
+            print(f"[{'OK' if ok else 'ERROR'}] {codcat}: {mensaje}")
+            errores += not ok
+        if args.metricas:
+            opciones['metricas'].escribir(args.metricas)
+        return 1 if errores else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
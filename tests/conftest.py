@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark_predio_report  # noqa: E402
+
+
+@pytest.fixture
+def catastro():
+    """Catastro sintético pequeño en EPSG:4326."""
+    return benchmark_predio_report.generar_catastro_sintetico(20, semilla=1)
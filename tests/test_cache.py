@@ -0,0 +1,45 @@
+import os
+
+import predio_report as pr
+
+
+def _escribir(gdf, ruta):
+    gdf.to_file(ruta)
+    return str(ruta)
+
+
+def test_cache_se_invalida_al_cambiar_el_origen(catastro, tmp_path):
+    origen = _escribir(catastro, tmp_path / "predios.gpkg")
+    ruta_cache = pr.construir_cache_predios(origen)
+    assert pr.cache_vigente(origen)
+    assert len(pr.cargar_cache_predios(origen)) == len(catastro)
+
+    _escribir(catastro.iloc[:5], tmp_path / "predios.gpkg")
+    os.utime(origen, ns=(0, 0)) # Fecha distinta aunque el sistema de archivos tenga poca resolución.
+    assert not pr.cache_vigente(origen)
+    assert len(pr.cargar_cache_predios(origen)) == 5
+    assert pr.cache_vigente(origen)
+    assert os.path.exists(ruta_cache + ".json")
+
+
+def test_cache_con_hash_ignora_cambios_solo_de_fecha(catastro, tmp_path):
+    origen = _escribir(catastro, tmp_path / "predios.gpkg")
+    pr.construir_cache_predios(origen, verificar_hash=True)
+    os.utime(origen, ns=(0, 0))
+    assert not pr.cache_vigente(origen)
+    assert pr.cache_vigente(origen, verificar_hash=True)
+
+
+def test_cache_personalizada_con_el_mismo_nombre_base(catastro, tmp_path):
+    origen = _escribir(catastro, tmp_path / "predios.shp")
+    ruta_cache = str(tmp_path / "predios.parquet")
+    pr.construir_cache_predios(origen, ruta_cache)
+    assert pr.cache_vigente(origen, ruta_cache)
+
+
+def test_cache_se_invalida_al_cambiar_un_archivo_auxiliar_del_shapefile(catastro, tmp_path):
+    origen = _escribir(catastro, tmp_path / "predios.shp")
+    pr.construir_cache_predios(origen)
+    with open(tmp_path / "predios.dbf", "ab") as f:
+        f.write(b" ")
+    assert not pr.cache_vigente(origen)
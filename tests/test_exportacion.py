@@ -0,0 +1,57 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+import predio_report as pr
+
+
+class FlujoSinPosicion:
+    """Destino de solo escritura, sin seek ni tell (como una tubería o un socket)."""
+
+    def __init__(self):
+        self.datos = bytearray()
+
+    def write(self, datos):
+        self.datos += datos
+        return len(datos)
+
+    def flush(self):
+        pass
+
+
+@pytest.mark.parametrize("formato", pr.FORMATOS_ARCHIVO)
+def test_exporta_a_un_destino_sin_posicion(catastro, formato):
+    codigos = list(catastro['Codigo_Cat'].iloc[:3])
+    destino = FlujoSinPosicion()
+    resultados = list(pr.exportar_informes_archivo(catastro, destino, codigos=codigos, formato=formato))
+    assert all(ok for _, ok, _ in resultados)
+
+    contenido = io.BytesIO(bytes(destino.datos))
+    if formato == 'zip':
+        with zipfile.ZipFile(contenido) as archivo:
+            pdfs = {n: archivo.read(n) for n in archivo.namelist()}
+    else:
+        with tarfile.open(fileobj=contenido) as archivo:
+            pdfs = {m.name: archivo.extractfile(m).read() for m in archivo.getmembers()}
+    assert sorted(pdfs) == sorted(f"Ficha_{pr._nombre_archivo_seguro(c)}.pdf" for c in codigos)
+    assert all(pdf.startswith(b"%PDF") for pdf in pdfs.values())
+
+
+def test_informe_a_un_destino_sin_posicion_cuenta_los_bytes(catastro):
+    destino = FlujoSinPosicion()
+    resultado = pr.generar_informe_predio_pdf(catastro, catastro['Codigo_Cat'].iloc[0], destino)
+    assert resultado.ok
+    assert resultado.tamano_bytes == len(destino.datos) > 0
+
+
+@pytest.mark.parametrize("opciones", [["--archivo", "fichas.zip", "--incremental"],
+                                      ["--archivo", "fichas.zip", "--procesos", "2"],
+                                      ["--bloque", "100", "--archivo", "fichas.zip"],
+                                      ["--bloque", "100", "--cache"]])
+def test_lote_rechaza_opciones_incompatibles(tmp_path, opciones, capsys):
+    with pytest.raises(SystemExit) as salida:
+        pr.main(["lote", str(tmp_path / "predios.gpkg")] + opciones)
+    assert salida.value.code == 2
+    assert "no se admite" in capsys.readouterr().err
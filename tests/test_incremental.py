@@ -0,0 +1,40 @@
+import os
+
+import predio_report as pr
+
+
+def _ejecutar(gdf, salida, **kwargs):
+    return list(pr.generar_informes_incremental(gdf, output_dir=str(salida), **kwargs))
+
+
+def test_regenera_solo_lo_que_cambia(catastro, tmp_path):
+    _ejecutar(catastro, tmp_path, fecha_reporte="2025-01-01")
+    assert _ejecutar(catastro, tmp_path, fecha_reporte="2025-01-01") == []
+
+    modificado = catastro.copy()
+    modificado.loc[modificado.index[0], 'Calle'] = "Calle Nueva"
+    resultados = _ejecutar(modificado, tmp_path, fecha_reporte="2025-01-01")
+    assert [codcat for codcat, ok, _ in resultados] == [catastro['Codigo_Cat'].iloc[0]]
+
+
+def test_elimina_obsoletos_aunque_cambie_la_huella_global(catastro, tmp_path):
+    _ejecutar(catastro, tmp_path, fecha_reporte="2025-01-01")
+    eliminado = catastro['Codigo_Cat'].iloc[-1]
+    archivo = tmp_path / f"Ficha_{pr._nombre_archivo_seguro(eliminado)}.pdf"
+    assert archivo.exists()
+
+    # Otra fecha cambia la huella global y además desaparece un predio.
+    resultados = _ejecutar(catastro.iloc[:-1], tmp_path, fecha_reporte="2025-02-01")
+
+    assert not archivo.exists()
+    assert (eliminado, True) in [(codcat, ok) for codcat, ok, _ in resultados]
+    assert sum(ok for _, ok, _ in resultados) == len(catastro)
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        [f"Ficha_{pr._nombre_archivo_seguro(c)}.pdf" for c in catastro['Codigo_Cat'].iloc[:-1]] + ["manifiesto.json"])
+
+
+def test_forzar_tambien_elimina_obsoletos(catastro, tmp_path):
+    _ejecutar(catastro, tmp_path, fecha_reporte="2025-01-01")
+    eliminado = catastro['Codigo_Cat'].iloc[0]
+    _ejecutar(catastro.iloc[1:], tmp_path, fecha_reporte="2025-01-01", forzar=True)
+    assert not (tmp_path / f"Ficha_{pr._nombre_archivo_seguro(eliminado)}.pdf").exists()
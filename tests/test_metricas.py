@@ -0,0 +1,13 @@
+import geopandas as gpd
+import shapely
+
+import predio_report as pr
+
+
+def test_vertices_sin_el_cierre_de_cada_anillo():
+    exterior = shapely.box(-79.90, -2.20, -79.89, -2.19)
+    con_hueco = shapely.Polygon(exterior.exterior.coords, [shapely.box(-79.898, -2.198, -79.896, -2.196).exterior.coords])
+    gdf = gpd.GeoDataFrame({'Codigo_Cat': ["A", "B"]}, geometry=[exterior, con_hueco], crs=4326)
+
+    assert pr.generar_informe_predio_pdf(gdf, "A", None).vertices == 4
+    assert pr.generar_informe_predio_pdf(gdf, "B", None).vertices == 8
@@ -0,0 +1,43 @@
+import pytest
+
+import benchmark_predio_report
+import predio_report as pr
+
+pytest.importorskip("pymupdf")
+PIL = pytest.importorskip("PIL.Image")
+
+pytestmark = pytest.mark.skipif(not pr._reportlab_admite_plantillas(),
+                                reason="Versión de ReportLab no verificada para el motor de plantillas.")
+
+
+@pytest.fixture
+def logo(tmp_path):
+    ruta = tmp_path / "logo.png"
+    PIL.new("RGB", (200, 100), (20, 60, 120)).save(ruta)
+    return str(ruta)
+
+
+@pytest.mark.parametrize("vertices", [8, 150]) # 150 vértices: el cuadro ocupa varias páginas.
+def test_fichas_estampadas_iguales_a_reportlab(vertices, logo):
+    gdf = benchmark_predio_report.generar_catastro_sintetico(30, vertices=vertices, proporcion_multipoligono=0.3, semilla=4)
+    codigos = list(gdf['Codigo_Cat'].iloc[:6])
+    for logo_path in (None, logo):
+        distintas, estampadas = benchmark_predio_report.verificar_motor_plantillas(gdf, codigos, logo_path=logo_path)
+        assert distintas == []
+        assert estampadas == len(codigos)
+
+
+def test_motor_no_reconocido(catastro):
+    ok, mensaje = pr.generar_informe_predio_pdf(catastro, catastro['Codigo_Cat'].iloc[0], None, motor="otro")
+    assert not ok and "Motor de PDF no reconocido" in mensaje
+
+
+def test_version_no_verificada_usa_reportlab(catastro, monkeypatch):
+    monkeypatch.setattr(pr, 'VERSIONES_REPORTLAB_PLANTILLAS', ((0, 0), (0, 1)))
+    pr._reportlab_admite_plantillas.cache_clear()
+    try:
+        resultado = pr.generar_informe_predio_pdf(catastro, catastro['Codigo_Cat'].iloc[0], None, motor="pymupdf")
+    finally:
+        pr._reportlab_admite_plantillas.cache_clear()
+    assert resultado.ok
+    assert 'build' in resultado.duraciones and 'estampado' not in resultado.duraciones
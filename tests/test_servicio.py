@@ -0,0 +1,15 @@
+import os
+
+import predio_report as pr
+
+
+def test_recarga_al_cambiar_un_archivo_auxiliar_del_shapefile(catastro, tmp_path):
+    ruta = str(tmp_path / "predios.shp")
+    catastro.to_file(ruta)
+    catastro_residente = pr.CatastroResidente(ruta, intervalo_recarga=0)
+    mtime = catastro_residente._estado[3]
+    assert catastro_residente._mtime() == mtime
+
+    dbf = tmp_path / "predios.dbf"
+    os.utime(dbf, (mtime + 10, mtime + 10))
+    assert catastro_residente._mtime() == mtime + 10
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import predio_report as pr
+
+pytest.importorskip("telegram")
+
+
+class BotApiFalsa:
+    """Servidor HTTP que imita la Bot API y responde `sendDocument` según un guion.
+
+    Cada elemento del guion es (código HTTP, cuerpo JSON); cuando se agota se
+    responde con éxito.
+    """
+
+    def __init__(self, guion=(), demora=0.0):
+        self.guion = list(guion)
+        self.demora = demora
+        self.envios = [] # Instante de cada llamada a sendDocument.
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if self.path.endswith('/getMe'):
+                    codigo, cuerpo = 200, {'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'bot', 'username': 'bot'}}
+                else:
+                    servidor.envios.append(time.monotonic())
+                    time.sleep(servidor.demora)
+                    codigo, cuerpo = servidor.guion.pop(0) if servidor.guion else (200, {'ok': True, 'result': _mensaje()})
+                datos = json.dumps(cuerpo).encode()
+                self.send_response(codigo)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(datos)))
+                self.end_headers()
+                self.wfile.write(datos)
+
+        self.http = ThreadingHTTPServer(('127.0.0.1', 0), Manejador)
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.http.server_port}/bot"
+
+    def cerrar(self):
+        self.http.shutdown()
+        self.http.server_close()
+
+
+def _mensaje():
+    return {'message_id': 1, 'date': 0, 'chat': {'id': 1, 'type': 'private'},
+            'document': {'file_id': 'f', 'file_unique_id': 'u'}}
+
+
+def _error(codigo, descripcion, **parametros):
+    cuerpo = {'ok': False, 'error_code': codigo, 'description': descripcion}
+    if parametros:
+        cuerpo['parameters'] = parametros
+    return codigo, cuerpo
+
+
+@pytest.fixture
+def bot_api():
+    servidores = []
+
+    def crear(*args, **kwargs):
+        servidores.append(BotApiFalsa(*args, **kwargs))
+        return servidores[-1]
+    yield crear
+    for servidor in servidores:
+        servidor.cerrar()
+
+
+def _enviar(catastro, api, n=1, **kwargs):
+    opciones = dict(mensajes_por_segundo=1000, rafaga=1000, espera_base=0.01)
+    opciones.update(kwargs)
+    return asyncio.run(pr.enviar_informes_telegram(catastro, "123:abc", 1, codigos=list(catastro['Codigo_Cat'].iloc[:n]),
+                                                   base_url=api.url, **opciones))
+
+
+def test_error_permanente_no_se_reintenta(catastro, bot_api):
+    api = bot_api([_error(400, "Bad Request: chat not found")] * 10)
+    resultados = _enviar(catastro, api)
+    assert [ok for _, ok, _ in resultados] == [False]
+    assert "not found" in resultados[0][2]
+    assert len(api.envios) == 1
+
+
+def test_error_de_servidor_se_reintenta_con_espera_exponencial(catastro, bot_api):
+    api = bot_api([_error(502, "Bad Gateway"), _error(500, "Internal Server Error")])
+    resultados = _enviar(catastro, api, espera_base=0.1)
+    assert [ok for _, ok, _ in resultados] == [True]
+    assert len(api.envios) == 3
+    assert api.envios[1] - api.envios[0] >= 0.1
+    assert api.envios[2] - api.envios[1] >= 0.2
+
+
+def test_error_de_servidor_agota_los_reintentos(catastro, bot_api):
+    api = bot_api([_error(502, "Bad Gateway")] * 10)
+    resultados = _enviar(catastro, api, max_reintentos=2)
+    assert [ok for _, ok, _ in resultados] == [False]
+    assert "2 reintentos" in resultados[0][2]
+    assert len(api.envios) == 3
+
+
+def test_limite_de_tasa_respeta_retry_after(catastro, bot_api):
+    api = bot_api([_error(429, "Too Many Requests: retry after 1", retry_after=1)])
+    resultados = _enviar(catastro, api)
+    assert [ok for _, ok, _ in resultados] == [True]
+    assert len(api.envios) == 2
+    assert api.envios[1] - api.envios[0] >= 1.0
+
+
+def test_cubeta_limita_la_tasa_de_envios(catastro, bot_api):
+    api = bot_api()
+    resultados = _enviar(catastro, api, n=5, mensajes_por_segundo=20, rafaga=1)
+    assert all(ok for _, ok, _ in resultados)
+    # Tras el primero, cada envío espera 1/20 s.
+    assert api.envios[-1] - api.envios[0] >= 4 / 20 * 0.95
+
+
+def test_cola_acotada_limita_los_informes_generados_por_adelantado(catastro, bot_api, monkeypatch):
+    api = bot_api(demora=0.05)
+    generados = []
+    original = pr._informes_en_memoria
+
+    def contar(*args, **kwargs):
+        for resultado in original(*args, **kwargs):
+            generados.append(len(api.envios))
+            yield resultado
+    monkeypatch.setattr(pr, '_informes_en_memoria', contar)
+
+    resultados = _enviar(catastro, api, n=8, tamano_cola=1)
+    assert all(ok for _, ok, _ in resultados)
+    # Un informe en la cola, uno esperando para entrar y uno enviándose.
+    for n, enviados in enumerate(generados, 1):
+        assert n - enviados <= 3